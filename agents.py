@@ -4,12 +4,14 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from crewai import Agent
-from crewai import LLM
 
-from tools import search_tool, FinancialDocumentTool
+from tools import FinancialDocumentTool
+from llm_cache import CachedLLM
 
-### Loading LLM
-llm = LLM(model="openai/gpt-4o-mini")
+### Loading LLM (responses are cached locally; see LLM_CACHE_MODE in llm_cache.py)
+### Streaming lets partial output reach /stream/{analysis_id} as it is generated
+LLM_STREAM = os.getenv("LLM_STREAM", "true").lower() in ("1", "true", "yes")
+llm = CachedLLM(model="openai/gpt-4o-mini", stream=LLM_STREAM)
 
 # Creating an Experienced Financial Analyst agent
 financial_analyst = Agent(
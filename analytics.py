@@ -0,0 +1,217 @@
+## Financial Metrics Engine for Financial Document Analyzer
+## Computes liquidity, leverage, coverage, profitability and growth metrics for every
+## reported period at once with NumPy array operations, plus Low/Medium/High risk bands
+
+import re
+
+import numpy as np
+import pandas as pd
+
+## Statement rows the engine reads (missing rows are treated as NaN)
+INPUT_ITEMS = [
+    "revenue", "cost_of_revenue", "gross_profit", "operating_income", "interest_expense",
+    "net_income", "eps_diluted", "shares_diluted", "cash", "inventory",
+    "total_current_assets", "total_assets", "total_current_liabilities", "total_liabilities",
+    "total_debt", "total_equity", "operating_cash_flow", "capital_expenditures",
+]
+
+## Metric -> category, in report order
+METRIC_CATEGORIES = {
+    "current_ratio": "liquidity",
+    "quick_ratio": "liquidity",
+    "cash_ratio": "liquidity",
+    "debt_to_equity": "leverage",
+    "liabilities_to_equity": "leverage",
+    "debt_to_assets": "leverage",
+    "negative_equity": "leverage",
+    "interest_coverage": "coverage",
+    "fcf_to_debt": "coverage",
+    "gross_margin": "profitability",
+    "operating_margin": "profitability",
+    "net_margin": "profitability",
+    "return_on_equity": "profitability",
+    "return_on_assets": "profitability",
+    "free_cash_flow": "cash_flow",
+    "eps_diluted": "per_share",
+    "revenue_growth": "growth",
+    "net_income_growth": "growth",
+    "eps_growth": "growth",
+}
+
+## Risk band thresholds: (direction, lower cut, upper cut)
+## higher_is_safer: High below the lower cut, Medium up to the upper cut, Low at or above it
+## higher_is_riskier: Low below the lower cut, Medium up to the upper cut, High at or above it
+RISK_THRESHOLDS = {
+    "current_ratio": ("higher_is_safer", 1.0, 1.5),
+    "quick_ratio": ("higher_is_safer", 0.7, 1.0),
+    "debt_to_equity": ("higher_is_riskier", 1.0, 2.0),
+    "debt_to_assets": ("higher_is_riskier", 0.4, 0.6),
+    "negative_equity": ("higher_is_riskier", 0.5, 0.5),
+    "interest_coverage": ("higher_is_safer", 1.5, 3.0),
+    "net_margin": ("higher_is_safer", 0.0, 0.05),
+    "operating_margin": ("higher_is_safer", 0.0, 0.08),
+    "revenue_growth": ("higher_is_safer", -0.10, 0.0),
+}
+
+RISK_CATEGORIES = ["liquidity", "leverage", "coverage", "profitability", "growth"]
+RISK_LEVELS = np.array(["Low", "Medium", "High"])
+
+## Tables without a recognizable period header get positional labels P1..Pn (see
+## statements.extract_statements), whose order is unknown
+_POSITIONAL = re.compile(r"P\d+$")
+
+GROWTH_UNAVAILABLE = "Growth metrics unavailable: no dated period header was recognized, so the order of the periods is unknown."
+
+
+## Element-wise division that yields NaN instead of inf for zero/missing denominators
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    out = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=np.isfinite(denominator) & (denominator != 0))
+    return out
+
+
+## Ratio over equity; NaN when equity is zero or negative, where it has no meaning
+## (negative_equity flags those periods instead)
+def _equity_ratio(numerator: np.ndarray, equity: np.ndarray) -> np.ndarray:
+    return _ratio(numerator, np.where(equity > 0, equity, np.nan))
+
+
+## Fill NaN entries of `primary` from `fallback`
+def _coalesce(primary: np.ndarray, fallback: np.ndarray) -> np.ndarray:
+    return np.where(np.isnan(primary), fallback, primary)
+
+
+def dated_periods(periods: list) -> bool:
+    """Whether the periods are dated labels rather than positional P1..Pn"""
+    return not any(_POSITIONAL.match(str(p)) for p in periods)
+
+
+## For each column, the index of the previous column of the same frequency (-1 if none,
+## and for positional columns, which have no known order)
+def _previous_same_frequency(periods: list) -> np.ndarray:
+    previous = np.full(len(periods), -1)
+    if not dated_periods(periods):
+        return previous
+    kinds = ["quarter" if str(p).startswith("Q") else "other" for p in periods]
+    last_seen = {}
+    for i, kind in enumerate(kinds):
+        previous[i] = last_seen.get(kind, -1)
+        last_seen[kind] = i
+    return previous
+
+
+## Period-over-period growth for every row of a 2-D array at once
+def _growth(values: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    base = np.where(previous >= 0, values[..., np.maximum(previous, 0)], np.nan)
+    return _ratio(values - base, np.abs(base))
+
+
+def compute_metrics(statements: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute every metric in METRIC_CATEGORIES for every period in one vectorized pass.
+
+    Args:
+        statements (pd.DataFrame): Line items x periods, as returned by
+            statements.extract_statements.
+
+    Returns:
+        pd.DataFrame: Metrics x periods; NaN where inputs are missing. Growth
+            is NaN throughout for positional periods. Ratios over equity are
+            NaN where equity is zero or negative, and negative_equity is 1 in
+            those periods (0 where equity is positive), which bands leverage
+            as High.
+    """
+    if statements.empty:
+        return pd.DataFrame(dtype=float)
+
+    values = statements.reindex(INPUT_ITEMS).to_numpy(dtype=float)
+    row = dict(zip(INPUT_ITEMS, values))
+
+    revenue = row["revenue"]
+    gross_profit = _coalesce(row["gross_profit"], revenue - row["cost_of_revenue"])
+    debt = row["total_debt"]
+    equity = row["total_equity"]
+    current_liabilities = row["total_current_liabilities"]
+    free_cash_flow = row["operating_cash_flow"] - np.abs(row["capital_expenditures"])
+    eps = _coalesce(row["eps_diluted"], _ratio(row["net_income"], row["shares_diluted"]))
+
+    previous = _previous_same_frequency(list(statements.columns))
+    growth = _growth(np.vstack([revenue, row["net_income"], eps]), previous)
+
+    metrics = {
+        "current_ratio": _ratio(row["total_current_assets"], current_liabilities),
+        "quick_ratio": _ratio(row["total_current_assets"] - row["inventory"], current_liabilities),
+        "cash_ratio": _ratio(row["cash"], current_liabilities),
+        "debt_to_equity": _equity_ratio(debt, equity),
+        "liabilities_to_equity": _equity_ratio(row["total_liabilities"], equity),
+        "debt_to_assets": _ratio(debt, row["total_assets"]),
+        "negative_equity": np.where(np.isnan(equity), np.nan, (equity <= 0).astype(float)),
+        "interest_coverage": _ratio(row["operating_income"], np.abs(row["interest_expense"])),
+        "fcf_to_debt": _ratio(free_cash_flow, debt),
+        "gross_margin": _ratio(gross_profit, revenue),
+        "operating_margin": _ratio(row["operating_income"], revenue),
+        "net_margin": _ratio(row["net_income"], revenue),
+        "return_on_equity": _equity_ratio(row["net_income"], equity),
+        "return_on_assets": _ratio(row["net_income"], row["total_assets"]),
+        "free_cash_flow": free_cash_flow,
+        "eps_diluted": eps,
+        "revenue_growth": growth[0],
+        "net_income_growth": growth[1],
+        "eps_growth": growth[2],
+    }
+    return pd.DataFrame(np.vstack(list(metrics.values())), index=list(metrics), columns=statements.columns)
+
+
+def latest_values(metrics: pd.DataFrame) -> pd.Series:
+    """Most recent non-NaN value of each metric (periods are sorted chronologically)"""
+    if metrics.empty:
+        return pd.Series(dtype=float)
+    values = metrics.to_numpy(dtype=float)
+    filled = ~np.isnan(values)
+    last = np.where(filled.any(axis=1), values.shape[1] - 1 - np.argmax(filled[:, ::-1], axis=1), -1)
+    picked = np.where(last >= 0, values[np.arange(len(values)), np.maximum(last, 0)], np.nan)
+    return pd.Series(picked, index=metrics.index)
+
+
+## Band levels (0 = Low, 1 = Medium, 2 = High) for rows of `values` named by `names`
+def _band_levels(values: np.ndarray, names: list) -> np.ndarray:
+    safer = np.array([RISK_THRESHOLDS[n][0] == "higher_is_safer" for n in names])[:, None]
+    low_cut = np.array([RISK_THRESHOLDS[n][1] for n in names])[:, None]
+    high_cut = np.array([RISK_THRESHOLDS[n][2] for n in names])[:, None]
+
+    level_safer = np.where(values < low_cut, 2, np.where(values < high_cut, 1, 0))
+    level_riskier = np.where(values >= high_cut, 2, np.where(values >= low_cut, 1, 0))
+    return np.where(safer, level_safer, level_riskier)
+
+
+def risk_bands(metrics: pd.DataFrame) -> pd.DataFrame:
+    """
+    Band every thresholded metric in every period as Low/Medium/High.
+
+    Returns a DataFrame of band labels (None where the metric is missing).
+    """
+    names = [name for name in RISK_THRESHOLDS if name in metrics.index]
+    if not names:
+        return pd.DataFrame(dtype=object)
+
+    values = metrics.loc[names].to_numpy(dtype=float)
+    labels = np.where(np.isnan(values), None, RISK_LEVELS[_band_levels(values, names)])
+    return pd.DataFrame(labels, index=names, columns=metrics.columns)
+
+
+def category_ratings(metrics: pd.DataFrame) -> dict:
+    """
+    Rate each risk category on its latest reported metrics.
+
+    A category takes the worst band among its metrics, or "Insufficient data"
+    when none of them are reported.
+    """
+    latest = latest_values(metrics)
+    names = [name for name in RISK_THRESHOLDS if not np.isnan(latest.get(name, np.nan))]
+    levels = dict(zip(names, _band_levels(latest[names].to_numpy(dtype=float)[:, None], names)[:, 0])) if names else {}
+
+    ratings = {}
+    for category in RISK_CATEGORIES:
+        category_levels = [levels[n] for n in names if METRIC_CATEGORIES[n] == category]
+        ratings[category] = str(RISK_LEVELS[max(category_levels)]) if category_levels else "Insufficient data"
+    return ratings
@@ -0,0 +1,75 @@
+## Benchmark: analytics metrics engine on a synthetic multi-period dataset
+##
+## Usage:
+##   python benchmarks/bench_analytics.py                     # 1000 documents x 20 periods
+##   python benchmarks/bench_analytics.py --documents 200 --periods 40
+##
+## Each synthetic document is a full statements table (every INPUT_ITEMS row,
+## quarterly periods) run through compute_metrics, risk_bands and category_ratings.
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import INPUT_ITEMS, compute_metrics, risk_bands, category_ratings
+
+
+## Build one synthetic statements table with `periods` quarterly columns
+def make_statements(rng: np.random.Generator, periods: int) -> pd.DataFrame:
+    labels = [f"Q{q % 4 + 1}-{2000 + q // 4}" for q in range(periods)]
+    revenue = 1000 * np.cumprod(1 + rng.normal(0.02, 0.05, periods))
+    data = {
+        "revenue": revenue,
+        "cost_of_revenue": revenue * rng.uniform(0.6, 0.8, periods),
+        "gross_profit": np.full(periods, np.nan),
+        "operating_income": revenue * rng.uniform(-0.05, 0.2, periods),
+        "interest_expense": revenue * rng.uniform(0.005, 0.03, periods),
+        "net_income": revenue * rng.uniform(-0.05, 0.15, periods),
+        "eps_diluted": np.full(periods, np.nan),
+        "shares_diluted": np.full(periods, 500.0),
+        "cash": revenue * rng.uniform(0.2, 1.0, periods),
+        "inventory": revenue * rng.uniform(0.1, 0.4, periods),
+        "total_current_assets": revenue * rng.uniform(1.0, 2.5, periods),
+        "total_assets": revenue * rng.uniform(4, 6, periods),
+        "total_current_liabilities": revenue * rng.uniform(0.8, 1.6, periods),
+        "total_liabilities": revenue * rng.uniform(2, 3, periods),
+        "total_debt": revenue * rng.uniform(0.2, 2.0, periods),
+        "total_equity": revenue * rng.uniform(1.5, 3, periods),
+        "operating_cash_flow": revenue * rng.uniform(0.05, 0.25, periods),
+        "capital_expenditures": -revenue * rng.uniform(0.03, 0.1, periods),
+    }
+    return pd.DataFrame([data[item] for item in INPUT_ITEMS], index=INPUT_ITEMS, columns=labels)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=1000, help="Number of synthetic documents")
+    parser.add_argument("--periods", type=int, default=20, help="Reported periods per document")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    documents = [make_statements(rng, args.periods) for _ in range(args.documents)]
+
+    timings = []
+    for statements in documents:
+        start = time.perf_counter()
+        metrics = compute_metrics(statements)
+        risk_bands(metrics)
+        category_ratings(metrics)
+        timings.append(time.perf_counter() - start)
+
+    ms = np.array(timings) * 1000
+    print(f"documents={args.documents} periods={args.periods}")
+    print(f"per document: mean={ms.mean():.3f}ms p50={np.percentile(ms, 50):.3f}ms "
+          f"p95={np.percentile(ms, 95):.3f}ms max={ms.max():.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
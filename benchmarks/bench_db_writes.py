@@ -0,0 +1,119 @@
+## Benchmark: concurrent status-update writers against the analysis database
+##
+## Usage:
+##   python benchmarks/bench_db_writes.py                       # 50 workers x 20 analyses each
+##   python benchmarks/bench_db_writes.py --workers 50 --analyses 40
+##   python benchmarks/bench_db_writes.py --legacy              # rollback journal, sqlite3 default 5 s timeout
+##   python benchmarks/bench_db_writes.py --database-url postgresql://...
+##
+## Each worker is a separate process (like a Celery prefork child) that walks its
+## analyses through processing -> success with update_analysis, the way the worker
+## task does. Reports write throughput, latency percentiles and "database is locked"
+## errors, then times a few keyset-paginated /analyses listings.
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+REPORT = "x" * 4000
+
+
+def worker(analysis_ids: list, barrier, results):
+    from sqlalchemy.exc import OperationalError
+    from database import SessionLocal, update_analysis
+
+    db = SessionLocal()
+    latencies = []
+    errors = 0
+    barrier.wait()
+    for analysis_id in analysis_ids:
+        for status, result in (("processing", None), ("success", REPORT)):
+            started = time.perf_counter()
+            try:
+                update_analysis(db, analysis_id, result=result, status=status)
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                db.rollback()
+                errors += 1
+    db.close()
+    results.put((latencies, errors))
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=50, help="Concurrent writer processes")
+    parser.add_argument("--analyses", type=int, default=20, help="Analyses per worker (two updates each)")
+    parser.add_argument("--database-url", default=None, help="Defaults to a fresh SQLite file in a temp dir")
+    parser.add_argument("--legacy", action="store_true", help="Rollback journal and sqlite3's default 5 s lock timeout")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="bench_db_")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ["DB_POOL_SIZE"] = "1"
+    if args.legacy:
+        os.environ.update(SQLITE_JOURNAL_MODE="DELETE", SQLITE_BUSY_TIMEOUT_MS="5000", SQLITE_SYNCHRONOUS="FULL")
+
+    from database import SessionLocal, init_db, save_batch_analyses, get_all_analyses
+
+    init_db()
+    db = SessionLocal()
+    jobs = [
+        {"filename": f"doc_{i}.pdf", "query": "Assess liquidity risk", "document_hash": f"{i:064x}", "query_key": "bench"}
+        for i in range(args.workers * args.analyses)
+    ]
+    analysis_ids = save_batch_analyses(db, "bench", jobs)
+
+    ## Children inherit DATABASE_URL and build their own engines
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(args.workers + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(analysis_ids[i::args.workers], barrier, results))
+        for i in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    barrier.wait()
+    started = time.perf_counter()
+    collected = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    latencies = [latency for worker_latencies, _ in collected for latency in worker_latencies]
+    errors = sum(worker_errors for _, worker_errors in collected)
+    print(f"{args.workers} workers x {args.analyses} analyses ({'legacy' if args.legacy else 'tuned'} settings)")
+    print(f"  updates ok:     {len(latencies)}")
+    print(f"  locked errors:  {errors}")
+    print(f"  throughput:     {len(latencies) / elapsed:,.0f} updates/s")
+    print(f"  latency p50:    {1000 * percentile(latencies, 0.5):.1f} ms")
+    print(f"  latency p95:    {1000 * percentile(latencies, 0.95):.1f} ms")
+    print(f"  latency max:    {1000 * max(latencies, default=float('nan')):.1f} ms")
+
+    ## Walk the listing with keyset pagination
+    page_times = []
+    before = (None, None)
+    for _ in range(5):
+        started = time.perf_counter()
+        page = get_all_analyses(db, limit=100, before_created_at=before[0], before_id=before[1], status="success")
+        page_times.append(time.perf_counter() - started)
+        if not page:
+            break
+        before = (page[-1].created_at, page[-1].id)
+    print(f"  listing page:   {1000 * sum(page_times) / len(page_times):.1f} ms avg over {len(page_times)} pages")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
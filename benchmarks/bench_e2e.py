@@ -0,0 +1,590 @@
+## Benchmark: end-to-end analyses against a local mock LLM and a stub search tool
+##
+## Usage:
+##   python benchmarks/bench_e2e.py                                       # sync + task, 1/10/100/500 pages, concurrency 1 and 4
+##   python benchmarks/bench_e2e.py --scenarios sync --pages 1 50 --concurrency 1 8 --requests 16
+##   python benchmarks/bench_e2e.py --latency-ms 50 --tokens 200 --output baseline.json
+##   python benchmarks/bench_e2e.py --compare baseline.json --tolerance 0.25  # exit 1 on regressions (CI)
+##   python benchmarks/bench_e2e.py --scenarios queue --api-url http://127.0.0.1:8000
+##
+## Scenarios:
+##   sync   POST /analyze (use_queue=false) against the API served by uvicorn in this process
+##   task   celery_worker.analyze_document_task run in-process, without a broker
+##   queue  POST /analyze (use_queue=true) against a running API, following /status until done;
+##          needs Redis and workers started against the mock LLM (see mock_llm.py)
+##
+## Every request uploads a distinct synthetic filing, so result and document caches start
+## cold; the LLM response cache is off unless --llm-cache is given. Reports p50/p95/p99
+## latency, throughput, peak RSS and per-stage timings as JSON.
+
+import os
+import sys
+import json
+import time
+import socket
+import inspect
+import argparse
+import itertools
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ("sync", "task", "queue")
+
+## Latency percentiles checked by --compare
+COMPARED_METRICS = ("p50_ms", "p95_ms")
+
+
+## ----- Synthetic filings -----
+
+STATEMENT_PAGE = [
+    "ACME Corporation Form 10-K Annual Report",
+    "Consolidated Statements of Operations (in millions, except per share data)",
+    "Year ended December 31 2024 2023",
+    "Total revenues $ {revenue:,.1f} $ {revenue_prior:,.1f}",
+    "Cost of revenues {cost:,.1f} {cost_prior:,.1f}",
+    "Gross profit {gross:,.1f} {gross_prior:,.1f}",
+    "Income from operations {operating:,.1f} {operating_prior:,.1f}",
+    "Interest expense ({interest:,.1f}) ({interest_prior:,.1f})",
+    "Net income {net:,.1f} {net_prior:,.1f}",
+    "Consolidated Balance Sheets",
+    "Cash and cash equivalents {cash:,.1f} {cash_prior:,.1f}",
+    "Total current assets {current_assets:,.1f} {current_assets_prior:,.1f}",
+    "Total assets {assets:,.1f} {assets_prior:,.1f}",
+    "Total current liabilities {current_liabilities:,.1f} {current_liabilities_prior:,.1f}",
+    "Total liabilities {liabilities:,.1f} {liabilities_prior:,.1f}",
+    "Total stockholders' equity {equity:,.1f} {equity_prior:,.1f}",
+    "Consolidated Statements of Cash Flows",
+    "Net cash provided by operating activities {ocf:,.1f} {ocf_prior:,.1f}",
+    "Capital expenditures ({capex:,.1f}) ({capex_prior:,.1f})",
+]
+
+NARRATIVE_LINE = (
+    "In the three months ended June 30, 2024 segment revenue was $ {a:,.1f} million, up {b:.1f}% "
+    "from fiscal year 2023, while operating expenses of $ {c:,.1f} million reflected continued investment."
+)
+
+
+def _page_lines(page: int) -> list:
+    scale = 1000 + 37 * page
+    if page % 10 == 0:
+        values = {
+            "revenue": scale * 1.2, "cost": scale * 0.7, "gross": scale * 0.5, "operating": scale * 0.2,
+            "interest": scale * 0.02, "net": scale * 0.15, "cash": scale * 0.4, "current_assets": scale * 1.5,
+            "assets": scale * 5, "current_liabilities": scale * 0.9, "liabilities": scale * 3,
+            "equity": scale * 2, "ocf": scale * 0.25, "capex": scale * 0.08,
+        }
+        values.update({f"{name}_prior": value * 0.9 for name, value in list(values.items())})
+        return [line.format(**values) for line in STATEMENT_PAGE]
+    return [NARRATIVE_LINE.format(a=scale + 11 * line, b=(page + line) % 17 + 0.5, c=scale * 0.3 + line)
+            for line in range(18)]
+
+
+def _pdf_string(text: str) -> str:
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def make_pdf(pages: int, variant: int = 0) -> bytes:
+    """A text PDF of `pages` pages of statements and narrative; `variant` changes only its hash"""
+    out = [b"%PDF-1.4\n"]
+    offsets = {}
+
+    def add(number: int, data: bytes):
+        offsets[number] = sum(len(part) for part in out)
+        out.append(f"{number} 0 obj\n".encode() + data + b"\nendobj\n")
+
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(pages))
+    add(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    add(2, f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    add(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i in range(pages):
+        lines = _page_lines(i)
+        stream = "BT /F1 9 Tf 40 760 Td 11 TL " + " ".join(f"{_pdf_string(line)} Tj T*" for line in lines) + " ET"
+        add(4 + 2 * i, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        ).encode())
+        add(5 + 2 * i, f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode())
+
+    xref_offset = sum(len(part) for part in out)
+    count = 3 + 2 * pages
+    xref = [f"xref\n0 {count + 1}\n0000000000 65535 f \n"]
+    xref += [f"{offsets[number]:010d} 00000 n \n" for number in range(1, count + 1)]
+    xref.append(f"trailer\n<< /Size {count + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+    out.append("".join(xref).encode())
+    out.append(f"% variant {variant}\n".encode())
+    return b"".join(out)
+
+
+## ----- Measurement -----
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else float("nan")
+
+
+def summarize(values: list) -> dict:
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None}
+    return {
+        "p50_ms": round(1000 * percentile(values, 0.5), 1),
+        "p95_ms": round(1000 * percentile(values, 0.95), 1),
+        "p99_ms": round(1000 * percentile(values, 0.99), 1),
+        "mean_ms": round(1000 * sum(values) / len(values), 1),
+        "max_ms": round(1000 * max(values), 1),
+    }
+
+
+class StageTimer:
+    """Wall time per named stage, collected by wrapping the functions that implement it"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, elapsed: float):
+        with self._lock:
+            self.samples.setdefault(name, []).append(elapsed)
+
+    def wrap(self, name: str, function):
+        if inspect.iscoroutinefunction(function):
+            async def timed_async(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - started)
+            return timed_async
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - started)
+        return timed
+
+    def instrument(self, owner, attribute: str, name: str):
+        setattr(owner, attribute, self.wrap(name, getattr(owner, attribute)))
+
+    def take(self) -> dict:
+        with self._lock:
+            samples, self.samples = self.samples, {}
+        return {
+            name: {"calls": len(values), "mean_ms": round(1000 * sum(values) / len(values), 1),
+                   "p95_ms": round(1000 * percentile(values, 0.95), 1)}
+            for name, values in sorted(samples.items())
+        }
+
+
+class RSSSampler:
+    """Peak resident set size of this process while a cell runs (Linux /proc; ru_maxrss elsewhere)"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current_kb() -> int:
+        try:
+            with open("/proc/self/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_kb = max(self.peak_kb, self.current_kb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_kb = self.current_kb()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_kb = max(self.peak_kb, self.current_kb())
+
+
+## ----- Environment -----
+
+def configure_environment(args, workdir: str, llm_base_url: str):
+    """Point the app at the mock LLM and throwaway stores; must run before the app is imported"""
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_API_BASE": llm_base_url,
+        "OPENAI_BASE_URL": llm_base_url,
+        "SERPER_API_KEY": "bench",
+        "CREWAI_DISABLE_TELEMETRY": "true",
+        "OTEL_SDK_DISABLED": "true",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "DOC_CACHE_DIR": os.path.join(workdir, "cache"),
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite"),
+        "LLM_CACHE_MODE": "readwrite" if args.llm_cache else "off",
+        "ANALYSIS_MAX_CONCURRENCY": str(max(args.concurrency)),
+        "ANALYSIS_MAX_PENDING": str(max(args.concurrency) * 2),
+        "ANALYSIS_TIMEOUT_SECONDS": str(args.timeout),
+    })
+
+
+def install_stub_search(latency_ms: float):
+    """Replace the Serper search tool with a local stub answering after latency_ms"""
+    import tools
+    from crewai.tools import BaseTool
+
+    class StubSearchTool(BaseTool):
+        name: str = "Search the internet with Serper"
+        description: str = "Stub web search for benchmarks; returns canned market news."
+
+        def _run(self, search_query: str = "", **kwargs) -> str:
+            time.sleep(latency_ms / 1000)
+            return f"Search results for {search_query}: analysts expect steady growth and stable margins."
+
+    stub = StubSearchTool()
+    tools.get_search_tool = lambda: stub
+
+
+def instrument_stages(timer: StageTimer):
+    """Time the pipeline's stages: parse, screen, index, summary, crew checkout, map-reduce, kickoff, LLM calls"""
+    import crews
+    import llm_cache
+    from crewai import Crew
+
+    for attribute, name in (
+        ("load_document", "parse"),
+        ("prescreen", "prescreen"),
+        ("get_index", "index"),
+        ("build_financial_summary", "financial_summary"),
+        ("map_chunks", "map"),
+        ("condense_findings", "condense"),
+    ):
+        timer.instrument(crews, attribute, name)
+    timer.instrument(crews.crew_factory, "checkout", "crew_checkout")
+    timer.instrument(Crew, "kickoff", "crew_kickoff")
+    timer.instrument(llm_cache.CachedLLM, "call", "llm_call")
+
+
+def lift_agent_rate_limits():
+    """Let map-reduce fan out at full speed; agents' max_rpm protects the real provider, not the mock"""
+    import agents
+    import mapreduce
+    from rate_limit import RateLimiter
+
+    for agent in (agents.financial_analyst, agents.verifier, agents.investment_advisor, agents.risk_assessor):
+        mapreduce._limiters[agent.role] = RateLimiter(0)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class MockLLMProcess:
+    """benchmarks/mock_llm.py in its own interpreter, so serving it costs the app no GIL time"""
+
+    def __init__(self, latency_ms: float, tokens: int, tokens_per_second: float):
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}/v1"
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "benchmarks", "mock_llm.py"), "--port", str(self.port),
+             "--latency-ms", str(latency_ms), "--tokens", str(tokens), "--tokens-per-second", str(tokens_per_second)],
+            stdout=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                self.stats()
+                return
+            except OSError:
+                time.sleep(0.1)
+        self.stop()
+        sys.exit("mock LLM did not start")
+
+    def stats(self) -> dict:
+        from urllib.request import urlopen
+        with urlopen(f"http://127.0.0.1:{self.port}/stats", timeout=5) as response:
+            return json.load(response)
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def start_api(timeout: float) -> str:
+    """Serve main.app with uvicorn on a background thread and wait until /ready"""
+    import httpx
+    import uvicorn
+    import main
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="bench-api", daemon=True).start()
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    sys.exit("API did not become ready")
+
+
+## ----- Scenarios -----
+
+## Variants are numbered across all scenarios so no upload repeats an earlier one
+_variants = itertools.count(1)
+
+
+class Runner:
+    def __init__(self, args, api_url: str = None):
+        self.args = args
+        self.api_url = api_url
+
+    def next_pdf(self, pages: int) -> bytes:
+        return make_pdf(pages, variant=next(_variants))
+
+    def run_sync(self, pages: int) -> bool:
+        import httpx
+        response = httpx.post(
+            f"{self.api_url}/analyze",
+            files={"file": ("bench.pdf", self.next_pdf(pages), "application/pdf")},
+            data={"query": self.args.query, "use_queue": "false"},
+            timeout=self.args.timeout,
+        )
+        return response.status_code == 200 and response.json().get("status") == "success"
+
+    def run_queue(self, pages: int) -> bool:
+        import httpx
+        response = httpx.post(
+            f"{self.api_url}/analyze",
+            files={"file": ("bench.pdf", self.next_pdf(pages), "application/pdf")},
+            data={"query": self.args.query, "use_queue": "true"},
+            timeout=self.args.timeout,
+        )
+        if response.status_code != 200:
+            return False
+        analysis_id = response.json()["analysis_id"]
+        deadline = time.monotonic() + self.args.timeout
+        while time.monotonic() < deadline:
+            status = httpx.get(f"{self.api_url}/status/{analysis_id}", params={"include_result": "false"}).json()
+            if status["status"] in ("success", "failed", "rejected"):
+                return status["status"] == "success"
+            time.sleep(self.args.poll_interval)
+        return False
+
+    def run_task(self, pages: int) -> bool:
+        from celery_worker import analyze_document_task
+        from database import SessionLocal, save_analysis
+        from doc_cache import file_sha256
+
+        os.makedirs("data", exist_ok=True)
+        variant = next(_variants)
+        file_path = os.path.join("data", f"bench_{variant}.pdf")
+        with open(file_path, "wb") as handle:
+            handle.write(make_pdf(pages, variant=variant))
+        document_hash = file_sha256(file_path)
+        db = SessionLocal()
+        try:
+            analysis = save_analysis(db, filename="bench.pdf", query=self.args.query,
+                                     document_hash=document_hash, query_key="bench")
+        finally:
+            db.close()
+        ## Eager apply runs the task body, including its cleanup, on this thread
+        result = analyze_document_task.apply(kwargs={
+            "query": self.args.query,
+            "file_path": file_path,
+            "analysis_id": analysis.id,
+            "document_hash": document_hash,
+        })
+        return result.successful() and result.result.get("status") == "success"
+
+    def run_cell(self, scenario: str, pages: int, concurrency: int, requests: int, timer: StageTimer) -> dict:
+        run_one = getattr(self, f"run_{scenario}")
+
+        def timed(_):
+            started = time.perf_counter()
+            try:
+                ok = run_one(pages)
+            except Exception as exc:
+                print(f"    {scenario} request failed: {exc!r}")
+                ok = False
+            return ok, time.perf_counter() - started
+
+        timer.take()
+        with RSSSampler() as rss:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = list(pool.map(timed, range(requests)))
+            elapsed = time.perf_counter() - started
+
+        latencies = [latency for ok, latency in outcomes if ok]
+        return {
+            "scenario": scenario,
+            "pages": pages,
+            "concurrency": concurrency,
+            "requests": requests,
+            "ok": len(latencies),
+            "errors": requests - len(latencies),
+            "latency": summarize(latencies),
+            "throughput_rps": round(len(latencies) / elapsed, 3),
+            "peak_rss_mb": round(rss.peak_kb / 1024, 1),
+            "stages": timer.take(),
+        }
+
+
+## ----- Baseline comparison -----
+
+def cell_key(cell: dict) -> tuple:
+    return cell["scenario"], cell["pages"], cell["concurrency"]
+
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> list:
+    """Regressions of the compared latency percentiles beyond tolerance, as printable lines"""
+    with open(baseline_path) as handle:
+        baseline = {cell_key(cell): cell for cell in json.load(handle)["results"]}
+    regressions = []
+    for cell in results["results"]:
+        previous = baseline.get(cell_key(cell))
+        if previous is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = previous["latency"][metric], cell["latency"][metric]
+            if old and new is not None and new > old * (1 + tolerance):
+                regressions.append(
+                    f"{cell['scenario']} pages={cell['pages']} c={cell['concurrency']}: "
+                    f"{metric} {old:.0f} -> {new:.0f} ms (+{100 * (new / old - 1):.0f}%)"
+                )
+        if cell["errors"] > previous["errors"]:
+            regressions.append(
+                f"{cell['scenario']} pages={cell['pages']} c={cell['concurrency']}: "
+                f"errors {previous['errors']} -> {cell['errors']}"
+            )
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=["sync", "task"])
+    parser.add_argument("--pages", nargs="+", type=int, default=[1, 10, 100, 500], help="Synthetic filing sizes")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4], help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=8, help="Requests per (scenario, pages, concurrency) cell")
+    parser.add_argument("--query", default="Summarize revenue, profitability and liquidity risk")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Mock LLM time to first token")
+    parser.add_argument("--tokens", type=int, default=300, help="Mock LLM completion length")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Mock LLM generation speed (0: instant)")
+    parser.add_argument("--search-latency-ms", type=float, default=150, help="Stub search tool latency")
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the LLM response cache on")
+    parser.add_argument("--respect-max-rpm", action="store_true", help="Keep agents' max_rpm on map-reduce fan-out")
+    parser.add_argument("--api-url", default=None, help="Running API for the queue scenario")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="Queue scenario /status polling interval")
+    parser.add_argument("--timeout", type=float, default=600, help="Per-request timeout in seconds")
+    parser.add_argument("--output", default=None, help="Write the JSON baseline here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to diff against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative latency increase")
+    parser.add_argument("--verbose", action="store_true", help="Keep the agents' console output")
+    args = parser.parse_args()
+
+    ## Agents run with verbose=True; their transcripts would bury the report
+    report_stream = sys.stdout
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")
+
+    if "queue" in args.scenarios and not args.api_url:
+        sys.exit("--scenarios queue needs --api-url of an API whose workers use the mock LLM")
+
+    invocation_dir = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    llm = MockLLMProcess(args.latency_ms, args.tokens, args.tokens_per_second)
+    configure_environment(args, workdir, llm.base_url)
+    os.chdir(workdir)
+
+    install_stub_search(args.search_latency_ms)
+    timer = StageTimer()
+    instrument_stages(timer)
+    if not args.respect_max_rpm:
+        lift_agent_rate_limits()
+    import crews
+    crews.crew_factory.warm()
+
+    in_process_api = start_api(args.timeout) if "sync" in args.scenarios else None
+    if in_process_api:
+        import main as api
+        timer.instrument(api, "save_upload", "upload")
+
+    cells = []
+    for scenario in args.scenarios:
+        runner = Runner(args, api_url=args.api_url if scenario == "queue" else in_process_api)
+        for pages in sorted(args.pages):
+            for concurrency in sorted(args.concurrency):
+                print(f"{scenario:>5}  pages={pages:<4} concurrency={concurrency:<3}", end="", flush=True, file=sys.stderr)
+                llm_before = llm.stats()["requests"]
+                cell = runner.run_cell(scenario, pages, concurrency, args.requests, timer)
+                cell["llm_requests"] = llm.stats()["requests"] - llm_before
+                cells.append(cell)
+                latency = {name: value if value is not None else float("nan") for name, value in cell["latency"].items()}
+                print(
+                    f"  p50 {latency['p50_ms']:>8.0f} ms  p95 {latency['p95_ms']:>8.0f} ms  "
+                    f"{cell['throughput_rps']:.2f} req/s  rss {cell['peak_rss_mb']:.0f} MB  errors {cell['errors']}",
+                    file=sys.stderr,
+                )
+    llm.stop()
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "mock_llm": {"latency_ms": args.latency_ms, "tokens": args.tokens, "tokens_per_second": args.tokens_per_second},
+            "search_latency_ms": args.search_latency_ms,
+            "llm_cache": args.llm_cache,
+        },
+        "results": cells,
+    }
+    report = json.dumps(results, indent=2)
+    if args.output:
+        output = os.path.join(invocation_dir, args.output)
+        with open(output, "w") as handle:
+            handle.write(report + "\n")
+        print(f"wrote {output}", file=sys.stderr)
+    else:
+        print(report, file=report_stream)
+
+    if args.compare:
+        baseline = os.path.join(invocation_dir, args.compare)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("no regressions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
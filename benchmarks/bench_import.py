@@ -0,0 +1,85 @@
+## Benchmark: API cold-start import time with a regression budget
+##
+## Usage:
+##   python benchmarks/bench_import.py                      # import main, 1500 ms budget
+##   python benchmarks/bench_import.py --module celery_worker --budget-ms 800
+##   python benchmarks/bench_import.py --top 25 --runs 5
+##
+## Runs `python -X importtime -c "import <module>"` in fresh interpreters and reports
+## the best total plus the slowest top-level imports. Exits non-zero when the total
+## exceeds the budget or when any deferred heavy stack (crewai, crewai_tools,
+## langchain, litellm, pandas) is imported eagerly.
+
+import os
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+
+## Stacks that must only load on first use, never at API import time
+DEFERRED_PACKAGES = ("crewai", "crewai_tools", "langchain", "langchain_community", "litellm", "pandas")
+
+
+## Parse -X importtime output into {module: (self_us, cumulative_us, depth)}
+def parse_importtime(stderr: str) -> dict:
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def measure(module: str) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        sys.exit(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    return parse_importtime(completed.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main", help="Module to import")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS, help="Fail above this total import time")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to try; the best run is reported")
+    parser.add_argument("--top", type=int, default=15, help="Slowest top-level imports to list")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda modules: modules[args.module][1])
+    total_ms = best[args.module][1] / 1000
+
+    top_level = sorted(
+        ((cumulative, name) for name, (_, cumulative, depth) in best.items() if depth == 1),
+        reverse=True,
+    )[:args.top]
+    print(f"import {args.module}: {total_ms:.0f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    print(f"{'cumulative ms':>14}  module")
+    for cumulative, name in top_level:
+        print(f"{cumulative / 1000:>14.1f}  {name}")
+
+    eager = sorted(name for name in best if name.split(".")[0] in DEFERRED_PACKAGES and "." not in name)
+    failed = False
+    if eager:
+        print(f"FAIL: deferred packages imported eagerly: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL: {total_ms:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+## Micro-benchmark: text_utils.normalize_whitespace vs. the legacy double-space loop
+##
+## Usage:
+##   python benchmarks/bench_normalize.py                    # 1, 2, 10 and 50 MB inputs
+##   python benchmarks/bench_normalize.py --legacy-max-mb 50 # measure the legacy loop at every size
+##
+## The legacy loop is quadratic (about 45 s at 2 MB, half an hour at 10 MB and hours at 50 MB),
+## so by default it is measured on inputs up to --legacy-max-mb and its time at larger sizes is
+## extrapolated quadratically from the largest measured size, marked "est." in the report.
+## The extrapolation undershoots: the measured growth is steeper than quadratic.
+##
+## A strip_page_headers regression check runs first and fails the script on lost body lines.
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_utils import normalize_whitespace, strip_page_headers
+
+MB = 1024 * 1024
+
+WORDS = [
+    "Revenue", "Net", "income", "Total", "assets", "liabilities", "Operating",
+    "cash", "flow", "$1,234.5", "(89.0)", "2024", "2025", "Q2", "margin", "EPS",
+]
+SEPARATORS = [" ", " ", " ", "  ", "   ", "\t", " ", "\n", "\n\n"]
+
+
+## Build a synthetic filing-like text of roughly `size` bytes
+def make_input(size: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size:
+        word = rng.choice(WORDS)
+        sep = rng.choice(SEPARATORS)
+        parts.append(word)
+        parts.append(sep)
+        total += len(word) + len(sep)
+    return "".join(parts)
+
+
+## Original InvestmentTool.analyze_investment_tool cleanup loop
+def legacy_remove_double_spaces(processed_data: str) -> str:
+    i = 0
+    while i < len(processed_data):
+        if processed_data[i:i+2] == "  ":
+            processed_data = processed_data[:i] + processed_data[i+1:]
+        else:
+            i += 1
+    return processed_data
+
+
+## Regression check for strip_page_headers: running headers and page numbers go, while
+## body lines at the page edges survive even when they are bare figures ("812", a "2024"
+## column header) or differ from page to page only by a number ("Body text page 7")
+def _years(page: int) -> str:
+    return "2024 2023" if page % 2 else "2024"
+
+
+def check_page_headers(pages: int = 40):
+    body = [
+        [f"ACME Corporation Form 10-K | Page {i + 1}", _years(i), "Revenue 1,234.5", "812",
+         "Net income 150.6", f"Body text page {i + 1}", f"{i + 1}"]
+        for i in range(pages)
+    ]
+    cleaned = [page.split("\n") for page in strip_page_headers(["\n".join(lines) for lines in body])]
+    for i, lines in enumerate(cleaned):
+        expected = [_years(i), "Revenue 1,234.5", "812", "Net income 150.6", f"Body text page {i + 1}"]
+        assert lines == expected, f"page {i + 1}: {lines}"
+    short = strip_page_headers(["Revenue 1,234.5\nNet income 150.6\n812\nPage 1 of 2", "Total assets 5,000\nCash 300\n2024\n2 of 2"])
+    assert short == ["Revenue 1,234.5\nNet income 150.6\n812", "Total assets 5,000\nCash 300\n2024"], short
+    print(f"strip_page_headers: ok ({pages} pages)")
+
+
+def timed(fn, text: str) -> float:
+    start = time.perf_counter()
+    fn(text)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 10, 50], help="Input sizes in MB")
+    parser.add_argument("--legacy-max-mb", type=int, default=2,
+                        help="Largest input the legacy loop is measured on; larger sizes are extrapolated")
+    args = parser.parse_args()
+
+    check_page_headers()
+
+    print(f"{'size':>6}  {'normalize_whitespace':>22}  {'legacy loop':>16}  {'speedup':>8}")
+    measured = None
+    for size_mb in sorted(args.sizes):
+        text = make_input(size_mb * MB)
+        new_time = timed(normalize_whitespace, text)
+
+        if size_mb <= args.legacy_max_mb:
+            legacy_time = timed(legacy_remove_double_spaces, text)
+            measured = (size_mb, legacy_time)
+            legacy_col = f"{legacy_time:>15.3f}s"
+        elif measured is not None:
+            legacy_time = measured[1] * (size_mb / measured[0]) ** 2
+            legacy_col = f"{legacy_time:>10.0f}s est."
+        else:
+            legacy_time = None
+            legacy_col = f"{'skipped':>16}"
+        speedup_col = f"{legacy_time / new_time:>7.0f}x" if legacy_time is not None else f"{'-':>8}"
+
+        print(f"{size_mb:>4}MB  {new_time:>21.3f}s  {legacy_col}  {speedup_col}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+## Local OpenAI-compatible chat completions stub for benchmarks
+##
+## Usage:
+##   python benchmarks/mock_llm.py --port 8089 --latency-ms 300 --tokens 400 --tokens-per-second 200
+##   OPENAI_API_BASE=http://127.0.0.1:8089/v1 OPENAI_API_KEY=bench celery -A celery_worker worker ...
+##
+## Answers POST /v1/chat/completions (plain and stream=true) with a ReAct-style final
+## answer of a fixed size after a configurable delay, so end-to-end runs measure our
+## own overhead instead of the provider's. GET /stats returns request counts.
+## bench_e2e.py runs one as a subprocess, so it never competes with the app for the GIL.
+
+import json
+import time
+import uuid
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER = (
+    "Revenue grew 12% year over year to $1,234 million while operating margin widened "
+    "to 18.5%; liquidity remains strong with a current ratio of 1.8. "
+).split()
+
+
+def make_answer(tokens: int) -> str:
+    words = [FILLER[i % len(FILLER)] for i in range(max(tokens - 12, 1))]
+    return "Thought: I now know the final answer\nFinal Answer: VERDICT: PASS. " + " ".join(words)
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms: float = 300, tokens: int = 400, tokens_per_second: float = 0):
+        super().__init__(address, MockLLMHandler)
+        self.latency_ms = latency_ms
+        self.tokens = tokens
+        self.tokens_per_second = tokens_per_second
+        self.requests = 0
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def record(self, body: dict) -> int:
+        prompt_chars = sum(len(str(message.get("content") or "")) for message in body.get("messages", []))
+        with self._lock:
+            self.requests += 1
+            self.prompt_chars += prompt_chars
+        return prompt_chars
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "prompt_chars": self.prompt_chars}
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._send_json(200, self.server.stats())
+        elif self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        server = self.server
+        prompt_chars = server.record(body)
+        time.sleep(server.latency_ms / 1000)
+        answer = make_answer(server.tokens)
+        words = answer.split(" ")
+        usage = {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_chars // 4 + len(words),
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "gpt-4o-mini")
+
+        if not body.get("stream"):
+            if server.tokens_per_second:
+                time.sleep(len(words) / server.tokens_per_second)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def send(payload):
+            self.wfile.write(f"data: {payload}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def chunk(delta: dict, finish_reason=None, **extra):
+            return json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            })
+
+        send(chunk({"role": "assistant", "content": ""}))
+        for i in range(0, len(words), 8):
+            piece = " ".join(words[i:i + 8]) + (" " if i + 8 < len(words) else "")
+            if server.tokens_per_second:
+                time.sleep(len(words[i:i + 8]) / server.tokens_per_second)
+            send(chunk({"content": piece}))
+        send(chunk({}, "stop", usage=usage))
+        send("[DONE]")
+        self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Delay before the first token")
+    parser.add_argument("--tokens", type=int, default=400, help="Completion length in tokens (words)")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Generation speed; 0 sends everything at once")
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        (args.host, args.port), latency_ms=args.latency_ms, tokens=args.tokens, tokens_per_second=args.tokens_per_second
+    )
+    print(f"mock LLM listening on {server.base_url}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
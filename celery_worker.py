@@ -3,13 +3,53 @@
 ## This allows multiple PDF analyses to run simultaneously
 
 import os
-from celery import Celery
+import time
+import datetime
+from celery import Celery, group
+from celery.signals import worker_init, worker_process_init, before_task_publish
 from dotenv import load_dotenv
 load_dotenv()
 
+import checkpoints
+import progress
+import telemetry
+
 ## Redis connection URL
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+## Queues by document size, so a short press release never waits behind a 400-page 10-K;
+## run separate workers per queue (celery -A celery_worker worker -Q analysis.large ...)
+QUEUE_SMALL = "analysis.small"
+QUEUE_LARGE = "analysis.large"
+QUEUE_LARGE_MIN_PAGES = int(os.getenv("QUEUE_LARGE_MIN_PAGES", "100"))
+QUEUE_LARGE_MIN_BYTES = int(os.getenv("QUEUE_LARGE_MIN_BYTES", str(10 * 1024 * 1024)))
+
+## (soft, hard) time limits per analysis on each queue, in seconds
+QUEUE_TIME_LIMITS = {
+    QUEUE_SMALL: (
+        int(os.getenv("QUEUE_SMALL_SOFT_TIME_LIMIT", "300")),
+        int(os.getenv("QUEUE_SMALL_TIME_LIMIT", "360")),
+    ),
+    QUEUE_LARGE: (
+        int(os.getenv("QUEUE_LARGE_SOFT_TIME_LIMIT", "1200")),
+        int(os.getenv("QUEUE_LARGE_TIME_LIMIT", "1500")),
+    ),
+}
+
+## Interactive requests are served before batch work waiting on the same queue
+## (Redis transport: lower numbers are consumed first)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 6
+
+## Runs of one analysis after which it is failed for good. Celery retries stop after max_retries,
+## but redeliveries after a worker crash are not counted by Celery; this stops a document that
+## kills its worker every time from being redelivered forever
+ANALYSIS_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_MAX_ATTEMPTS", "6"))
+
+## Serve Prometheus metrics from the worker on this port (0: off); with the prefork pool set
+## PROMETHEUS_MULTIPROC_DIR too, since tasks record their metrics in the child processes
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+
 ## Create Celery app
 celery_app = Celery(
     "financial_analyzer",
@@ -26,80 +66,331 @@ celery_app.conf.update(
     enable_utc=True,
     task_track_started=True,
     task_acks_late=True,
-    worker_prefetch_multiplier=1,  # One task per worker at a time
-    task_soft_time_limit=300,      # 5 minutes soft limit
-    task_time_limit=360,           # 6 minutes hard limit
+    task_reject_on_worker_lost=True,  # Redeliver tasks of crashed or killed workers; they resume from checkpoints
+    worker_prefetch_multiplier=1,  # One task per worker at a time, so priorities are honoured
+    task_default_queue=QUEUE_SMALL,
+    task_default_priority=3,
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
+    task_soft_time_limit=QUEUE_TIME_LIMITS[QUEUE_SMALL][0],
+    task_time_limit=QUEUE_TIME_LIMITS[QUEUE_SMALL][1],
 )
 
 
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    if WORKER_METRICS_PORT:
+        telemetry.start_metrics_server(WORKER_METRICS_PORT)
+
+
+## Stamp every published task, retries included, so the worker can measure its queue wait
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    if headers is not None:
+        headers["enqueued_at"] = time.time()
+
+
+## Seconds between a task becoming runnable (enqueued, or its retry ETA) and starting;
+## recorded per queue. None when unknown (eager execution, messages from older publishers)
+def _queue_wait(task) -> float:
+    enqueued_at = getattr(task.request, "enqueued_at", None)
+    if enqueued_at is None:
+        return None
+    eta = task.request.eta
+    if eta:
+        if isinstance(eta, str):
+            eta = datetime.datetime.fromisoformat(eta)
+        enqueued_at = max(enqueued_at, eta.timestamp())
+    waited = max(time.time() - enqueued_at, 0.0)
+    telemetry.record_queue_wait((task.request.delivery_info or {}).get("routing_key"), waited)
+    return waited
+
+
+## Import the crewai stack and pre-build crews once per worker process (after the prefork),
+## so the first task does not pay for imports or crew construction
+@worker_process_init.connect
+def preload_crews(**kwargs):
+    import database
+    from crews import crew_factory
+    crew_factory.warm()
+
+
+## Run one analysis job and record its outcome; shared by the single and batch tasks
+## Returns the task result dict; raises for failures that are worth retrying (the caller
+## publishes retrying or failed, since only it knows whether another attempt follows)
+## The job's trace (stage timings, LLM usage) is stored with every outcome; stages checkpointed
+## by earlier attempts are restored rather than rerun
+def _run_job(db, query: str, file_path: str, analysis_id: str, document_hash: str = None, mode: str = None,
+             trace: telemetry.Trace = None) -> dict:
+    stages = checkpoints.load(db, analysis_id)
+    with progress.bind(analysis_id), telemetry.trace_scope(trace), checkpoints.scope(stages):
+        return _run_bound_job(db, query, file_path, analysis_id, document_hash, mode)
+
+
+def _run_bound_job(db, query: str, file_path: str, analysis_id: str, document_hash: str = None, mode: str = None) -> dict:
+    from crews import run_analysis, crew_factory, CREW_MODE
+    from preverify import DocumentRejected
+    from database import update_analysis, get_report, get_analysis
+    from result_cache import make_query_key, lookup_result, note_result_stored
+
+    trace = telemetry.current_trace()
+
+    ## A redelivered task whose analysis already finished (the worker died before acknowledging
+    ## it) has nothing left to do; "failed" is not final here, since retries run after it
+    analysis = get_analysis(db, analysis_id)
+    if analysis is not None and analysis.status in ("success", "rejected"):
+        checkpoints.clear(db, [analysis_id])
+        return {"status": analysis.status, "analysis_id": analysis_id, "error": analysis.error, "redelivered": True}
+
+    attempt = checkpoints.start_attempt()
+    if attempt is not None:
+        trace.attempt = attempt
+        if attempt > ANALYSIS_MAX_ATTEMPTS:
+            error = f"Analysis abandoned after {ANALYSIS_MAX_ATTEMPTS} attempts"
+            update_analysis(db, analysis_id, status="failed", error=error, timings=trace.to_dict())
+            progress.report("failed", error=error)
+            checkpoints.clear(db, [analysis_id])
+            return {"status": "failed", "analysis_id": analysis_id, "error": error}
+
+    ## Update status to processing
+    update_analysis(db, analysis_id, status="processing")
+    progress.report("processing")
+
+    ## An identical request may have finished while this task waited in the queue
+    mode = mode or CREW_MODE
+    cached = lookup_result(db, document_hash, make_query_key(query, mode))
+    if cached:
+        report = get_report(db, cached)
+        update_analysis(db, analysis_id, result=report, status="success", timings=trace.to_dict())
+        progress.report("success", result_url=f"/result/{analysis_id}", cached=True)
+        checkpoints.clear(db, [analysis_id])
+        return {
+            "status": "success",
+            "analysis_id": analysis_id,
+            "result": report,
+            "cached": True
+        }
+
+    try:
+        ## Screen locally, then run the CrewAI crew
+        result = run_analysis(query=query, file_path=file_path, mode=mode, document_hash=document_hash)
+    except DocumentRejected as exc:
+        ## Not a financial document: retrying cannot help
+        update_analysis(db, analysis_id, status="rejected", error=str(exc), timings=trace.to_dict())
+        progress.report("rejected", error=str(exc))
+        checkpoints.clear(db, [analysis_id])
+        return {
+            "status": "rejected",
+            "analysis_id": analysis_id,
+            "error": str(exc)
+        }
+    except Exception as exc:
+        ## Update database with error; checkpoints stay for the next attempt
+        update_analysis(db, analysis_id, status="failed", error=str(exc), timings=trace.to_dict())
+        raise
+
+    ## Update database with success result
+    update_analysis(db, analysis_id, result=str(result), status="success", timings=trace.to_dict())
+    progress.report("success", result_url=f"/result/{analysis_id}")
+    note_result_stored(db)
+    checkpoints.clear(db, [analysis_id])
+
+    setup_seconds = crew_factory.last_setup_seconds()
+    return {
+        "status": "success",
+        "analysis_id": analysis_id,
+        "result": str(result),
+        "setup_ms": round(1000 * setup_seconds, 1) if setup_seconds is not None else None
+    }
+
+
+## Failed attempts are "retrying" while the task has retries left, "failed" after the last one
+def _publish_failure(task, analysis_ids: list, exc: Exception):
+    stage = "retrying" if task.request.retries < task.max_retries else "failed"
+    if stage == "retrying":
+        telemetry.record_retry(task.name)
+    progress.publish_stages(analysis_ids, stage, error=str(exc), attempt=task.request.retries + 1)
+
+
+def _remove_file(file_path: str):
+    if os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except:
+            pass
+
+
 @celery_app.task(bind=True, max_retries=3)
-def analyze_document_task(self, query: str, file_path: str, analysis_id: str):
+def analyze_document_task(self, query: str, file_path: str, analysis_id: str, document_hash: str = None, mode: str = None):
     """
     Celery task to analyze financial document asynchronously.
     
     Args:
         query (str): User's analysis query
-        file_path (str): Path to the uploaded PDF file
+        file_path (str): Path to the uploaded document
         analysis_id (str): Database ID to update with results
+        document_hash (str, optional): SHA-256 of the upload, computed by the API
+        mode (str, optional): Crew mode (see crews.CREW_MODES); defaults to CREW_MODE
         
     Returns:
         dict: Analysis result with status
     """
-    from crewai import Crew, Process
-    from agents import financial_analyst, verifier
-    from task import analyze_financial_document, verification
-    from database import SessionLocal, update_analysis
+    from database import SessionLocal
 
     db = SessionLocal()
+    trace = telemetry.Trace(queue_wait_seconds=_queue_wait(self), attempt=self.request.retries + 1)
+    final = True
 
     try:
-        ## Update status to processing
-        update_analysis(db, analysis_id, status="processing")
-
-        ## Run the CrewAI crew
-        financial_crew = Crew(
-            agents=[verifier, financial_analyst],
-            tasks=[verification, analyze_financial_document],
-            process=Process.sequential,
-        )
-
-        result = financial_crew.kickoff({
-            'query': query,
-            'file_path': file_path
-        })
-
-        ## Update database with success result
-        update_analysis(
-            db,
-            analysis_id,
-            result=str(result),
-            status="success"
-        )
-
-        return {
-            "status": "success",
-            "analysis_id": analysis_id,
-            "result": str(result)
-        }
+        return _run_job(db, query, file_path, analysis_id, document_hash, mode, trace)
 
     except Exception as exc:
-        ## Update database with error
-        update_analysis(
-            db,
-            analysis_id,
-            status="failed",
-            error=str(exc)
-        )
-
-        ## Retry the task up to 3 times
+        ## Retry the task up to 3 times; the upload and the checkpoints are kept for the retry
+        _publish_failure(self, [analysis_id], exc)
+        if self.request.retries < self.max_retries:
+            final = False
+        else:
+            checkpoints.clear(db, [analysis_id])
         raise self.retry(exc=exc, countdown=10, max_retries=3)
 
     finally:
         db.close()
 
-        ## Clean up uploaded file
-        if os.path.exists(file_path):
+        ## Clean up the uploaded file once the analysis has its final outcome (a crashed
+        ## worker never gets here, so a redelivered task still finds it)
+        if final:
+            _remove_file(file_path)
+
+
+@celery_app.task(bind=True, max_retries=3)
+def analyze_batch_document_task(self, file_path: str, document_hash: str, jobs: list):
+    """
+    Celery task running every query of a batch against one document.
+
+    The document is parsed and indexed once, then each query reuses the cached
+    parse. Batches fan out as one task per document (see dispatch_batch).
+
+    Args:
+        file_path (str): Path to the uploaded document
+        document_hash (str): SHA-256 of the upload, computed by the API
+        jobs (list): [analysis_id, query] pairs to run against this document
+
+    Returns:
+        list: One analysis result dict per job
+    """
+    from extraction import load_document
+    from retrieval import get_index
+    from database import SessionLocal, update_analysis
+
+    db = SessionLocal()
+    queue_wait = _queue_wait(self)
+    results = []
+    failed = []
+    retrying = False
+
+    try:
+        try:
+            get_index(load_document(file_path, digest=document_hash))
+        except Exception as exc:
+            for analysis_id, _ in jobs:
+                update_analysis(db, analysis_id, status="failed", error=str(exc))
+            _publish_failure(self, [analysis_id for analysis_id, _ in jobs], exc)
+            raise
+
+        for analysis_id, query in jobs:
             try:
-                os.remove(file_path)
-            except:
-                pass
+                trace = telemetry.Trace(queue_wait_seconds=queue_wait, attempt=self.request.retries + 1)
+                results.append(_run_job(db, query, file_path, analysis_id, document_hash, trace=trace))
+            except Exception as exc:
+                failed.append([analysis_id, query])
+                results.append({"status": "failed", "analysis_id": analysis_id, "error": str(exc)})
+                _publish_failure(self, [analysis_id], exc)
+
+        if failed and self.request.retries < self.max_retries:
+            ## Retry only the failed queries; the file and their checkpoints are kept for the retry
+            retrying = True
+            raise self.retry(args=(file_path, document_hash, failed), countdown=10)
+        checkpoints.clear(db, [analysis_id for analysis_id, _ in failed])
+        return results
+
+    except Exception as exc:
+        if retrying:
+            raise
+        if self.request.retries < self.max_retries:
+            retrying = True
+            raise self.retry(exc=exc, countdown=10)
+        raise
+
+    finally:
+        db.close()
+        if not retrying:
+            _remove_file(file_path)
+
+
+def route_document(file_path: str, size_bytes: int = None) -> str:
+    """
+    Pick the queue for a document: large by byte size alone when that is
+    conclusive, otherwise by page count. Unreadable files and non-PDF
+    documents (parsed without a page tree) go to the small queue.
+    """
+    from extraction import count_pages
+
+    if size_bytes is None:
+        size_bytes = os.path.getsize(file_path)
+    if size_bytes >= QUEUE_LARGE_MIN_BYTES:
+        return QUEUE_LARGE
+    try:
+        pages = count_pages(file_path)
+    except Exception:
+        return QUEUE_SMALL
+    return QUEUE_LARGE if pages >= QUEUE_LARGE_MIN_PAGES else QUEUE_SMALL
+
+
+def dispatch_analysis(query: str, file_path: str, analysis_id: str, document_hash: str = None,
+                      mode: str = None, size_bytes: int = None):
+    """Enqueue an interactive analysis on its size queue, ahead of any waiting batch work"""
+    queue = route_document(file_path, size_bytes)
+    soft_limit, hard_limit = QUEUE_TIME_LIMITS[queue]
+    return analyze_document_task.apply_async(
+        kwargs={
+            "query": query,
+            "file_path": file_path,
+            "analysis_id": analysis_id,
+            "document_hash": document_hash,
+            "mode": mode,
+        },
+        queue=queue,
+        priority=PRIORITY_INTERACTIVE,
+        soft_time_limit=soft_limit,
+        time_limit=hard_limit,
+    )
+
+
+## Fan a batch out as one task per document; per-query analyses within a document run
+## in sequence on the worker that parsed it, so time limits scale with the query count
+def dispatch_batch(documents: list):
+    """
+    Enqueue a batch as a Celery group, each document on its size queue at batch priority.
+
+    Args:
+        documents (list): dicts with "file_path", "document_hash", "jobs" ([analysis_id, query] pairs)
+            and optionally "size_bytes"
+
+    Returns:
+        GroupResult for the whole batch
+    """
+    signatures = []
+    for document in documents:
+        queue = route_document(document["file_path"], document.get("size_bytes"))
+        soft_limit, hard_limit = QUEUE_TIME_LIMITS[queue]
+        signatures.append(analyze_batch_document_task.signature(
+            (document["file_path"], document["document_hash"], document["jobs"]),
+            queue=queue,
+            priority=PRIORITY_BATCH,
+            soft_time_limit=soft_limit * len(document["jobs"]),
+            time_limit=hard_limit * len(document["jobs"]),
+        ))
+    return group(signatures).apply_async()
@@ -0,0 +1,124 @@
+## Stage Checkpoints for Financial Document Analyzer
+## Completed stages of an analysis (parsed document, verification, map findings, report sections)
+## are stored under its id, so a Celery retry or a redelivery after a worker crash resumes from
+## the last completed stage instead of paying for every LLM call again
+
+import os
+import logging
+import threading
+import contextlib
+import contextvars
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+## Turn off to always rerun analyses from scratch
+CHECKPOINTS_ENABLED = os.getenv("CHECKPOINTS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class Checkpoints:
+    """
+    Checkpoints of one analysis.
+
+    Stored checkpoints are loaded once when the analysis is bound; saves go
+    straight to the database on their own session, so section and map threads
+    can save concurrently. Saving is best effort: a failed write costs a rerun
+    of that stage on the next attempt, never the analysis itself.
+    """
+
+    def __init__(self, analysis_id: str, stored: dict):
+        self.analysis_id = analysis_id
+        self.stored = stored
+        self._lock = threading.Lock()
+
+    def get(self, stage: str):
+        """The stored payload of a completed stage, or None"""
+        with self._lock:
+            payload = self.stored.get(stage)
+        if payload is not None:
+            telemetry.record_resume(stage)
+        return payload
+
+    def start_attempt(self) -> int:
+        """Count a run of the analysis (Celery retries and redeliveries alike); returns the count"""
+        with self._lock:
+            attempt = self.stored.get("attempts", 0) + 1
+        self.save("attempts", attempt)
+        return attempt
+
+    def save(self, stage: str, payload):
+        from database import SessionLocal, save_checkpoint
+
+        db = SessionLocal()
+        try:
+            save_checkpoint(db, self.analysis_id, stage, payload)
+        except Exception:
+            logger.warning("could not checkpoint %s of analysis %s", stage, self.analysis_id, exc_info=True)
+            return
+        finally:
+            db.close()
+        with self._lock:
+            self.stored[stage] = payload
+
+
+_current = contextvars.ContextVar("checkpoints", default=None)
+
+
+def load(db, analysis_id: str) -> Checkpoints:
+    """The checkpoints of an analysis, or None when checkpointing is off"""
+    if not CHECKPOINTS_ENABLED or not analysis_id:
+        return None
+    from database import get_checkpoints
+    return Checkpoints(analysis_id, get_checkpoints(db, analysis_id))
+
+
+@contextlib.contextmanager
+def scope(checkpoints: Checkpoints):
+    """
+    Make `checkpoints` the current analysis's checkpoints in this context.
+
+    Threads do not inherit the scope: code fanning work out to a pool enters
+    it again inside each worker (see crews.run_full_report). A None scope
+    disables checkpointing, so callers need not check.
+    """
+    token = _current.set(checkpoints)
+    try:
+        yield checkpoints
+    finally:
+        _current.reset(token)
+
+
+def current() -> Checkpoints:
+    return _current.get()
+
+
+def restore(stage: str):
+    """The stored payload of a stage of the current analysis, or None"""
+    checkpoints = _current.get()
+    return checkpoints.get(stage) if checkpoints is not None else None
+
+
+def save(stage: str, payload):
+    """Checkpoint a completed stage of the current analysis"""
+    checkpoints = _current.get()
+    if checkpoints is not None:
+        checkpoints.save(stage, payload)
+
+
+def start_attempt() -> int:
+    """Count a run of the current analysis; None when checkpointing is off"""
+    checkpoints = _current.get()
+    return checkpoints.start_attempt() if checkpoints is not None else None
+
+
+def clear(db, analysis_ids: list):
+    """Drop the checkpoints of analyses that reached a terminal status"""
+    if not CHECKPOINTS_ENABLED or not analysis_ids:
+        return
+    from database import delete_checkpoints
+    try:
+        delete_checkpoints(db, analysis_ids)
+    except Exception:
+        db.rollback()
+        logger.warning("could not delete checkpoints of %s", ", ".join(analysis_ids), exc_info=True)
@@ -0,0 +1,419 @@
+## Crew Assembly for Financial Document Analyzer
+## Shared by the synchronous API path (main.run_crew) and the Celery worker
+
+import os
+import re
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from crewai import Crew, Process
+from crewai.utilities.events import (
+    crewai_event_bus, LLMStreamChunkEvent, AgentExecutionStartedEvent, AgentExecutionCompletedEvent,
+    AgentExecutionErrorEvent
+)
+
+from agents import financial_analyst, verifier, investment_advisor, risk_assessor
+from task import (
+    analyze_financial_document, verification, verify_and_analyze, reduce_chunk_findings,
+    investment_analysis, risk_assessment
+)
+from extraction import load_document, join_pages
+from statements import build_financial_summary
+from preverify import prescreen
+from retrieval import get_index, format_passages
+from sections import split_sections
+from mapreduce import map_chunks, condense_findings, limiter_for
+from intent import INTENT_ROUTING, COMPLEX_MAX_ITER, classify_query, answer_from_statements, record_route
+import checkpoints
+import progress
+import telemetry
+
+## sequential: verifier then analyst (two LLM tasks)
+## merged: one task that verifies and analyzes in a single round-trip
+## mapreduce: parallel per-section extraction, then one reduce task (for very large filings)
+## full: verification, then analysis, investment and risk tasks in parallel, merged into one report
+## lookup: no crew; figures straight from the statement tables, or one short LLM call
+## auto: routed by query intent (see intent.py) when INTENT_ROUTING is on: lookups to lookup,
+## report requests to full with COMPLEX_MAX_ITER; everything else mapreduce above
+## MAPREDUCE_MIN_CHARS, else merged when the local pre-verifier is highly confident,
+## sequential otherwise
+CREW_MODES = ("auto", "sequential", "merged", "mapreduce", "full", "lookup")
+CREW_MODE = os.getenv("CREW_MODE", "auto")
+MAPREDUCE_MIN_CHARS = int(os.getenv("MAPREDUCE_MIN_CHARS", "150000"))
+
+## Passages given to the single lookup LLM call when the statement tables lack the answer
+LOOKUP_TOP_K = int(os.getenv("LOOKUP_TOP_K", "3"))
+
+LOOKUP_PROMPT = (
+    "Question: {query}\n\n"
+    "Answer in at most three sentences using only the figures and excerpts below. "
+    "Give each figure with its period and unit and cite the page. "
+    "If the answer is not stated, say so.\n\n"
+    "{financial_summary}\n\nExcerpts:\n{passages}"
+)
+
+## Idle pre-built crews kept per template
+CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", "2"))
+
+## Full-report sections, each on its own agent so the three can execute at the same time
+## (crewai allows only one trailing async task per crew, so each section is its own crew)
+FULL_REPORT_SECTIONS = {
+    "analysis": (financial_analyst, analyze_financial_document),
+    "investment": (investment_advisor, investment_analysis),
+    "risk": (risk_assessor, risk_assessment),
+}
+
+CREW_KEYS = ("sequential", "merged", "mapreduce", "verification") + tuple(f"full:{name}" for name in FULL_REPORT_SECTIONS)
+
+
+## Crew templates by key: the crew modes plus the verification and per-section crews of full mode
+def build_crew(key: str) -> Crew:
+    if key == "mapreduce":
+        return Crew(agents=[financial_analyst], tasks=[reduce_chunk_findings], process=Process.sequential)
+    if key == "merged":
+        return Crew(agents=[financial_analyst], tasks=[verify_and_analyze], process=Process.sequential)
+    if key == "verification":
+        return Crew(agents=[verifier], tasks=[verification], process=Process.sequential)
+    if key.startswith("full:"):
+        agent, task = FULL_REPORT_SECTIONS[key[len("full:"):]]
+        return Crew(agents=[agent], tasks=[task], process=Process.sequential)
+    return Crew(
+        agents=[verifier, financial_analyst],
+        tasks=[verification, analyze_financial_document],
+        process=Process.sequential,
+    )
+
+
+class CrewFactory:
+    """
+    Hands out isolated per-request crews.
+
+    kickoff interpolates inputs into its agents and tasks in place, so a crew
+    (and the module-level agents and tasks) must never serve two requests at
+    once. Each template is built once; every checkout gets its own copy.
+    Up to pool_size copies per template are prepared ahead of time on a
+    background thread, so a checkout is normally just a pop.
+    """
+
+    def __init__(self, pool_size: int = CREW_POOL_SIZE):
+        self.pool_size = pool_size
+        self._templates = {}
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._refill_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="crew-refill")
+        self._local = threading.local()
+        self.checkouts = 0
+        self.prebuilt = 0
+        self.checkout_seconds = 0.0
+        self.setups = 0
+        self.setup_seconds = 0.0
+
+    def _template(self, key: str) -> Crew:
+        with self._lock:
+            if key not in self._templates:
+                self._templates[key] = build_crew(key)
+                self._idle[key] = deque()
+            return self._templates[key]
+
+    def _refill(self, key: str):
+        template = self._template(key)
+        while True:
+            with self._lock:
+                if len(self._idle[key]) >= self.pool_size:
+                    return
+            crew = template.copy()
+            with self._lock:
+                self._idle[key].append(crew)
+
+    def warm(self, keys=None):
+        """Build templates and fill the idle pools (call at process start)"""
+        for key in keys or CREW_KEYS:
+            self._refill(key)
+
+    def checkout(self, key: str) -> Crew:
+        """Return a crew no other request holds; it is never handed out again"""
+        started = time.perf_counter()
+        template = self._template(key)
+        with self._lock:
+            crew = self._idle[key].popleft() if self._idle[key] else None
+        prebuilt = crew is not None
+        if not prebuilt:
+            crew = template.copy()
+        if self.pool_size:
+            self._refill_pool.submit(self._refill, key)
+
+        elapsed = time.perf_counter() - started
+        telemetry.observe_stage("crew_checkout", elapsed)
+        with self._lock:
+            self.checkouts += 1
+            self.prebuilt += prebuilt
+            self.checkout_seconds += elapsed
+        return crew
+
+    def record_setup(self, seconds: float):
+        """Record the time a request spent before kickoff (parse, screen, summarize, checkout)"""
+        self._local.last_setup_seconds = seconds
+        with self._lock:
+            self.setups += 1
+            self.setup_seconds += seconds
+
+    def last_setup_seconds(self) -> float:
+        """Setup time of the latest request run on the calling thread"""
+        return getattr(self._local, "last_setup_seconds", None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "templates": len(self._templates),
+                "idle": sum(len(idle) for idle in self._idle.values()),
+                "checkouts": self.checkouts,
+                "prebuilt": self.prebuilt,
+                "avg_checkout_ms": 1000 * self.checkout_seconds / self.checkouts if self.checkouts else 0.0,
+                "avg_setup_ms": 1000 * self.setup_seconds / self.setups if self.setups else 0.0,
+            }
+
+
+_VERDICT = re.compile(r"\b(PASS|FAIL)\b")
+
+
+class FullReport(dict):
+    """Structured full-report result; str() renders it as JSON for storage and API responses"""
+
+    def __str__(self):
+        return json.dumps(self, indent=2)
+
+
+## The verifier's verdict: FAIL only when it says FAIL and never PASS, or says FAIL last
+def verification_verdict(report: str) -> str:
+    verdicts = _VERDICT.findall(report)
+    if not verdicts:
+        return "UNKNOWN"
+    if "PASS" not in verdicts:
+        return "FAIL"
+    return verdicts[-1]
+
+
+## Raise the iteration budget of a checked-out crew's agents (copies, so the templates are untouched)
+def _set_max_iter(crew: Crew, max_iter: int):
+    for agent in crew.agents:
+        agent.max_iter = max_iter
+
+
+def run_full_report(inputs: dict, max_iter: int = None) -> FullReport:
+    """
+    Verify the document, then run the analysis, investment and risk sections in parallel.
+
+    Latency is verification plus the slowest section rather than the sum of all
+    three. A FAIL verdict stops before the sections run. `max_iter` overrides
+    the agents' iteration budget.
+    """
+    verification_report = checkpoints.restore("verification")
+    if verification_report is None:
+        verification_crew = crew_factory.checkout("verification")
+        if max_iter:
+            _set_max_iter(verification_crew, max_iter)
+        with telemetry.span("kickoff.verification"):
+            verification_report = str(verification_crew.kickoff(inputs))
+        checkpoints.save("verification", verification_report)
+    report = FullReport(
+        verdict=verification_verdict(verification_report),
+        verification=verification_report,
+    )
+    if report["verdict"] == "FAIL":
+        return report
+    progress.report("analyzing")
+
+    ## Sections finished by an earlier attempt are not rerun
+    for name in FULL_REPORT_SECTIONS:
+        section = checkpoints.restore(f"section:{name}")
+        if section is not None:
+            report[name] = section
+    pending = [name for name in FULL_REPORT_SECTIONS if name not in report]
+
+    ## Check out every section crew before starting any, so none waits on a copy mid-run
+    section_crews = {name: crew_factory.checkout(f"full:{name}") for name in pending}
+    if max_iter:
+        for crew in section_crews.values():
+            _set_max_iter(crew, max_iter)
+
+    ## Each section streams its output tagged with its name, is timed into the same trace
+    ## and is checkpointed as soon as it finishes
+    analysis_id = progress.current_analysis()
+    trace = telemetry.current_trace()
+    stages = checkpoints.current()
+
+    def run_section(name):
+        with progress.bind(analysis_id, section=name), telemetry.trace_scope(trace), checkpoints.scope(stages):
+            with telemetry.span(f"kickoff.{name}"):
+                section = str(section_crews[name].kickoff(inputs))
+            checkpoints.save(f"section:{name}", section)
+            return name, section
+
+    if section_crews:
+        with ThreadPoolExecutor(max_workers=len(section_crews), thread_name_prefix="full-report") as pool:
+            report.update(pool.map(run_section, section_crews))
+    ## Sections in their usual order, whichever attempt produced them
+    return FullReport(
+        verdict=report["verdict"], verification=report["verification"],
+        **{name: report[name] for name in FULL_REPORT_SECTIONS}
+    )
+
+
+## Shared factory; workers warm it at process start (see celery_worker.preload_crews)
+crew_factory = CrewFactory()
+
+
+## Streamed LLM output goes to the progress channel of the analysis bound to the emitting thread
+@crewai_event_bus.on(LLMStreamChunkEvent)
+def forward_stream_chunk(source, event):
+    progress.stream_output(event.chunk)
+
+
+## Agent executions run on the emitting thread, so spans and LLM usage between these events
+## are attributed to the agent
+@crewai_event_bus.on(AgentExecutionStartedEvent)
+def trace_agent_started(source, event):
+    telemetry.agent_started(event.agent.role)
+
+
+@crewai_event_bus.on(AgentExecutionCompletedEvent)
+@crewai_event_bus.on(AgentExecutionErrorEvent)
+def trace_agent_finished(source, event):
+    telemetry.agent_finished(event.agent.role)
+
+
+def run_lookup(query: str, document: dict, intent: dict) -> str:
+    """
+    Answer a figure lookup without a crew.
+
+    Figures come straight from the statement tables when the query asks for
+    nothing else (see intent.classify_query) and they report every requested
+    item; otherwise the analyst's LLM answers in one short call over
+    the statement summary and the most relevant passages.
+    """
+    if intent["direct"]:
+        with telemetry.span("lookup.statements"):
+            answer = answer_from_statements(intent, document["full_text"], document.get("statements"))
+        if answer is not None:
+            return answer
+
+    progress.report("analyzing")
+    with telemetry.span("index"):
+        index = get_index(document)
+    with telemetry.span("financial_summary"):
+        financial_summary = build_financial_summary(document["full_text"], document.get("statements"))
+    prompt = LOOKUP_PROMPT.format(
+        query=query,
+        financial_summary=financial_summary,
+        passages=format_passages(index.search(query, LOOKUP_TOP_K)),
+    )
+    limiter_for(financial_analyst).acquire()
+    with telemetry.span("lookup.llm"), telemetry.agent_scope(financial_analyst.role):
+        return str(financial_analyst.llm.call([{"role": "user", "content": prompt}]))
+
+
+def run_analysis(query: str, file_path: str, mode: str = CREW_MODE, document_hash: str = None):
+    """
+    Screen, summarize and analyze a document.
+
+    Raises preverify.DocumentRejected before any LLM call when the document is
+    clearly not financial. `document_hash` is the upload's SHA-256, if known.
+    In auto mode the query's intent picks the route (see intent.py); the
+    decision and its latency are logged. Stages checkpointed by an earlier
+    attempt of the current analysis (see checkpoints.py) are not rerun.
+    """
+    if mode not in CREW_MODES:
+        raise ValueError(f"Unknown crew mode '{mode}', expected one of {CREW_MODES}")
+
+    started = time.perf_counter()
+    intent = classify_query(query) if mode == "auto" and INTENT_ROUTING else None
+    mode, result = _run_routed(query, file_path, mode, document_hash, intent, started)
+    if intent is not None:
+        record_route(intent, mode, time.perf_counter() - started)
+    return result
+
+
+## Parsed document of the analysis: checkpointed without full_text (it is rebuilt from the pages),
+## so a retry needs neither the upload nor a parsed-document cache entry
+def _load_document(file_path: str, document_hash: str = None) -> dict:
+    stored = checkpoints.restore("document")
+    if stored is not None:
+        return {**stored, "full_text": join_pages(stored["pages"])}
+    document = load_document(file_path, digest=document_hash)
+    checkpoints.save("document", {key: value for key, value in document.items() if key != "full_text"})
+    return document
+
+
+## Task callback of the sequential crew's verification task (runs on the kickoff thread)
+def _verified(output):
+    checkpoints.save("verification", output.raw)
+    progress.report("analyzing")
+
+
+## Returns (the mode that ran, its result)
+def _run_routed(query: str, file_path: str, mode: str, document_hash: str, intent: dict, started: float):
+    progress.report("verifying")
+    document = _load_document(file_path, document_hash)
+    text = document["full_text"]
+    with telemetry.span("prescreen"):
+        screening = prescreen(text)
+
+    max_iter = None
+    if intent is not None and intent["tier"] == "simple":
+        mode = "lookup"
+    elif intent is not None and intent["tier"] == "complex":
+        mode, max_iter = "full", COMPLEX_MAX_ITER
+    if mode == "lookup":
+        return mode, run_lookup(query, document, intent or classify_query(query))
+
+    ## Build (or load) the retrieval index up front so search_document_tool calls are instant
+    with telemetry.span("index"):
+        get_index(document)
+
+    if mode == "auto":
+        if len(text) >= MAPREDUCE_MIN_CHARS:
+            mode = "mapreduce"
+        else:
+            mode = "merged" if screening["confidence"] == "high" else "sequential"
+
+    ## Pre-extract statement tables so agents get a compact summary instead of the raw document
+    with telemetry.span("financial_summary"):
+        financial_summary = build_financial_summary(text, document.get("statements"))
+
+    inputs = {
+        'query': query,
+        'file_path': file_path,
+        'financial_summary': financial_summary
+    }
+    ## The sequential crew verifies in its first task; every other mode is analyzing from here on
+    if mode not in ("sequential", "full"):
+        progress.report("analyzing")
+    if mode == "mapreduce":
+        chunk_findings = checkpoints.restore("condense")
+        if chunk_findings is None:
+            with telemetry.span("map"):
+                findings = map_chunks(query, split_sections(document["pages"]), financial_analyst)
+            with telemetry.span("condense"):
+                chunk_findings = condense_findings(query, findings, financial_analyst)
+            checkpoints.save("condense", chunk_findings)
+        inputs['chunk_findings'] = chunk_findings
+
+    if mode == "full":
+        crew_factory.record_setup(time.perf_counter() - started)
+        return mode, run_full_report(inputs, max_iter)
+
+    ## A sequential run whose verification finished in an earlier attempt runs only the analysis task
+    if mode == "sequential" and checkpoints.restore("verification") is not None:
+        progress.report("analyzing")
+        financial_crew = crew_factory.checkout("full:analysis")
+    else:
+        financial_crew = crew_factory.checkout(mode)
+        if mode == "sequential":
+            financial_crew.tasks[0].callback = _verified
+    crew_factory.record_setup(time.perf_counter() - started)
+    with telemetry.span(f"kickoff.{mode}"):
+        return mode, financial_crew.kickoff(inputs)
@@ -2,23 +2,74 @@
 ## Uses SQLAlchemy with SQLite (can be swapped for PostgreSQL)
 
 import os
+import json
+import zlib
 import uuid
+import hashlib
 import datetime
-from sqlalchemy import create_engine, Column, String, Text, DateTime, Float
+from sqlalchemy import (
+    create_engine, event, Column, String, Text, DateTime, Float, Integer, LargeBinary, Index,
+    inspect, text, or_, and_
+)
+from sqlalchemy.dialects import sqlite, postgresql
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, defer
+
+import telemetry
 
 ## Database URL - SQLite for local, PostgreSQL for production
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./financial_analyzer.db")
 
+## Connection pool (per process: API workers and each Celery worker have their own)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+## SQLite only: WAL lets readers run alongside the writer; busy_timeout makes writers wait
+## for the lock instead of failing with "database is locked"
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+IS_SQLITE_MEMORY = IS_SQLITE and (":memory:" in DATABASE_URL or DATABASE_URL.rstrip("/") == "sqlite:")
+
+## Statuses after which an analysis no longer changes
+TERMINAL_STATUSES = ("success", "failed", "rejected")
+
+## Reports are stored zlib-compressed, which is exactly HTTP's "deflate" content coding
+REPORT_ENCODING = "deflate"
+REPORT_COMPRESSION_LEVEL = int(os.getenv("REPORT_COMPRESSION_LEVEL", "6"))
+
 ## Create engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+_engine_options = {}
+if IS_SQLITE:
+    _engine_options["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+if not IS_SQLITE_MEMORY:
+    _engine_options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=not IS_SQLITE,
+    )
+engine = create_engine(DATABASE_URL, **_engine_options)
+
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        if not IS_SQLITE_MEMORY:
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.close()
+
 
-## Create session
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+## Create session; objects stay usable after commit so writes need no refresh round-trip
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 ## Base class
 Base = declarative_base()
@@ -31,17 +82,71 @@ class AnalysisResult(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     filename = Column(String, nullable=False)
     query = Column(Text, nullable=False)
-    result = Column(Text, nullable=True)
-    status = Column(String, default="pending")  # pending, processing, success, failed
+    result = Column(Text, nullable=True)           # Legacy inline report; new reports live in analysis_reports
+    status = Column(String, default="pending")  # pending, processing, success, failed, rejected
     error = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
+    document_hash = Column(String, nullable=True)  # SHA-256 of the uploaded file
+    query_key = Column(String, nullable=True)      # Normalized query hash; NULL once evicted from the result cache
+    batch_id = Column(String, nullable=True)       # Set for analyses submitted through /analyze/batch
+    result_sha256 = Column(String, nullable=True)  # Key of the compressed report in analysis_reports
+    timings = Column(Text, nullable=True)          # JSON trace of the last attempt: stages, LLM usage, queue wait
+
+    __table_args__ = (
+        Index("ix_analysis_results_cache_key", "document_hash", "query_key", "status"),
+        Index("ix_analysis_results_batch_id", "batch_id"),
+        Index("ix_analysis_results_created_id", "created_at", "id"),
+        Index("ix_analysis_results_status_created", "status", "created_at", "id"),
+    )
+
+
+## Compressed report bodies, content-addressed so cached and batch copies share one row
+class AnalysisReport(Base):
+    __tablename__ = "analysis_reports"
+
+    sha256 = Column(String, primary_key=True)      # SHA-256 of the UTF-8 report text
+    encoding = Column(String, nullable=False, default=REPORT_ENCODING)
+    size = Column(Integer, nullable=False)         # Uncompressed size in bytes
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+## Intermediate results of an in-progress analysis (parsed document, verification, partial
+## analysis), so a retried or redelivered task resumes instead of starting over (see checkpoints.py)
+class AnalysisCheckpoint(Base):
+    __tablename__ = "analysis_checkpoints"
+
+    analysis_id = Column(String, primary_key=True)
+    stage = Column(String, primary_key=True)
+    data = Column(LargeBinary, nullable=False)     # zlib-compressed JSON
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+## Columns added after the first release; SQLite create_all does not alter existing tables
+_ADDED_COLUMNS = {
+    "document_hash": "VARCHAR",
+    "query_key": "VARCHAR",
+    "batch_id": "VARCHAR",
+    "result_sha256": "VARCHAR",
+    "timings": "TEXT",
+}
 
 
 ## Create all tables
 def init_db():
     Base.metadata.create_all(bind=engine)
 
+    existing = {column["name"] for column in inspect(engine).get_columns(AnalysisResult.__tablename__)}
+    with engine.begin() as conn:
+        for name, ddl_type in _ADDED_COLUMNS.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {AnalysisResult.__tablename__} ADD COLUMN {name} {ddl_type}"))
+
+    ## Indexes on pre-existing tables are not created by create_all either
+    for index in AnalysisResult.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
 
 ## Get database session
 def get_db():
@@ -53,38 +158,234 @@ def get_db():
 
 
 ## Save new analysis to database
-def save_analysis(db, filename: str, query: str) -> AnalysisResult:
+@telemetry.timed("db.save_analysis")
+def save_analysis(db, filename: str, query: str, document_hash: str = None, query_key: str = None) -> AnalysisResult:
     analysis = AnalysisResult(
         id=str(uuid.uuid4()),
         filename=filename,
         query=query,
         status="pending",
-        created_at=datetime.datetime.utcnow()
+        created_at=datetime.datetime.utcnow(),
+        document_hash=document_hash,
+        query_key=query_key
     )
     db.add(analysis)
     db.commit()
-    db.refresh(analysis)
     return analysis
 
 
-## Update analysis result in database
-def update_analysis(db, analysis_id: str, result: str = None, status: str = "success", error: str = None):
-    analysis = db.query(AnalysisResult).filter(AnalysisResult.id == analysis_id).first()
-    if analysis:
-        analysis.result = result
-        analysis.status = status
-        analysis.error = error
-        analysis.completed_at = datetime.datetime.utcnow()
-        db.commit()
-        db.refresh(analysis)
-    return analysis
+## Save every analysis of a batch in one transaction and return their ids in job order
+## Each job is a dict with filename, query, document_hash and query_key, plus optional status and result_sha256
+def save_batch_analyses(db, batch_id: str, jobs: list) -> list:
+    now = datetime.datetime.utcnow()
+    analyses = [
+        AnalysisResult(
+            id=str(uuid.uuid4()),
+            filename=job["filename"],
+            query=job["query"],
+            status=job.get("status", "pending"),
+            created_at=now,
+            completed_at=now if job.get("status") == "success" else None,
+            document_hash=job["document_hash"],
+            query_key=job["query_key"],
+            batch_id=batch_id,
+            result_sha256=job.get("result_sha256")
+        )
+        for job in jobs
+    ]
+    db.add_all(analyses)
+    db.commit()
+    return [analysis.id for analysis in analyses]
+
 
+## Compress and store a report once per distinct text and return its key (does not commit)
+def store_report(db, report: str) -> str:
+    raw = report.encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()
+    values = {
+        "sha256": digest,
+        "encoding": REPORT_ENCODING,
+        "size": len(raw),
+        "data": zlib.compress(raw, REPORT_COMPRESSION_LEVEL),
+        "created_at": datetime.datetime.utcnow()
+    }
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        db.execute(insert(AnalysisReport).values(**values).on_conflict_do_nothing(index_elements=["sha256"]))
+    elif db.get(AnalysisReport, digest) is None:
+        db.add(AnalysisReport(**values))
+        db.flush()
+    return digest
 
-## Get analysis by ID
+
+## Update analysis result in database with a single UPDATE statement (no SELECT, no refresh)
+## Pass the report text as `result`, or `result_sha256` to point at an already stored report
+## completed_at is stamped only for terminal statuses; returns True if the row exists
+## `timings` (a telemetry.Trace dict) replaces the stored trace when given
+@telemetry.timed("db.update_analysis")
+def update_analysis(db, analysis_id: str, result: str = None, status: str = "success", error: str = None,
+                    result_sha256: str = None, timings: dict = None) -> bool:
+    if result is not None:
+        result_sha256 = store_report(db, result)
+    values = {"result": None, "result_sha256": result_sha256, "status": status, "error": error}
+    if timings is not None:
+        values["timings"] = json.dumps(timings)
+    if status in TERMINAL_STATUSES:
+        values["completed_at"] = datetime.datetime.utcnow()
+    ## "fetch" refreshes an instance this session already holds (SessionLocal does not expire
+    ## on commit), so a later get_analysis in the same session sees the new status
+    updated = (
+        db.query(AnalysisResult)
+        .filter(AnalysisResult.id == analysis_id)
+        .update(values, synchronize_session="fetch")
+    )
+    db.commit()
+    return updated > 0
+
+
+## Get analysis by ID (the legacy inline report loads only if accessed)
 def get_analysis(db, analysis_id: str) -> AnalysisResult:
-    return db.query(AnalysisResult).filter(AnalysisResult.id == analysis_id).first()
+    return db.query(AnalysisResult).options(defer(AnalysisResult.result)).filter(AnalysisResult.id == analysis_id).first()
+
+
+## Get an analysis report as (encoding, compressed bytes), or None if it has no report
+## Legacy inline reports are compressed on the fly
+def get_report_blob(db, analysis: AnalysisResult):
+    if analysis.result_sha256:
+        row = (
+            db.query(AnalysisReport.encoding, AnalysisReport.data)
+            .filter(AnalysisReport.sha256 == analysis.result_sha256)
+            .first()
+        )
+        if row:
+            return row.encoding, row.data
+    if analysis.result is None:
+        return None
+    return REPORT_ENCODING, zlib.compress(analysis.result.encode("utf-8"), REPORT_COMPRESSION_LEVEL)
+
+
+## Get an analysis report as text, or None if it has no report
+def get_report(db, analysis: AnalysisResult) -> str:
+    blob = get_report_blob(db, analysis)
+    if blob is None:
+        return None
+    return zlib.decompress(blob[1]).decode("utf-8")
+
 
+## Get all analyses, newest first
+## Keyset pagination: pass the (created_at, id) of the last row of the previous page
+def get_all_analyses(db, limit: int = 10, before_created_at: datetime.datetime = None,
+                     before_id: str = None, status: str = None) -> list:
+    ## Listings never show the report, so it is not loaded
+    query = db.query(AnalysisResult).options(defer(AnalysisResult.result))
+    if status:
+        query = query.filter(AnalysisResult.status == status)
+    if before_created_at is not None:
+        query = query.filter(or_(
+            AnalysisResult.created_at < before_created_at,
+            and_(AnalysisResult.created_at == before_created_at, AnalysisResult.id < before_id)
+        ))
+    return query.order_by(AnalysisResult.created_at.desc(), AnalysisResult.id.desc()).limit(limit).all()
 
-## Get all analyses
-def get_all_analyses(db, limit: int = 10) -> list:
-    return db.query(AnalysisResult).order_by(AnalysisResult.created_at.desc()).limit(limit).all()
+
+## Get every analysis of a batch, oldest first
+def get_batch_analyses(db, batch_id: str) -> list:
+    return (
+        db.query(AnalysisResult)
+        .options(defer(AnalysisResult.result))
+        .filter(AnalysisResult.batch_id == batch_id)
+        .order_by(AnalysisResult.created_at, AnalysisResult.filename)
+        .all()
+    )
+
+
+## Get the most recent successful analysis of the same document and query, if still fresh
+def get_cached_analysis(db, document_hash: str, query_key: str, ttl_seconds: int) -> AnalysisResult:
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=ttl_seconds)
+    return (
+        db.query(AnalysisResult)
+        .options(defer(AnalysisResult.result))
+        .filter(
+            AnalysisResult.document_hash == document_hash,
+            AnalysisResult.query_key == query_key,
+            AnalysisResult.status == "success",
+            AnalysisResult.completed_at >= cutoff
+        )
+        .order_by(AnalysisResult.completed_at.desc())
+        .first()
+    )
+
+
+## Get a pending or running analysis of the same document and query started after `since`
+def get_inflight_analysis(db, document_hash: str, query_key: str, since: datetime.datetime) -> AnalysisResult:
+    return (
+        db.query(AnalysisResult)
+        .filter(
+            AnalysisResult.document_hash == document_hash,
+            AnalysisResult.query_key == query_key,
+            AnalysisResult.status.in_(["pending", "processing"]),
+            AnalysisResult.created_at >= since
+        )
+        .order_by(AnalysisResult.created_at.desc())
+        .first()
+    )
+
+
+## Drop cache keys of expired results and of everything beyond the newest `max_entries`
+## Rows stay in the table for history; they just stop being served as cache hits
+def evict_cached_analyses(db, ttl_seconds: int, max_entries: int) -> int:
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=ttl_seconds)
+    cached = db.query(AnalysisResult.id).filter(AnalysisResult.query_key.isnot(None), AnalysisResult.status == "success")
+
+    expired = cached.filter(AnalysisResult.completed_at < cutoff)
+    overflow = cached.filter(AnalysisResult.completed_at >= cutoff).order_by(AnalysisResult.completed_at.desc()).offset(max_entries)
+    ids = [row.id for row in expired.all()] + [row.id for row in overflow.all()]
+
+    if ids:
+        db.query(AnalysisResult).filter(AnalysisResult.id.in_(ids)).update({"query_key": None}, synchronize_session="fetch")
+        db.commit()
+    return len(ids)
+
+
+## Store (or replace) the checkpoint of one stage of an analysis
+@telemetry.timed("db.save_checkpoint")
+def save_checkpoint(db, analysis_id: str, stage: str, payload) -> None:
+    values = {
+        "analysis_id": analysis_id,
+        "stage": stage,
+        "data": zlib.compress(json.dumps(payload).encode("utf-8"), REPORT_COMPRESSION_LEVEL),
+        "created_at": datetime.datetime.utcnow()
+    }
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        statement = insert(AnalysisCheckpoint).values(**values)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["analysis_id", "stage"],
+            set_={"data": statement.excluded.data, "created_at": statement.excluded.created_at}
+        ))
+    else:
+        db.merge(AnalysisCheckpoint(**values))
+    db.commit()
+
+
+## Get every checkpoint of an analysis as {stage: payload}
+def get_checkpoints(db, analysis_id: str) -> dict:
+    rows = (
+        db.query(AnalysisCheckpoint.stage, AnalysisCheckpoint.data)
+        .filter(AnalysisCheckpoint.analysis_id == analysis_id)
+        .all()
+    )
+    return {row.stage: json.loads(zlib.decompress(row.data)) for row in rows}
+
+
+## Drop the checkpoints of analyses that reached a terminal status
+def delete_checkpoints(db, analysis_ids: list) -> int:
+    deleted = (
+        db.query(AnalysisCheckpoint)
+        .filter(AnalysisCheckpoint.analysis_id.in_(analysis_ids))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
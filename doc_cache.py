@@ -0,0 +1,129 @@
+## Parsed Document Cache for Financial Document Analyzer
+## Content-addressed on-disk cache of cleaned document text, keyed by SHA-256 of the file bytes
+## Total size is bounded with least-recently-used eviction so repeat uploads skip parsing
+
+import os
+import json
+import hashlib
+import threading
+
+## Cache location and size bound (bytes)
+DOC_CACHE_DIR = os.getenv("DOC_CACHE_DIR", "data/cache")
+DOC_CACHE_MAX_BYTES = int(os.getenv("DOC_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+## Bump when the cleaned-text format changes so stale entries are never served
+DOC_CACHE_FORMAT = "3"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+## Hash a file in fixed-size chunks
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DocumentCache:
+    """
+    On-disk LRU cache of parsed documents.
+
+    Each entry is a JSON file holding the cleaned full-report text and the
+    per-page text. Entries are shared between the API process and Celery
+    workers, so recency is tracked with file mtimes rather than in memory.
+    """
+
+    def __init__(self, cache_dir: str = DOC_CACHE_DIR, max_bytes: int = DOC_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _entry_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.v{DOC_CACHE_FORMAT}.json")
+
+    def artifact_path(self, digest: str, name: str) -> str:
+        """Path for a derived file (e.g. a retrieval index) stored and evicted alongside the entry"""
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.v{DOC_CACHE_FORMAT}.{name}")
+
+    def get(self, digest: str) -> dict:
+        """Return the cached entry for a digest, or None on a miss"""
+        path = self._entry_path(digest)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        ## Touch the entry so eviction sees it as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, digest: str, full_text: str, pages: list, **fields) -> dict:
+        """Store a parsed document (plus any extra fields, e.g. content_type) and evict old entries if over the size bound"""
+        entry = {"sha256": digest, "full_text": full_text, "pages": pages, **fields}
+        path = self._entry_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        ## Write to a temp file first so concurrent readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+        self.evict()
+        return entry
+
+    def evict(self):
+        """Delete least-recently-used entries until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+## Shared cache instance
+document_cache = DocumentCache()
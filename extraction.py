@@ -0,0 +1,165 @@
+## PDF Text Extraction Engine for Financial Document Analyzer
+## Parses page batches concurrently in a process pool and yields cleaned pages in order
+## Memory stays bounded to a small window of in-flight batches regardless of document length
+## Other formats (XBRL, HTML, spreadsheets) are parsed by parsers.py in the same pool
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pypdf import PdfReader
+
+from doc_cache import document_cache, file_sha256
+from parsers import PARSERS, detect_content_type, parse_document
+import telemetry
+from text_utils import normalize_whitespace, iter_strip_page_headers
+
+## Extraction tuning
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_BATCH = int(os.getenv("PDF_PAGES_PER_BATCH", "8"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+
+## Non-PDF documents at least this large are parsed in the pool, off the calling process's GIL
+PARSER_POOL_MIN_BYTES = int(os.getenv("PARSER_POOL_MIN_BYTES", str(1024 * 1024)))
+
+_pool = None
+_worker_reader = None
+
+
+## Open a PDF once per worker process and reuse it across that document's batches
+def _open_reader(path: str) -> PdfReader:
+    global _worker_reader
+    key = (path, os.path.getmtime(path))
+    if _worker_reader is None or _worker_reader[0] != key:
+        _worker_reader = (key, PdfReader(path))
+    return _worker_reader[1]
+
+
+def count_pages(path: str) -> int:
+    """Page count from the PDF's page tree, without extracting any text"""
+    return len(PdfReader(path).pages)
+
+
+def _clean_pages(reader: PdfReader, start: int, stop: int) -> list:
+    return [normalize_whitespace(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+## Extract and clean a contiguous range of pages (runs inside pool workers)
+def _extract_range(path: str, start: int, stop: int) -> list:
+    return _clean_pages(_open_reader(path), start, stop)
+
+
+## Lazily start the shared process pool
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS)
+    return _pool
+
+
+## Daemonic processes (e.g. Celery prefork children) cannot spawn a pool
+def _can_use_pool() -> bool:
+    return PDF_EXTRACT_WORKERS > 1 and not multiprocessing.current_process().daemon
+
+
+def iter_pages(path: str):
+    """
+    Yield the cleaned text of each page of a PDF, in page order.
+
+    Large documents are split into batches of PDF_PAGES_PER_BATCH pages that
+    are parsed concurrently; at most two batches per worker are in flight at
+    any time so peak memory does not grow with page count.
+    """
+    reader = PdfReader(path)
+    num_pages = len(reader.pages)
+
+    if num_pages < PDF_PARALLEL_MIN_PAGES or not _can_use_pool():
+        for start in range(0, num_pages, PDF_PAGES_PER_BATCH):
+            yield from _clean_pages(reader, start, min(start + PDF_PAGES_PER_BATCH, num_pages))
+        return
+
+    global _pool
+    ranges = [(s, min(s + PDF_PAGES_PER_BATCH, num_pages)) for s in range(0, num_pages, PDF_PAGES_PER_BATCH)]
+    window = PDF_EXTRACT_WORKERS * 2
+    next_index = 0
+    done = 0
+    pending = []
+
+    try:
+        pool = _get_pool()
+        while next_index < len(ranges) or pending:
+            while next_index < len(ranges) and len(pending) < window:
+                start, stop = ranges[next_index]
+                pending.append(pool.submit(_extract_range, path, start, stop))
+                next_index += 1
+            batch = pending.pop(0).result()
+            done += 1
+            yield from batch
+    except BrokenProcessPool:
+        ## Restart the pool next time and finish this document in-process
+        _pool = None
+        for start, stop in ranges[done:]:
+            yield from _clean_pages(reader, start, stop)
+
+
+def join_pages(pages: list) -> str:
+    """Full report text of cleaned pages: every page followed by a newline, in a single join"""
+    return "".join(page + "\n" for page in pages)
+
+
+def extract_text(path: str):
+    """
+    Extract a PDF into (full_report, pages).
+
+    Running headers, footers and page numbers are stripped as pages stream in,
+    with rules learned from the first HEADER_SAMPLE_PAGES pages (see
+    text_utils.iter_strip_page_headers), so only stripped pages are kept;
+    full_report is every cleaned page followed by a newline, assembled with a
+    single join.
+    """
+    pages = list(iter_strip_page_headers(iter_pages(path)))
+    full_report = join_pages(pages)
+    return full_report, pages
+
+
+## Parse a non-PDF document with its registered parser, in the pool when it is large
+def _parse_structured(content_type: str, path: str) -> dict:
+    global _pool
+    if os.path.getsize(path) < PARSER_POOL_MIN_BYTES or not _can_use_pool():
+        return parse_document(content_type, path)
+    try:
+        return _get_pool().submit(parse_document, content_type, path).result()
+    except BrokenProcessPool:
+        _pool = None
+        return parse_document(content_type, path)
+
+
+def load_document(path: str, digest: str = None) -> dict:
+    """
+    Return the parsed document, serving repeats from the document cache.
+
+    The content type is detected from the file's bytes (see parsers.py);
+    anything without a registered parser is extracted as a PDF. The entry
+    holds the file's sha256, the cleaned full_text, per-page text and the
+    content_type, plus exact "statements" for structured formats (XBRL,
+    spreadsheets). Pass `digest` when the content hash is already known
+    (e.g. computed during upload) to skip re-hashing the file.
+    """
+    digest = digest or file_sha256(path)
+    cached = document_cache.get(digest)
+    if cached is not None:
+        return cached
+
+    content_type = detect_content_type(path)
+    fields = {}
+    with telemetry.span("parse"), telemetry.span(f"parse.{content_type}"):
+        if content_type in PARSERS:
+            parsed = _parse_structured(content_type, path)
+            pages = parsed["pages"]
+            full_report = join_pages(pages)
+            if parsed.get("statements"):
+                fields["statements"] = parsed["statements"]
+        else:
+            full_report, pages = extract_text(path)
+    return document_cache.put(digest, full_report, pages, content_type=content_type, **fields)
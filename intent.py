@@ -0,0 +1,303 @@
+## Query Intent Routing for Financial Document Analyzer
+## Classifies queries locally with keyword rules (no model call) as simple lookups, standard
+## analyses or complex reports, and answers lookups from the pre-extracted statement tables
+
+import os
+import re
+import logging
+import threading
+
+import numpy as np
+
+from analytics import compute_metrics, dated_periods, METRIC_CATEGORIES
+from statements import document_statements
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+## simple: a factual lookup of a few figures, answered from the statement tables or one short LLM call
+## standard: the usual auto crew selection
+## complex: full report (verification, then analysis, investment and risk sections) with more agent iterations
+INTENT_TIERS = ("simple", "standard", "complex")
+
+## Route "auto" requests by intent; explicit modes are always honoured
+INTENT_ROUTING = os.getenv("INTENT_ROUTING", "true").lower() in ("1", "true", "yes")
+
+## Longer queries are never treated as lookups
+INTENT_SIMPLE_MAX_WORDS = int(os.getenv("INTENT_SIMPLE_MAX_WORDS", "16"))
+
+## Agent iteration budget for complex queries (agents default to 5)
+COMPLEX_MAX_ITER = int(os.getenv("COMPLEX_MAX_ITER", "10"))
+
+## Requests for a full report or recommendation
+_COMPLEX = re.compile(
+    r"\b(?:thesis|comprehensive|full (?:report|analysis|review)|in[- ]depth|deep[- ]dive|detailed (?:analysis|report|review)"
+    r"|investment (?:case|recommendation|memo)|should (?:i|we) (?:buy|sell|hold|invest)|buy,? sell|valuation"
+    r"|risk assessment|swot|strengths and weaknesses|strategy|strategic)\b",
+    re.IGNORECASE,
+)
+
+## Asking for interpretation rather than a figure rules out a lookup
+_ANALYTICAL = re.compile(
+    r"\b(?:analy[sz]e|analysis|assess|evaluate|explain|why|how (?:did|does|do|has|have|will|would|is|are)"
+    r"|recommend\w*|should|implications?|trends?|drivers?|outlook|guidance|summar\w+|insights?|risks?|impact"
+    r"|compare|comparison|versus|vs|healthy|strong|weak|good|bad|concern\w*|opinion|think)\b",
+    re.IGNORECASE,
+)
+
+## Query phrases -> statement line items (statements.LINE_ITEMS) or computed metrics
+## (analytics.METRIC_CATEGORIES); tried in order, each match consumed so "revenue growth"
+## is not also read as revenue. Bare words such as "cash" or "profit" are left out: they
+## name many different figures ("cash flow", "profit before tax")
+LOOKUP_ITEMS = {
+    "revenue_growth": r"(?:revenue|sales) growth|growth in (?:revenues?|sales)",
+    "net_income_growth": r"(?:net income|earnings|profit) growth",
+    "eps_growth": r"eps growth|earnings per share growth",
+    "eps_diluted": r"\beps\b|earnings per share",
+    "gross_margin": r"gross margin",
+    "operating_margin": r"operating margin",
+    "net_margin": r"net (?:profit )?margin|profit margin",
+    "return_on_equity": r"return on equity|\broe\b",
+    "return_on_assets": r"return on assets|\broa\b",
+    "current_ratio": r"current ratio",
+    "quick_ratio": r"quick ratio|acid[- ]test",
+    "cash_ratio": r"cash ratio",
+    "debt_to_equity": r"debt[- ]to[- ]equity",
+    "debt_to_assets": r"debt[- ]to[- ]assets",
+    "interest_coverage": r"interest coverage",
+    "free_cash_flow": r"free cash flow|\bfcf\b",
+    "operating_cash_flow": r"operating cash flow|cash (?:flow )?from operations|cash flows? from operating activities",
+    "capital_expenditures": r"capital expenditures?|\bcapex\b",
+    "shares_diluted": r"diluted shares|share count|shares outstanding",
+    "gross_profit": r"gross profit",
+    "operating_income": r"operating income|income from operations|operating profit",
+    "interest_expense": r"interest expense",
+    "cost_of_revenue": r"cost of (?:revenues?|sales|goods sold)|\bcogs\b",
+    "net_income": r"net income|net earnings|net profit",
+    "revenue": r"\brevenues?\b|\bsales\b|top line",
+    "cash": r"cash and cash equivalents|cash balance|cash position",
+    "total_current_assets": r"current assets",
+    "total_current_liabilities": r"current liabilities",
+    "total_assets": r"total assets|\bassets\b",
+    "total_liabilities": r"total liabilities|\bliabilities\b",
+    "total_debt": r"total debt|\bdebt\b|borrowings",
+    "total_equity": r"(?:stockholders'?|shareholders'?|total) equity|book value",
+    "inventory": r"inventor(?:y|ies)",
+}
+_LOOKUP_PATTERNS = [(item, re.compile(pattern, re.IGNORECASE)) for item, pattern in LOOKUP_ITEMS.items()]
+
+## Bare figure words: still a lookup, but one the model answers
+_FIGURE_WORDS = re.compile(
+    r"\b(?:cash|profits?|earnings|income|loss(?:es)?|expenses?|costs?|margins?|tax(?:es)?|dividends?|ebitda)\b",
+    re.IGNORECASE,
+)
+
+_QUARTER = re.compile(r"\bq([1-4])\b|\b(first|second|third|fourth) quarter\b", re.IGNORECASE)
+_QUARTER_WORDS = {"first": "1", "second": "2", "third": "3", "fourth": "4"}
+_YEAR = re.compile(r"\b(?:fy\s?|fiscal (?:year )?)?((?:19|20)\d{2})\b", re.IGNORECASE)
+
+## Words a direct lookup may contain besides the items and the period; anything else
+## ("flow", "before tax", "last year") qualifies the figure and needs the model
+_FILLER = frozenset(
+    "what what's whats was were is are the a an company company's its for in of at as during fiscal year quarter "
+    "total and reported".split()
+)
+_WORD = re.compile(r"[a-z0-9']+")
+
+## Metrics reported as percentages; other metrics are plain ratios or amounts
+_PERCENT_CATEGORIES = ("profitability", "growth")
+
+## Answer labels where the item name does not read well on its own
+_LABELS = {
+    "eps_diluted": "Diluted EPS",
+    "shares_diluted": "Diluted shares",
+    "cash": "Cash and cash equivalents",
+    "return_on_equity": "Return on equity",
+    "return_on_assets": "Return on assets",
+}
+
+
+## The single period a query asks for, or None when it names no period or several
+def _query_period(query: str) -> dict:
+    quarters = _QUARTER.findall(query)
+    years = _YEAR.findall(query)
+    if len(quarters) > 1 or len(years) > 1 or not (quarters or years):
+        return None
+    return {
+        "quarter": (quarters[0][0] or _QUARTER_WORDS[quarters[0][1].lower()]) if quarters else None,
+        "year": years[0] if years else None,
+    }
+
+
+def _blank(text: str, start: int, end: int) -> str:
+    return text[:start] + " " * (end - start) + text[end:]
+
+
+def classify_query(query: str) -> dict:
+    """
+    Classify a query as "simple", "standard" or "complex" (see INTENT_TIERS).
+
+    A query is simple when it is short, names at least one known line item,
+    metric or figure word and asks for nothing beyond the figures. Returns the tier, the
+    reason, the requested items, the requested period and whether the
+    statement tables can answer it directly: only when the items and exactly
+    one period cover the whole query, so qualified figures ("cash flow",
+    "profit before tax"), relative periods ("last year") and several periods
+    go to the model.
+    """
+    words = len(query.split())
+    if _COMPLEX.search(query):
+        return {"tier": "complex", "reason": "asks for a full report or recommendation", "items": [], "period": None, "direct": False}
+
+    remaining = query
+    found = []
+    for item, pattern in _LOOKUP_PATTERNS:
+        match = pattern.search(remaining)
+        if match:
+            found.append((match.start(), item))
+            remaining = _blank(remaining, match.start(), match.end())
+    items = [item for _, item in sorted(found)]
+
+    if not items and not _FIGURE_WORDS.search(query):
+        reason = "names no known figure"
+    elif words > INTENT_SIMPLE_MAX_WORDS:
+        reason = f"longer than {INTENT_SIMPLE_MAX_WORDS} words"
+    elif _ANALYTICAL.search(query):
+        reason = "asks for interpretation"
+    else:
+        period = _query_period(query)
+        for pattern in (_QUARTER, _YEAR):
+            for match in pattern.finditer(remaining):
+                remaining = _blank(remaining, match.start(), match.end())
+        leftover = [word for word in _WORD.findall(remaining.lower()) if word not in _FILLER]
+        if leftover:
+            reason = "figure lookup, qualified by: " + " ".join(leftover)
+        elif period is None:
+            reason = "figure lookup without a single period"
+        else:
+            reason = "figure lookup"
+        return {"tier": "simple", "reason": reason, "items": items, "period": period, "direct": not leftover and period is not None}
+    return {"tier": "standard", "reason": reason, "items": items, "period": None, "direct": False}
+
+
+## Period column for a query period: exact quarter, the latest column of a quarter or year,
+## or the fiscal year itself; None when the document does not report it
+def _period_column(columns: list, period: dict) -> str:
+    quarter, year = period["quarter"], period["year"]
+    if quarter and year:
+        candidates = [f"Q{quarter}-{year}"]
+    elif quarter:
+        candidates = [column for column in columns if column.startswith(f"Q{quarter}-")][-1:]
+    else:
+        candidates = [f"FY{year}", year]
+    for candidate in candidates:
+        if candidate in columns:
+            return candidate
+    return None
+
+
+def _format_value(item: str, value: float, units: str) -> str:
+    category = METRIC_CATEGORIES.get(item)
+    if category in _PERCENT_CATEGORIES:
+        return f"{value * 100:.1f}%"
+    if category in ("liquidity", "leverage", "coverage"):
+        return f"{value:.2f}"
+    if item == "eps_diluted":
+        return f"{value:,.2f} per share"
+    amount = f"{value:,.2f}" if abs(value) < 100 else f"{value:,.0f}"
+    return amount + (f" {units.rstrip('s')}" if units else "")
+
+
+def answer_from_statements(intent: dict, text: str, structured: dict = None) -> str:
+    """
+    Answer a simple query from the document's structured statements, or the
+    statement tables extracted from its text.
+
+    Returns None unless the query can be answered directly (see
+    classify_query) and every requested figure is reported for the requested
+    period, so callers can fall back to a model call.
+    """
+    if not intent.get("direct"):
+        return None
+    statements, units = document_statements(text, structured)
+    ## Positional columns (no recognizable period header) cannot be matched to the query's period
+    if statements.empty or not dated_periods(statements.columns):
+        return None
+    metrics = compute_metrics(statements)
+    columns = list(statements.columns)
+    column = _period_column(columns, intent["period"])
+    if column is None:
+        return None
+
+    lines = []
+    for item in intent["items"]:
+        ## Reported line items win over computed metrics of the same name (eps_diluted)
+        frame = statements if item in statements.index else metrics
+        if item not in frame.index:
+            return None
+        value = float(frame.loc[item, column])
+        if np.isnan(value):
+            return None
+        label = _LABELS.get(item, item.replace("_", " ").capitalize())
+        lines.append(f"{label} ({column}): {_format_value(item, value, units)}")
+
+    source = "the document's structured financial data" if structured and structured.get("items") else "the statement tables extracted from the document"
+    lines += ["", f"Answered directly from {source} (no model call)."]
+    return "\n".join(lines)
+
+
+class RoutingStats:
+    """
+    Per-process routing counts and latencies.
+
+    The latency a simple query saves is estimated against the average latency
+    of standard queries in the same process, the pipeline it would otherwise
+    have run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}
+        self.saved_seconds = 0.0
+
+    def _average(self, tier: str) -> float:
+        routes = [entry for (route_tier, _), entry in self.routes.items() if route_tier == tier]
+        count = sum(entry["count"] for entry in routes)
+        return sum(entry["seconds"] for entry in routes) / count if count else None
+
+    def record(self, tier: str, mode: str, seconds: float) -> float:
+        """Record a routed analysis and return the seconds it saved, if known"""
+        with self._lock:
+            baseline = self._average("standard") if tier == "simple" else None
+            entry = self.routes.setdefault((tier, mode), {"count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            saved = max(baseline - seconds, 0.0) if baseline is not None else None
+            if saved:
+                self.saved_seconds += saved
+            return saved
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "routes": {
+                    f"{tier}:{mode}": {"count": entry["count"], "avg_ms": 1000 * entry["seconds"] / entry["count"]}
+                    for (tier, mode), entry in self.routes.items()
+                },
+                "estimated_saved_seconds": round(self.saved_seconds, 3),
+            }
+
+
+routing_stats = RoutingStats()
+
+
+def record_route(intent: dict, mode: str, seconds: float) -> float:
+    """Log a routing decision with its latency and estimated saving; returns the saving"""
+    saved = routing_stats.record(intent["tier"], mode, seconds)
+    telemetry.record_route(intent["tier"], mode, saved)
+    logger.info(
+        "intent=%s (%s) route=%s items=%s latency_ms=%.0f saved_ms=%s",
+        intent["tier"], intent["reason"], mode, ",".join(intent["items"]) or "-", 1000 * seconds,
+        f"{1000 * saved:.0f}" if saved is not None else "n/a",
+    )
+    return saved
@@ -0,0 +1,186 @@
+## LLM Response Cache for Financial Document Analyzer
+## Wraps crewai.LLM so identical prompts (same messages, tools and model parameters)
+## are answered from a local SQLite store; replay mode serves recorded responses offline
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from crewai import LLM
+
+from rate_limit import RedisTokenBucket
+import telemetry
+
+## off: no caching / readwrite: serve hits, record misses / record: always call, overwrite
+## replay: serve only recorded responses and fail on a miss (no network)
+LLM_CACHE_MODES = ("off", "readwrite", "record", "replay")
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "readwrite")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+
+## Provider quota shared by every API and worker process (0 disables a limit); agents' own
+## max_rpm only bounds each agent within one process
+LLM_GLOBAL_RPM = float(os.getenv("LLM_GLOBAL_RPM", "0"))
+LLM_GLOBAL_TPM = float(os.getenv("LLM_GLOBAL_TPM", "0"))
+
+## Model parameters that change the response and therefore belong in the key
+KEY_PARAMETERS = (
+    "model", "temperature", "top_p", "n", "stop", "max_tokens", "max_completion_tokens",
+    "presence_penalty", "frequency_penalty", "seed", "response_format", "reasoning_effort",
+)
+
+
+class LLMReplayMiss(RuntimeError):
+    """Raised in replay mode when no recorded response matches the prompt"""
+
+
+class SQLiteResponseStore:
+    """
+    LRU-bounded response store in a single SQLite file.
+
+    Safe to share between threads; separate processes (API and Celery workers)
+    can point at the same file thanks to WAL mode.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_last_used ON llm_responses (last_used)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT response FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE llm_responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, model, response, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            ## Evict least-recently-used rows beyond the bound
+            conn.execute(
+                "DELETE FROM llm_responses WHERE key IN ("
+                "SELECT key FROM llm_responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {"hits": hits, "misses": misses, "hit_rate": hits / lookups if lookups else 0.0}
+
+
+## Shared store used by agents.llm
+llm_response_store = SQLiteResponseStore()
+
+
+## Global request and token buckets, taken before every call that reaches the provider
+llm_request_bucket = RedisTokenBucket("llm:requests", LLM_GLOBAL_RPM)
+llm_token_bucket = RedisTokenBucket("llm:tokens", LLM_GLOBAL_TPM)
+
+
+## Prompt size in tokens, estimated at four characters per token
+def estimate_tokens(messages) -> int:
+    if isinstance(messages, str):
+        return len(messages) // 4 + 1
+    return sum(len(str(message.get("content") or "")) for message in messages) // 4 + 1
+
+
+def wait_for_quota(messages):
+    llm_request_bucket.acquire()
+    llm_token_bucket.acquire(estimate_tokens(messages))
+
+
+class CachedLLM(LLM):
+    """
+    crewai.LLM with a response cache in front of every call.
+
+    The cache key covers the full message list, tool schemas and every
+    response-shaping model parameter, so changing any of them is a miss.
+    Calls that may execute functions (available_functions) and non-string
+    responses are never cached. Cache hits skip the LLM callbacks, so no
+    token usage is recorded for them. Calls that do reach the provider first
+    wait for the global LLM_GLOBAL_RPM / LLM_GLOBAL_TPM quota. Every call's
+    latency and token usage is recorded for the executing agent (telemetry).
+    """
+
+    def __init__(self, *args, cache_store=None, cache_mode: str = LLM_CACHE_MODE, **kwargs):
+        super().__init__(*args, **kwargs)
+        if cache_mode not in LLM_CACHE_MODES:
+            raise ValueError(f"Unknown LLM cache mode '{cache_mode}', expected one of {LLM_CACHE_MODES}")
+        self.cache_store = cache_store if cache_store is not None else llm_response_store
+        self.cache_mode = cache_mode
+
+    def cache_key(self, messages, tools=None) -> str:
+        parameters = {name: getattr(self, name, None) for name in KEY_PARAMETERS}
+        payload = json.dumps(
+            {"messages": messages, "tools": tools, "parameters": parameters},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        if self.cache_mode == "off" or available_functions:
+            return self._provider_call(messages, tools, callbacks, available_functions, **kwargs)
+
+        started = time.perf_counter()
+        key = self.cache_key(messages, tools)
+        if self.cache_mode in ("readwrite", "replay"):
+            cached = self.cache_store.get(key)
+            if cached is not None:
+                telemetry.record_llm_call(time.perf_counter() - started, cached=True)
+                return cached
+            if self.cache_mode == "replay":
+                raise LLMReplayMiss(f"No recorded response for prompt {key[:12]} (LLM_CACHE_MODE=replay)")
+
+        response = self._provider_call(messages, tools, callbacks, available_functions, **kwargs)
+        if isinstance(response, str):
+            self.cache_store.put(key, self.model, response)
+        return response
+
+    def _provider_call(self, messages, tools, callbacks, available_functions, **kwargs):
+        wait_for_quota(messages)
+        started = time.perf_counter()
+        usage = telemetry.UsageRecorder()
+        try:
+            return super().call(messages, tools, list(callbacks or []) + [usage], available_functions, **kwargs)
+        finally:
+            telemetry.record_llm_call(
+                time.perf_counter() - started, usage.prompt_tokens, usage.completion_tokens
+            )
@@ -1,100 +1,455 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, JSONResponse
 from sqlalchemy.orm import Session
 import os
+import json
+import zlib
 import uuid
+import base64
+import asyncio
+import datetime
+import hashlib
+import functools
+import threading
+from typing import List
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
-from crewai import Crew, Process
-from agents import financial_analyst, verifier
-from task import analyze_financial_document, verification
-from database import init_db, get_db, save_analysis, update_analysis, get_analysis, get_all_analyses
+from preverify import DocumentRejected
+from database import (
+    init_db, get_db, save_analysis, update_analysis, get_analysis, get_all_analyses,
+    save_batch_analyses, get_batch_analyses, store_report, get_report, get_report_blob
+)
+from result_cache import make_query_key, lookup_result, lookup_inflight, note_result_stored, result_cache_stats
+from doc_cache import document_cache
+import progress
+import parsers
+import telemetry
+
+## Concurrency limits for synchronous (use_queue=False) analyses
+ANALYSIS_MAX_CONCURRENCY = int(os.getenv("ANALYSIS_MAX_CONCURRENCY", "4"))
+ANALYSIS_MAX_PENDING = int(os.getenv("ANALYSIS_MAX_PENDING", "8"))
+ANALYSIS_TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_TIMEOUT_SECONDS", "300"))
+
+## Upload limits: files are streamed to disk in chunks and never held in memory whole
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+## Batch limits: a batch runs every query against every document
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "200"))
+BATCH_MAX_UPLOAD_BYTES = int(os.getenv("BATCH_MAX_UPLOAD_BYTES", str(2 * 1024 * 1024 * 1024)))
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "10"))
+
+DEFAULT_QUERY = "Analyze this financial document for investment insights"
+
+## Largest page /analyses returns
+ANALYSES_PAGE_MAX = int(os.getenv("ANALYSES_PAGE_MAX", "100"))
+
+## Idle seconds between keep-alive comments on /stream (keeps proxies from closing the connection)
+PROGRESS_KEEPALIVE_SECONDS = float(os.getenv("PROGRESS_KEEPALIVE_SECONDS", "15"))
 
 app = FastAPI(title="Financial Document Analyzer")
 
-## Initialize database on startup
+## Multipart framing and form fields on top of the file bytes
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+## Request body limits of the upload endpoints
+_UPLOAD_BODY_LIMITS = {
+    "/analyze": (MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES, f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit."),
+    "/analyze/batch": (BATCH_MAX_UPLOAD_BYTES, f"Batch exceeds the {BATCH_MAX_UPLOAD_BYTES} byte upload limit."),
+}
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadLimitMiddleware:
+    """
+    Enforce the upload body limits before FastAPI parses the form.
+
+    FastAPI reads and spools the whole multipart body before a handler runs,
+    so limits checked in the handler only apply once an oversized upload has
+    been received. A declared Content-Length over the limit is refused without
+    reading the body; otherwise the body is counted as the form parser
+    receives it, and parsing stops with 413 as soon as it goes over.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = _UPLOAD_BODY_LIMITS.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+        max_bytes, detail = limit
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            return await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        ## FastAPI reports a failed form parse as 400; that response is replaced by the 413
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                return
+            response_started = response_started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+        if exceeded and not response_started:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+
+app.add_middleware(UploadLimitMiddleware)
+
+## Crew runs happen on this bounded pool so the event loop stays free for other requests
+crew_executor = ThreadPoolExecutor(max_workers=ANALYSIS_MAX_CONCURRENCY, thread_name_prefix="crew")
+
+## Analyses running or waiting for a crew thread (only touched from the event loop)
+_analyses_in_flight = 0
+
+## In-process single-flight: (document_hash, query_key) -> future resolving to (analysis_id, report)
+_sync_flights = {}
+
+## The crewai stack (crews -> agents, tasks, tools, LLM) is imported on first use, or in the
+## background right after startup, so liveness probes are answered immediately
+_crew_stack = None
+_crew_stack_lock = threading.Lock()
+
+## Readiness: database initialized, crew stack imported and crew factory warmed
+_readiness = {"database": False, "crew_stack": False}
+_warmup_task = None
+
+
+def crew_stack():
+    """Import (once) and return the crews module with its crew factory warmed"""
+    global _crew_stack
+    if _crew_stack is None:
+        with _crew_stack_lock:
+            if _crew_stack is None:
+                import crews
+                crews.crew_factory.warm()
+                _crew_stack = crews
+                _readiness["crew_stack"] = True
+    return _crew_stack
+
+
+## Initialize database on startup; the crew stack loads in the background (watch /ready)
 @app.on_event("startup")
 async def startup_event():
-    init_db()
-
-def run_crew(query: str, file_path: str = "data/sample.pdf"):
-    """To run the whole crew"""
-    financial_crew = Crew(
-        agents=[verifier, financial_analyst],
-        tasks=[verification, analyze_financial_document],
-        process=Process.sequential,
+    global _warmup_task
+    await run_in_threadpool(init_db)
+    _readiness["database"] = True
+    _warmup_task = asyncio.create_task(run_in_threadpool(crew_stack))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    crew_executor.shutdown(wait=False, cancel_futures=True)
+
+def run_crew(query: str, file_path: str = "data/sample.pdf", mode: str = None, document_hash: str = None,
+             trace: telemetry.Trace = None):
+    """To run the whole crew, timing its stages into `trace`"""
+    crews = crew_stack()
+    with telemetry.trace_scope(trace):
+        return crews.run_analysis(query=query, file_path=file_path, mode=mode or crews.CREW_MODE, document_hash=document_hash)
+
+
+## True when every crew thread and pending slot is taken
+def crew_pool_saturated() -> bool:
+    return _analyses_in_flight >= ANALYSIS_MAX_CONCURRENCY + ANALYSIS_MAX_PENDING
+
+
+def _release_crew_slot(_future):
+    global _analyses_in_flight
+    _analyses_in_flight -= 1
+
+
+## Run run_crew on the crew pool with a per-request timeout
+## A timed-out crew keeps its slot until its thread actually finishes, so the limit stays honest
+async def run_crew_async(query: str, file_path: str, document_hash: str = None, mode: str = None,
+                         trace: telemetry.Trace = None):
+    global _analyses_in_flight
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        crew_executor,
+        functools.partial(run_crew, query=query, file_path=file_path, mode=mode, document_hash=document_hash, trace=trace)
+    )
+    _analyses_in_flight += 1
+    future.add_done_callback(_release_crew_slot)
+    return await asyncio.wait_for(asyncio.shield(future), timeout=ANALYSIS_TIMEOUT_SECONDS)
+
+
+## Mark a flight's outcome as retrieved so leader-only failures are not logged as unhandled
+def _consume_flight_result(future):
+    if not future.cancelled():
+        future.exception()
+
+
+def _busy_error() -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many analyses in progress. Retry later or submit with use_queue=true.",
+        headers={"Retry-After": "30"}
     )
-    result = financial_crew.kickoff({'query': query, 'file_path': file_path})
-    return result
+
+
+UNSUPPORTED_DOCUMENT = "File is not a PDF, XBRL, HTML, CSV or XLSX document."
+
+
+## Extension of a supported upload (lower case), or None
+def upload_extension(filename: str) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension if extension in parsers.UPLOAD_EXTENSIONS else None
+
+
+## Stream an upload to disk in fixed-size chunks, hashing and validating as it arrives
+## Returns (sha256 hex digest, size in bytes); removes the partial file on rejection
+async def save_upload(file: UploadFile, file_path: str):
+    digest = hashlib.sha256()
+    size = 0
+    content_type = None
+    try:
+        with open(file_path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if size == 0:
+                    content_type = parsers.sniff_content_type(chunk, file.filename)
+                    if content_type is None:
+                        raise HTTPException(status_code=400, detail=UNSUPPORTED_DOCUMENT)
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit.")
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+        ## The zip directory sits at the end of the file, so only the stored upload tells a
+        ## workbook from another zip container (docx)
+        if content_type == "xlsx" and not await run_in_threadpool(parsers.is_workbook, file_path):
+            raise HTTPException(status_code=400, detail=UNSUPPORTED_DOCUMENT)
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return digest.hexdigest(), size
 
 
 @app.get("/")
 async def root():
-    """Health check endpoint"""
+    """Health check endpoint (liveness: answers as soon as the process is up)"""
     return {"message": "Financial Document Analyzer API is running"}
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once the database is initialized and the crew stack is loaded, 503 before"""
+    if _warmup_task is not None and _warmup_task.done() and _warmup_task.exception() is not None:
+        raise HTTPException(status_code=503, detail={"status": "failed", "checks": _readiness, "error": str(_warmup_task.exception())})
+    if not all(_readiness.values()):
+        raise HTTPException(status_code=503, detail={"status": "starting", "checks": _readiness}, headers={"Retry-After": "5"})
+    return {"status": "ready", "checks": _readiness}
+
+
 @app.post("/analyze")
 async def analyze_document_endpoint(
     file: UploadFile = File(...),
-    query: str = Form(default="Analyze this financial document for investment insights"),
+    query: str = Form(default=DEFAULT_QUERY),
     use_queue: bool = Form(default=False),
+    mode: str = Form(default=None),
     db: Session = Depends(get_db)
 ):
     """
     Analyze financial document and provide comprehensive investment recommendations.
     - use_queue=False (default): Synchronous analysis, waits for result
     - use_queue=True: Asynchronous analysis via Celery queue, returns task_id
+    - mode: crew mode; "full" adds parallel investment and risk sections to the analysis
     """
 
+    ## Refuse synchronous work up front when the crew pool is saturated
+    if not use_queue and crew_pool_saturated():
+        raise _busy_error()
+
     file_id = str(uuid.uuid4())
-    file_path = f"data/financial_document_{file_id}.pdf"
+    file_path = f"data/financial_document_{file_id}{upload_extension(file.filename) or '.pdf'}"
+    file_handed_off = False
+    analysis = None
+    trace = telemetry.Trace()
 
     try:
         ## Ensure data directory exists
         os.makedirs("data", exist_ok=True)
 
         ## Validate file type
-        if not file.filename.endswith(".pdf"):
-            raise HTTPException(status_code=400, detail="Only PDF files are supported.")
+        if upload_extension(file.filename) is None:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type. Expected one of {', '.join(parsers.UPLOAD_EXTENSIONS)}.")
+        crews = await run_in_threadpool(crew_stack)
+        mode = mode or crews.CREW_MODE
+        if mode not in crews.CREW_MODES:
+            raise HTTPException(status_code=400, detail=f"Unknown mode '{mode}'. Expected one of {', '.join(crews.CREW_MODES)}.")
 
         ## Save uploaded file
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        with telemetry.span("upload", trace):
+            document_hash, size_bytes = await save_upload(file, file_path)
 
         ## Validate query
         if not query or query.strip() == "":
-            query = "Analyze this financial document for investment insights"
+            query = DEFAULT_QUERY
+        query = query.strip()
+        query_key = make_query_key(query, mode)
 
-        ## Save to database
-        analysis = save_analysis(db, filename=file.filename, query=query.strip())
+        ## Serve repeat (document, query) pairs straight from the result cache
+        cached = await run_in_threadpool(lookup_result, db, document_hash, query_key)
+        if cached:
+            return {
+                "status": "success",
+                "analysis_id": cached.id,
+                "document_hash": document_hash,
+                "query": query,
+                "analysis": await run_in_threadpool(get_report, db, cached),
+                "file_processed": file.filename,
+                "cached": True
+            }
 
         ## Use Celery queue for async processing
         if use_queue:
+            ## Join an identical analysis that is already queued or running instead of enqueuing a duplicate
+            inflight = await run_in_threadpool(lookup_inflight, db, document_hash, query_key)
+            if inflight:
+                return {
+                    "status": "queued",
+                    "analysis_id": inflight.id,
+                    "document_hash": document_hash,
+                    "deduplicated": True,
+                    "message": "Identical analysis already in progress. Use /status/{analysis_id} to check result."
+                }
+
+            analysis = await run_in_threadpool(
+                save_analysis, db, filename=file.filename, query=query,
+                document_hash=document_hash, query_key=query_key
+            )
             try:
-                from celery_worker import analyze_document_task
-                task = analyze_document_task.delay(
-                    query=query.strip(),
+                from celery_worker import dispatch_analysis
+                task = await run_in_threadpool(
+                    dispatch_analysis,
+                    query=query,
                     file_path=file_path,
-                    analysis_id=analysis.id
+                    analysis_id=analysis.id,
+                    document_hash=document_hash,
+                    mode=mode,
+                    size_bytes=size_bytes
                 )
+                file_handed_off = True
+                await run_in_threadpool(progress.mark_queued, [analysis.id])
                 return {
                     "status": "queued",
                     "task_id": task.id,
                     "analysis_id": analysis.id,
-                    "message": "Document queued for analysis. Use /status/{analysis_id} to check result."
+                    "document_hash": document_hash,
+                    "message": "Document queued for analysis. Follow /stream/{analysis_id} or poll /status/{analysis_id} for the result."
                 }
             except Exception:
+                ## Queue unavailable: fall through to synchronous processing of the same analysis
                 pass
 
-        ## Synchronous processing
-        response = run_crew(query=query.strip(), file_path=file_path)
+        ## Coalesce with an identical synchronous analysis already running in this process
+        flight_key = (document_hash, query_key)
+        leader = _sync_flights.get(flight_key)
+        if leader is not None:
+            result_cache_stats.record("coalesced")
+            try:
+                analysis_id, report = await asyncio.wait_for(asyncio.shield(leader), timeout=ANALYSIS_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                if analysis is not None:
+                    await run_in_threadpool(
+                        update_analysis, db, analysis.id, status="failed", error="Analysis timed out", timings=trace.to_dict()
+                    )
+                raise HTTPException(status_code=504, detail=f"Analysis exceeded {ANALYSIS_TIMEOUT_SECONDS:g}s timeout.")
+            except HTTPException as exc:
+                ## The leader's own 429/504; rejections and failures reach the handlers below
+                if analysis is not None:
+                    await run_in_threadpool(
+                        update_analysis, db, analysis.id, status="failed", error=str(exc.detail), timings=trace.to_dict()
+                    )
+                raise
+            ## A queue fallback already saved its own row, which takes the leader's outcome
+            if analysis is not None:
+                await run_in_threadpool(
+                    update_analysis, db, analysis.id, result=report, status="success", timings=trace.to_dict()
+                )
+                analysis_id = analysis.id
+            return {
+                "status": "success",
+                "analysis_id": analysis_id,
+                "document_hash": document_hash,
+                "query": query,
+                "analysis": report,
+                "file_processed": file.filename,
+                "coalesced": True
+            }
+
+        flight = asyncio.get_running_loop().create_future()
+        flight.add_done_callback(_consume_flight_result)
+        _sync_flights[flight_key] = flight
+        try:
+            if analysis is None:
+                analysis = await run_in_threadpool(
+                    save_analysis, db, filename=file.filename, query=query,
+                    document_hash=document_hash, query_key=query_key
+                )
+
+            ## Synchronous processing on the crew pool (re-checked: the queue fallback lands here too)
+            if crew_pool_saturated():
+                await run_in_threadpool(update_analysis, db, analysis.id, status="failed", error="Server busy")
+                raise _busy_error()
+
+            try:
+                response = await run_crew_async(
+                    query=query, file_path=file_path, document_hash=document_hash, mode=mode, trace=trace
+                )
+            except asyncio.TimeoutError:
+                await run_in_threadpool(
+                    update_analysis, db, analysis.id, status="failed", error="Analysis timed out", timings=trace.to_dict()
+                )
+                raise HTTPException(status_code=504, detail=f"Analysis exceeded {ANALYSIS_TIMEOUT_SECONDS:g}s timeout.")
 
-        ## Update database with result
-        update_analysis(db, analysis.id, result=str(response), status="success")
+            ## Update database with result
+            await run_in_threadpool(
+                update_analysis, db, analysis.id, result=str(response), status="success", timings=trace.to_dict()
+            )
+            await run_in_threadpool(note_result_stored, db)
+            flight.set_result((analysis.id, str(response)))
+        except BaseException as exc:
+            flight.set_exception(exc)
+            raise
+        finally:
+            _sync_flights.pop(flight_key, None)
 
         return {
             "status": "success",
             "analysis_id": analysis.id,
+            "document_hash": document_hash,
             "query": query,
             "analysis": str(response),
             "file_processed": file.filename
@@ -102,44 +457,380 @@ async def analyze_document_endpoint(
 
     except HTTPException:
         raise
+    except DocumentRejected as e:
+        if analysis is not None:
+            await run_in_threadpool(update_analysis, db, analysis.id, status="rejected", error=str(e), timings=trace.to_dict())
+        raise HTTPException(status_code=422, detail={"message": str(e), "screening": e.screening})
     except Exception as e:
-        if 'analysis' in locals():
-            update_analysis(db, analysis.id, status="failed", error=str(e))
+        if analysis is not None:
+            await run_in_threadpool(update_analysis, db, analysis.id, status="failed", error=str(e), timings=trace.to_dict())
         raise HTTPException(status_code=500, detail=f"Error processing financial document: {str(e)}")
 
     finally:
-        if not use_queue and os.path.exists(file_path):
+        ## The Celery task owns (and removes) the file once it has been enqueued
+        if not file_handed_off and os.path.exists(file_path):
             try:
                 os.remove(file_path)
             except:
                 pass
 
 
+## Build one analysis job per (document, query), serving fresh results from the result cache
+def _plan_batch_jobs(db, documents: list, queries: list) -> list:
+    jobs = []
+    for document in documents:
+        for query, query_key in queries:
+            job = {
+                "filename": document["filename"],
+                "query": query,
+                "document_hash": document["document_hash"],
+                "query_key": query_key
+            }
+            cached = lookup_result(db, document["document_hash"], query_key)
+            if cached:
+                ## Point at the stored report; legacy inline reports are stored once here
+                result_sha256 = cached.result_sha256 or store_report(db, get_report(db, cached))
+                job.update(status="success", result_sha256=result_sha256)
+            jobs.append(job)
+    return jobs
+
+
+def _fail_batch_jobs(db, analysis_ids: list, error: str):
+    for analysis_id in analysis_ids:
+        update_analysis(db, analysis_id, status="failed", error=error)
+
+
+@app.post("/analyze/batch")
+async def analyze_batch_endpoint(
+    files: List[UploadFile] = File(...),
+    queries: List[str] = Form(default=[]),
+    db: Session = Depends(get_db)
+):
+    """
+    Queue every query against every uploaded document as one batch.
+    - Each distinct document is parsed once and reused by all of its queries
+    - Work fans out across Celery workers as one task per document
+    - Returns a batch_id; use /batch/{batch_id} for aggregate progress
+    """
+    ## Batch jobs run in the default mode; keys must match the ones the worker looks up
+    crews = await run_in_threadpool(crew_stack)
+    mode = crews.CREW_MODE
+
+    ## Drop blank and duplicate (after normalization) queries, keeping order
+    unique_queries = {}
+    for query in queries:
+        if query and query.strip():
+            unique_queries.setdefault(make_query_key(query.strip(), mode), query.strip())
+    if not unique_queries:
+        unique_queries[make_query_key(DEFAULT_QUERY, mode)] = DEFAULT_QUERY
+    query_pairs = [(query, query_key) for query_key, query in unique_queries.items()]
+
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {BATCH_MAX_FILES} files.")
+    if len(query_pairs) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {BATCH_MAX_QUERIES} queries.")
+    for file in files:
+        if upload_extension(file.filename) is None:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type ({file.filename}). Expected one of {', '.join(parsers.UPLOAD_EXTENSIONS)}.")
+
+    os.makedirs("data", exist_ok=True)
+    saved_paths = []
+    handed_off_paths = set()
+
+    try:
+        ## Identical uploads within the batch share one document (and one parse)
+        documents = {}
+        for file in files:
+            file_path = f"data/financial_document_{uuid.uuid4()}{upload_extension(file.filename)}"
+            saved_paths.append(file_path)
+            with telemetry.span("upload"):
+                document_hash, size_bytes = await save_upload(file, file_path)
+            documents.setdefault(document_hash, {
+                "file_path": file_path,
+                "document_hash": document_hash,
+                "filename": file.filename,
+                "size_bytes": size_bytes,
+                "jobs": []
+            })
+
+        jobs = await run_in_threadpool(_plan_batch_jobs, db, list(documents.values()), query_pairs)
+        batch_id = str(uuid.uuid4())
+        analysis_ids = await run_in_threadpool(save_batch_analyses, db, batch_id, jobs)
+
+        for job, analysis_id in zip(jobs, analysis_ids):
+            job["analysis_id"] = analysis_id
+            if job.get("status") != "success":
+                documents[job["document_hash"]]["jobs"].append([analysis_id, job["query"]])
+
+        pending = [document for document in documents.values() if document["jobs"]]
+        if pending:
+            try:
+                from celery_worker import dispatch_batch
+                await run_in_threadpool(dispatch_batch, pending)
+            except Exception:
+                queued_ids = [analysis_id for document in pending for analysis_id, _ in document["jobs"]]
+                await run_in_threadpool(_fail_batch_jobs, db, queued_ids, "Task queue unavailable")
+                raise HTTPException(status_code=503, detail="Task queue unavailable; batch analyses require Celery.")
+            handed_off_paths.update(document["file_path"] for document in pending)
+            await run_in_threadpool(
+                progress.mark_queued, [analysis_id for document in pending for analysis_id, _ in document["jobs"]]
+            )
+
+        cached_count = sum(1 for job in jobs if job.get("status") == "success")
+        return {
+            "status": "queued" if pending else "success",
+            "batch_id": batch_id,
+            "documents": len(documents),
+            "queries": len(query_pairs),
+            "total": len(jobs),
+            "cached": cached_count,
+            "analyses": [
+                {
+                    "analysis_id": job["analysis_id"],
+                    "filename": job["filename"],
+                    "document_hash": job["document_hash"],
+                    "query": job["query"],
+                    "status": job.get("status", "pending")
+                }
+                for job in jobs
+            ],
+            "message": "Batch queued for analysis. Use /batch/{batch_id} to check progress."
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing batch: {str(e)}")
+
+    finally:
+        ## Celery tasks own (and remove) the files of queued documents
+        for file_path in saved_paths:
+            if file_path not in handed_off_paths and os.path.exists(file_path):
+                try:
+                    os.remove(file_path)
+                except:
+                    pass
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit rates of the result, parsed-document and LLM response caches, LLM quota waits, crew pool usage and intent routing (per API process)"""
+    stats = {
+        "result_cache": result_cache_stats.snapshot(),
+        "document_cache": document_cache.stats()
+    }
+    ## LLM cache, quota buckets and crew factory exist only once the crew stack has loaded
+    if _crew_stack is not None:
+        from llm_cache import llm_response_store, llm_request_bucket, llm_token_bucket
+        stats["llm_cache"] = llm_response_store.stats()
+        stats["llm_quota"] = {"requests": llm_request_bucket.stats(), "tokens": llm_token_bucket.stats()}
+        stats["crew_factory"] = _crew_stack.crew_factory.stats()
+        from intent import routing_stats
+        stats["intent_routing"] = routing_stats.snapshot()
+    return stats
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: stage latencies, LLM calls and tokens per agent, queue waits and retries"""
+    body, content_type = telemetry.render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+## Sync handlers: FastAPI runs them in its threadpool so DB calls never block the event loop
 @app.get("/status/{analysis_id}")
-async def get_analysis_status(analysis_id: str, db: Session = Depends(get_db)):
-    """Check the status of an analysis by ID"""
+def get_analysis_status(analysis_id: str, include_result: bool = True, db: Session = Depends(get_db)):
+    """
+    Check the status of an analysis by ID.
+    - include_result=false: status and timings only (cheap polling); fetch the report from /result/{analysis_id}
+    """
     analysis = get_analysis(db, analysis_id)
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found")
 
-    return {
+    status = {
         "analysis_id": analysis.id,
         "filename": analysis.filename,
         "query": analysis.query,
         "status": analysis.status,
-        "result": analysis.result,
         "error": analysis.error,
         "created_at": analysis.created_at,
-        "completed_at": analysis.completed_at
+        "completed_at": analysis.completed_at,
+        "duration_seconds": (
+            (analysis.completed_at - analysis.created_at).total_seconds()
+            if analysis.completed_at and analysis.created_at else None
+        ),
+        "result_url": f"/result/{analysis.id}" if analysis.status == "success" else None,
+        "timings": json.loads(analysis.timings) if analysis.timings else None
     }
+    if include_result:
+        status["result"] = get_report(db, analysis)
+    return status
+
+
+## True when the client lists `coding` in Accept-Encoding with a non-zero q value
+def _accepts_encoding(accept_encoding: str, coding: str) -> bool:
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() in (coding, "*"):
+            q = params.strip()
+            if not q.startswith("q="):
+                return True
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+    return False
+
+
+@app.get("/result/{analysis_id}")
+def get_analysis_result(analysis_id: str, request: Request, db: Session = Depends(get_db)):
+    """
+    Fetch the report of an analysis as text.
+    Reports are stored deflate-compressed; clients sending Accept-Encoding: deflate get the stored bytes as-is.
+    """
+    analysis = get_analysis(db, analysis_id)
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    blob = get_report_blob(db, analysis)
+    if blob is None:
+        raise HTTPException(status_code=404, detail=f"No report available (status: {analysis.status})")
+
+    encoding, data = blob
+    headers = {"Vary": "Accept-Encoding"}
+    if _accepts_encoding(request.headers.get("accept-encoding", ""), encoding):
+        headers["Content-Encoding"] = encoding
+    else:
+        data = zlib.decompress(data)
+    return Response(content=data, media_type="text/plain; charset=utf-8", headers=headers)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+## Relay an analysis's progress channel until it reaches a final stage or the client leaves
+async def _progress_events(request: Request, initial: dict, subscription):
+    try:
+        yield _sse("progress", initial)
+        stage = initial["stage"]
+        while stage not in progress.TERMINAL_STAGES:
+            event = await subscription.next_event(PROGRESS_KEEPALIVE_SECONDS)
+            if await request.is_disconnected():
+                break
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            if event["type"] == "progress":
+                stage = event["stage"]
+            yield _sse(event["type"], event)
+    finally:
+        if subscription is not None:
+            await subscription.close()
+
+
+@app.get("/stream/{analysis_id}")
+async def stream_analysis_progress(analysis_id: str, request: Request, db: Session = Depends(get_db)):
+    """
+    Follow an analysis as server-sent events instead of polling /status.
+    - `progress` events on each transition: queued, processing, verifying, analyzing (retrying), then success, failed or rejected
+    - `output` events carrying partial LLM output as it is generated
+    The stream ends after the final stage; the report is at /result/{analysis_id}.
+    """
+    analysis = await run_in_threadpool(get_analysis, db, analysis_id)
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+
+    initial = {
+        "type": "progress",
+        "analysis_id": analysis.id,
+        "stage": "queued" if analysis.status == "pending" else analysis.status,
+        "error": analysis.error,
+    }
+    if analysis.status == "success":
+        initial["result_url"] = f"/result/{analysis.id}"
+
+    ## One database read per client; everything after comes from the worker over Redis
+    subscription = None
+    if initial["stage"] not in progress.TERMINAL_STAGES:
+        subscription = progress.ProgressSubscription(analysis.id)
+        try:
+            published = await subscription.open()
+        except Exception:
+            await subscription.close()
+            raise HTTPException(
+                status_code=503,
+                detail=f"Progress streaming unavailable; poll /status/{analysis.id} instead."
+            )
+        ## The worker's last event is finer-grained (verifying, analyzing) than the database status
+        if published:
+            initial = published
+
+    return StreamingResponse(
+        _progress_events(request, initial, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/batch/{batch_id}")
+def get_batch_status(batch_id: str, db: Session = Depends(get_db)):
+    """Aggregate progress of a batch, with the status of each analysis"""
+    analyses = get_batch_analyses(db, batch_id)
+    if not analyses:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    counts = Counter(a.status for a in analyses)
+    finished = counts["success"] + counts["failed"] + counts["rejected"]
+    return {
+        "batch_id": batch_id,
+        "status": "completed" if finished == len(analyses) else "processing",
+        "total": len(analyses),
+        "finished": finished,
+        "progress": finished / len(analyses),
+        "counts": dict(counts),
+        "analyses": [
+            {
+                "analysis_id": a.id,
+                "filename": a.filename,
+                "query": a.query,
+                "status": a.status,
+                "completed_at": a.completed_at
+            }
+            for a in analyses
+        ]
+    }
+
+
+## Opaque keyset cursor: the (created_at, id) of the last row on a page
+def _encode_cursor(analysis) -> str:
+    raw = f"{analysis.created_at.isoformat()}|{analysis.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, analysis_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        return datetime.datetime.fromisoformat(created_at), analysis_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
 
 
 @app.get("/analyses")
-async def list_analyses(limit: int = 10, db: Session = Depends(get_db)):
-    """Get list of all recent analyses"""
-    analyses = get_all_analyses(db, limit=limit)
+def list_analyses(limit: int = 10, cursor: str = None, status: str = None, db: Session = Depends(get_db)):
+    """
+    Get list of all recent analyses, newest first.
+    - cursor: next_cursor from the previous page (keyset pagination)
+    - status: only analyses with this status
+    """
+    limit = max(1, min(limit, ANALYSES_PAGE_MAX))
+    before_created_at, before_id = _decode_cursor(cursor) if cursor else (None, None)
+    analyses = get_all_analyses(
+        db, limit=limit, before_created_at=before_created_at, before_id=before_id, status=status
+    )
     return {
         "total": len(analyses),
+        "next_cursor": _encode_cursor(analyses[-1]) if len(analyses) == limit else None,
         "analyses": [
             {
                 "analysis_id": a.id,
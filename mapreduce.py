@@ -0,0 +1,117 @@
+## Chunked Map-Reduce Analysis for Financial Document Analyzer
+## Extracts query-relevant findings from section-aware chunks in parallel, then condenses
+## them until they fit a single reduce prompt; wall-clock time scales with fan-out, not length
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limit import RateLimiter
+import checkpoints
+import telemetry
+
+MAPREDUCE_CONCURRENCY = int(os.getenv("MAPREDUCE_CONCURRENCY", "8"))
+REDUCE_MAX_CHARS = int(os.getenv("REDUCE_MAX_CHARS", "40000"))
+
+MAP_SYSTEM_PROMPT = (
+    "You are a meticulous financial analyst reading one excerpt of a larger filing. "
+    "Report only facts stated in the excerpt; never infer or invent figures."
+)
+
+MAP_PROMPT = (
+    "User query: {query}\n"
+    "Excerpt section: {section} (pages {start_page}-{end_page})\n\n"
+    "Extract every fact in this excerpt that is relevant to the query or to a general financial analysis: "
+    "figures with their periods and units, trends, guidance, risks and material events. "
+    "Cite page numbers. Reply with concise bullet points, or 'No relevant content.' if there is none.\n\n"
+    "Excerpt:\n{text}"
+)
+
+CONDENSE_PROMPT = (
+    "User query: {query}\n\n"
+    "Merge the following findings from consecutive parts of a financial filing into one concise bullet list. "
+    "Keep every figure, period, unit and page citation; drop duplicates and 'No relevant content' entries.\n\n"
+    "{findings}"
+)
+
+## One limiter per agent role, shared by every request in this process
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(agent) -> RateLimiter:
+    with _limiters_lock:
+        if agent.role not in _limiters:
+            _limiters[agent.role] = RateLimiter(agent.max_rpm)
+        return _limiters[agent.role]
+
+
+## Runs on pool threads: enters the caller's trace and attributes the call to the agent
+def _call(agent, limiter: RateLimiter, prompt: str, trace: telemetry.Trace = None) -> str:
+    limiter.acquire()
+    with telemetry.trace_scope(trace), telemetry.agent_scope(agent.role):
+        return str(agent.llm.call([
+            {"role": "system", "content": MAP_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ]))
+
+
+def map_chunks(query: str, chunks: list, agent, concurrency: int = MAPREDUCE_CONCURRENCY) -> list:
+    """
+    Run the map prompt over every chunk with bounded concurrency and the agent's max_rpm.
+
+    Returns one findings string per chunk, prefixed with its section and page range.
+    Each chunk's findings are checkpointed, so a retried analysis only maps the
+    chunks its earlier attempts did not finish.
+    """
+    limiter = limiter_for(agent)
+    trace = telemetry.current_trace()
+    stages = checkpoints.current()
+
+    def extract(numbered):
+        index, chunk = numbered
+        with telemetry.trace_scope(trace), checkpoints.scope(stages):
+            findings = checkpoints.restore(f"map:{index}")
+            if findings is None:
+                findings = _call(agent, limiter, MAP_PROMPT.format(query=query, **chunk), trace)
+                findings = f"[{chunk['section']} p.{chunk['start_page']}-{chunk['end_page']}]\n{findings}"
+                checkpoints.save(f"map:{index}", findings)
+            return findings
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as pool:
+        return list(pool.map(extract, enumerate(chunks)))
+
+
+def condense_findings(query: str, findings: list, agent, max_chars: int = REDUCE_MAX_CHARS,
+                      concurrency: int = MAPREDUCE_CONCURRENCY) -> str:
+    """
+    Merge findings into one block no longer than max_chars.
+
+    While the findings do not fit, adjacent findings are grouped up to max_chars
+    and each group is condensed by the LLM in parallel (a tree reduce).
+    """
+    limiter = limiter_for(agent)
+    trace = telemetry.current_trace()
+    while True:
+        combined = "\n\n".join(findings)
+        if len(combined) <= max_chars or len(findings) == 1:
+            return combined[:max_chars]
+
+        groups, group, size = [], [], 0
+        for item in findings:
+            if group and size + len(item) > max_chars:
+                groups.append(group)
+                group, size = [], 0
+            group.append(item)
+            size += len(item) + 2
+        groups.append(group)
+
+        ## No progress possible when every finding already fills a group on its own
+        if len(groups) == len(findings):
+            groups = [findings[i:i + 2] for i in range(0, len(findings), 2)]
+
+        def condense(group):
+            return _call(agent, limiter, CONDENSE_PROMPT.format(query=query, findings="\n\n".join(group)), trace)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(groups)))) as pool:
+            findings = list(pool.map(condense, groups))
@@ -0,0 +1,492 @@
+## Document Parsers for Financial Document Analyzer
+## Registry of parsers keyed on the content type detected from the file's bytes. XBRL and inline
+## XBRL facts and spreadsheet tables become exact statement figures without any text parsing,
+## HTML filings are reduced to text, and everything else goes to the PDF extractor (extraction.py)
+
+import os
+import re
+import csv
+import zipfile
+import datetime
+import xml.etree.ElementTree as ElementTree
+from html.parser import HTMLParser
+
+from text_utils import normalize_whitespace, strip_page_headers
+
+## statements (pandas) is imported inside the parsers: the API imports this module to check
+## uploads long before anything is parsed
+
+## Content types the analyzer ingests; pdf is handled by extraction.py, the rest by PARSERS
+CONTENT_TYPES = ("pdf", "xbrl", "ixbrl", "html", "csv", "xlsx")
+
+## Upload file extensions accepted; the content type itself is detected from the bytes
+UPLOAD_EXTENSIONS = (".pdf", ".xml", ".xbrl", ".htm", ".html", ".xhtml", ".csv", ".xlsx")
+
+## Bytes inspected to detect the content type
+SNIFF_BYTES = 64 * 1024
+
+## Text without page breaks (XBRL, spreadsheets, HTML without print breaks) is split into pages
+## of about this many characters, so search and map-reduce chunking work as they do for PDFs
+PARSER_PAGE_CHARS = int(os.getenv("PARSER_PAGE_CHARS", "4000"))
+
+_IXBRL = re.compile(rb"xmlns:ix\s*=|<ix:header", re.IGNORECASE)
+_XBRL_ROOT = re.compile(rb"<(?:[\w.-]+:)?xbrl[\s>]")
+_HTML = re.compile(rb"<!doctype html|<html[\s>]", re.IGNORECASE)
+
+
+def _looks_like_csv(head: bytes, filename: str) -> bool:
+    text = head.decode("utf-8-sig", errors="replace")
+    ## The head may end mid-line
+    lines = [line for line in text.splitlines()[:50] if line.strip()]
+    if len(head) >= SNIFF_BYTES:
+        lines = lines[:-1]
+    if len(lines) < 2:
+        return False
+    try:
+        dialect = csv.Sniffer().sniff("\n".join(lines), delimiters=",;\t|")
+    except csv.Error:
+        return (filename or "").lower().endswith(".csv")
+    return sum(1 for row in csv.reader(lines, dialect) if len(row) >= 2) >= 2
+
+
+def sniff_content_type(head: bytes, filename: str = None) -> str:
+    """
+    Content type of a document from its first bytes (see CONTENT_TYPES), or None if unsupported.
+
+    Any zip container sniffs as "xlsx"; confirm with is_workbook once the whole
+    file is available.
+    """
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return "xlsx"
+    sample = head[:SNIFF_BYTES]
+    if b"\x00" in sample:
+        return None
+    if _IXBRL.search(sample):
+        return "ixbrl"
+    if _XBRL_ROOT.search(sample):
+        return "xbrl"
+    if _HTML.search(sample):
+        return "html"
+    if _looks_like_csv(sample, filename):
+        return "csv"
+    return None
+
+
+def is_workbook(path: str) -> bool:
+    """Whether a zip container is an Excel workbook; other zips (docx, odf) are not spreadsheets"""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return "xl/workbook.xml" in archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+
+
+def detect_content_type(path: str) -> str:
+    """Content type of a stored document; anything unrecognized is treated as a PDF"""
+    with open(path, "rb") as f:
+        content_type = sniff_content_type(f.read(SNIFF_BYTES), path)
+    if content_type == "xlsx" and not is_workbook(path):
+        return "pdf"
+    return content_type or "pdf"
+
+
+def paginate(text: str, page_chars: int = PARSER_PAGE_CHARS) -> list:
+    """Split text into pages of about page_chars characters on line boundaries"""
+    pages, lines, size = [], [], 0
+    for line in text.split("\n"):
+        if lines and size + len(line) > page_chars:
+            pages.append("\n".join(lines))
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line) + 1
+    if lines:
+        pages.append("\n".join(lines))
+    return [page for page in pages if page.strip()]
+
+
+## Parsers return {"pages": [cleaned page text], "statements": structured statements or None}
+## (see statements.structured_frame); they run in extraction.py's process pool, so they must be
+## module-level functions
+PARSERS = {}
+
+
+def parser(content_type: str):
+    """Register a parser for a content type"""
+    def register(func):
+        PARSERS[content_type] = func
+        return func
+    return register
+
+
+def parse_document(content_type: str, path: str) -> dict:
+    """Parse a document with the parser registered for its content type"""
+    return PARSERS[content_type](path)
+
+
+## XBRL: us-gaap and IFRS concepts reporting each line item, preferred first
+XBRL_CONCEPTS = {
+    "revenue": [
+        "Revenues", "RevenueFromContractWithCustomerExcludingAssessedTax",
+        "RevenueFromContractWithCustomerIncludingAssessedTax", "SalesRevenueNet", "Revenue",
+    ],
+    "cost_of_revenue": ["CostOfRevenue", "CostOfGoodsAndServicesSold", "CostOfGoodsSold", "CostOfSales"],
+    "gross_profit": ["GrossProfit"],
+    "operating_income": ["OperatingIncomeLoss", "ProfitLossFromOperatingActivities"],
+    "interest_expense": ["InterestExpense", "InterestExpenseNonoperating", "InterestExpenseDebt", "FinanceCosts"],
+    "net_income": ["NetIncomeLoss", "ProfitLossAttributableToOwnersOfParent", "ProfitLoss"],
+    "eps_diluted": ["EarningsPerShareDiluted", "DilutedEarningsLossPerShare"],
+    "shares_diluted": ["WeightedAverageNumberOfDilutedSharesOutstanding", "AdjustedWeightedAverageShares"],
+    "cash": ["CashAndCashEquivalentsAtCarryingValue", "CashAndCashEquivalents"],
+    "inventory": ["InventoryNet", "Inventories"],
+    "total_current_assets": ["AssetsCurrent", "CurrentAssets"],
+    "total_assets": ["Assets"],
+    "total_current_liabilities": ["LiabilitiesCurrent", "CurrentLiabilities"],
+    "total_liabilities": ["Liabilities"],
+    "total_debt": ["LongTermDebt", "LongTermDebtNoncurrent", "Borrowings", "NoncurrentPortionOfNoncurrentBorrowings"],
+    "total_equity": [
+        "StockholdersEquity", "EquityAttributableToOwnersOfParent",
+        "StockholdersEquityIncludingPortionAttributableToNoncontrollingInterest", "Equity",
+    ],
+    "operating_cash_flow": ["NetCashProvidedByUsedInOperatingActivities", "CashFlowsFromUsedInOperatingActivities"],
+    "capital_expenditures": [
+        "PaymentsToAcquirePropertyPlantAndEquipment",
+        "PurchaseOfPropertyPlantAndEquipmentClassifiedAsInvestingActivities",
+    ],
+}
+_CONCEPT_ITEMS = {
+    concept: (item, rank) for item, concepts in XBRL_CONCEPTS.items() for rank, concept in enumerate(concepts)
+}
+
+## Document and entity information shown above the statements of XBRL instances
+_DEI_FIELDS = {
+    "EntityRegistrantName": "Registrant",
+    "DocumentType": "Form",
+    "DocumentPeriodEndDate": "Period ended",
+    "TradingSymbol": "Ticker",
+}
+
+
+def _local_name(name: str) -> str:
+    """us-gaap:Revenues / {http://fasb.org/us-gaap/2024}Revenues -> Revenues"""
+    return name.rsplit("}", 1)[-1].rsplit(":", 1)[-1]
+
+
+def _parse_date(text: str) -> datetime.date:
+    return datetime.date.fromisoformat(text.strip()[:10])
+
+
+## Column label of a reporting period: calendar quarter or fiscal year by its end date;
+## other durations (six and nine months year-to-date) are not reported
+def _duration_label(start: datetime.date, end: datetime.date) -> str:
+    days = (end - start).days
+    if 80 <= days <= 100:
+        return f"Q{(end.month - 1) // 3 + 1}-{end.year}"
+    if 350 <= days <= 380:
+        return f"FY{end.year}"
+    return None
+
+
+## XBRL reports raw units; amounts and share counts are shown in millions once they reach them
+def _scaled(items: dict) -> dict:
+    amounts = [abs(value) for item, values in items.items() if item != "eps_diluted" for value in values.values()]
+    if not amounts or max(amounts) < 1e7:
+        return {"units": "", "items": items}
+    return {
+        "units": "millions",
+        "items": {
+            item: {period: value if item == "eps_diluted" else round(value / 1e6, 6) for period, value in values.items()}
+            for item, values in items.items()
+        },
+    }
+
+
+def statements_from_facts(facts: list, contexts: dict) -> dict:
+    """
+    Structured statements from XBRL facts.
+
+    facts are (concept, context id, value) triples; contexts maps the ids of
+    non-dimensional contexts to (start date, end date), with a None start for
+    instants. Balance-sheet instants take the label of the periods ending on
+    the same date.
+    """
+    durations = {}
+    for start, end in contexts.values():
+        label = _duration_label(start, end) if start is not None else None
+        if label:
+            durations.setdefault(end, set()).add(label)
+    annual = any(label.startswith("FY") for labels in durations.values() for label in labels)
+
+    chosen = {}
+    for concept, context_id, value in facts:
+        if concept not in _CONCEPT_ITEMS or context_id not in contexts:
+            continue
+        item, rank = _CONCEPT_ITEMS[concept]
+        start, end = contexts[context_id]
+        if start is not None:
+            labels = [label for label in [_duration_label(start, end)] if label]
+        else:
+            labels = sorted(durations.get(end, ())) or [
+                f"FY{end.year}" if annual else f"Q{(end.month - 1) // 3 + 1}-{end.year}"
+            ]
+        for label in labels:
+            if (item, label) not in chosen or rank < chosen[(item, label)][0]:
+                chosen[(item, label)] = (rank, value)
+
+    items = {}
+    for (item, label), (_, value) in chosen.items():
+        items.setdefault(item, {})[label] = value
+    return _scaled(items)
+
+
+def _structured_pages(statements: dict, heading: list, pages: list = ()) -> list:
+    """Rendered statements (after any heading lines) as the first pages, then the document's own"""
+    from statements import render_statements
+
+    rendered = render_statements(statements)
+    head = "\n".join(heading + ([""] if heading and rendered else []) + ([rendered] if rendered else []))
+    return (paginate(head) if head.strip() else []) + list(pages)
+
+
+@parser("xbrl")
+def parse_xbrl(path: str) -> dict:
+    """XBRL instance document: facts streamed with iterparse, so memory stays flat on large filings"""
+    from statements import parse_cell
+
+    contexts = {}
+    facts = []
+    entity = {}
+    for _, element in ElementTree.iterparse(path, events=("end",)):
+        name = _local_name(element.tag)
+        if name == "context":
+            period = {_local_name(child.tag): child.text for child in element.iter()}
+            ## Dimensional contexts report segments (a product line, a region), not the consolidated entity;
+            ## contexts with malformed dates are skipped
+            try:
+                if "segment" not in period and "scenario" not in period:
+                    if period.get("instant"):
+                        contexts[element.get("id")] = (None, _parse_date(period["instant"]))
+                    elif period.get("startDate") and period.get("endDate"):
+                        contexts[element.get("id")] = (_parse_date(period["startDate"]), _parse_date(period["endDate"]))
+            except ValueError:
+                pass
+            element.clear()
+        elif element.get("contextRef") is not None:
+            if element.text and element.text.strip():
+                if name in _CONCEPT_ITEMS:
+                    value = parse_cell(element.text)
+                    if value == value:
+                        facts.append((name, element.get("contextRef"), value))
+                elif name in _DEI_FIELDS:
+                    entity[name] = element.text.strip()
+            element.clear()
+
+    statements = statements_from_facts(facts, contexts)
+    heading = [f"{label}: {entity[field]}" if label != "Form" else f"Form {entity[field]}"
+               for field, label in _DEI_FIELDS.items() if field in entity]
+    return {"pages": _structured_pages(statements, heading), "statements": statements}
+
+
+## HTML block elements that end a line of text; table cells are separated by tabs until rendered
+_BLOCK_TAGS = {
+    "p", "div", "br", "tr", "li", "ul", "ol", "table", "section", "article", "header", "footer",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "title", "pre", "blockquote",
+}
+_SKIPPED_TAGS = {"script", "style", "head", "ix:header"}
+_PAGE_BREAK = re.compile(r"(?:page-)?break-(?:before|after)\s*:\s*(?:always|page)", re.IGNORECASE)
+
+## Table cells holding only a sign or currency symbol belong to the neighbouring number
+_CELL_PREFIXES = {"$", "(", "($", "$(", "€", "£"}
+_CELL_SUFFIXES = {")", "%", ")%"}
+
+
+class _FilingHTMLParser(HTMLParser):
+    """
+    Text, page breaks and inline XBRL facts of an HTML filing in one pass.
+
+    Hidden ix:header content (contexts, hidden facts) is kept out of the text
+    but still read for contexts.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+        self.contexts = {}
+        self.facts = []
+        self._context = None
+        self._context_field = None
+        self._open_facts = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if _PAGE_BREAK.search(attrs.get("style") or ""):
+            self.parts.append("\f")
+        if tag in _SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+        elif tag in ("td", "th"):
+            self.parts.append("\t")
+
+        if tag == "xbrli:context":
+            self._context = {"id": attrs.get("id"), "dimensional": False}
+        elif self._context is not None and tag in ("xbrli:segment", "xbrli:scenario"):
+            self._context["dimensional"] = True
+        elif self._context is not None and tag in ("xbrli:startdate", "xbrli:enddate", "xbrli:instant"):
+            self._context_field = tag.split(":")[1]
+            self._context[self._context_field] = ""
+        elif tag == "ix:nonfraction":
+            self._open_facts.append({**attrs, "text": []})
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+        if tag == "xbrli:context" and self._context is not None:
+            context = self._context
+            self._context = None
+            try:
+                if context["dimensional"]:
+                    pass
+                elif context.get("instant"):
+                    self.contexts[context["id"]] = (None, _parse_date(context["instant"]))
+                elif context.get("startdate") and context.get("enddate"):
+                    self.contexts[context["id"]] = (_parse_date(context["startdate"]), _parse_date(context["enddate"]))
+            except ValueError:
+                pass
+        elif tag in ("xbrli:startdate", "xbrli:enddate", "xbrli:instant"):
+            self._context_field = None
+        elif tag == "ix:nonfraction" and self._open_facts:
+            self._record_fact(self._open_facts.pop())
+
+    def handle_data(self, data):
+        if self._context_field is not None:
+            self._context[self._context_field] += data
+        for fact in self._open_facts:
+            fact["text"].append(data)
+        if not self.skip_depth:
+            self.parts.append(data)
+
+    def _record_fact(self, fact: dict):
+        from statements import parse_cell
+
+        concept = _local_name(fact.get("name") or "")
+        if concept not in _CONCEPT_ITEMS:
+            return
+        text = "".join(fact["text"]).strip()
+        if "zero" in (fact.get("format") or "") or text in ("", "-", "—", "–"):
+            value = 0.0
+        else:
+            if "comma-decimal" in (fact.get("format") or "") or "numcommadecimal" in (fact.get("format") or ""):
+                text = text.replace(".", "").replace(" ", "").replace(",", ".")
+            value = parse_cell(text.replace("(", "").replace(")", ""))
+            if value != value:
+                return
+            value *= 10 ** int(fact.get("scale") or 0)
+        if fact.get("sign") == "-":
+            value = -value
+        self.facts.append((concept, fact.get("contextref"), value))
+
+
+## One line of text: table cells (tab separated) joined with two spaces, symbol-only cells glued on
+def _render_line(line: str) -> str:
+    cells = []
+    prefix = ""
+    for cell in (part.strip() for part in line.split("\t")):
+        if not cell:
+            continue
+        if cell in _CELL_PREFIXES:
+            prefix += cell
+        elif cell in _CELL_SUFFIXES and cells:
+            cells[-1] += cell
+        else:
+            cells.append(prefix + cell)
+            prefix = ""
+    return "  ".join(cells)
+
+
+def _html_pages(parser: _FilingHTMLParser) -> list:
+    text = "".join(parser.parts).replace("\xa0", " ")
+    sheets = [
+        normalize_whitespace("\n".join(_render_line(line) for line in sheet.split("\n")))
+        for sheet in text.split("\f")
+    ]
+    sheets = [sheet for sheet in sheets if sheet.strip()]
+    ## Print page breaks give real pages (with running headers to strip); long or unbroken text is paginated
+    if len(sheets) > 1:
+        sheets = strip_page_headers(sheets)
+    return [page for sheet in sheets for page in (paginate(sheet) if len(sheet) > 2 * PARSER_PAGE_CHARS else [sheet])]
+
+
+def _feed_html(path: str) -> _FilingHTMLParser:
+    parser = _FilingHTMLParser()
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for block in iter(lambda: f.read(1024 * 1024), ""):
+            parser.feed(block)
+    parser.close()
+    return parser
+
+
+@parser("html")
+def parse_html(path: str) -> dict:
+    """HTML filing: visible text, split on print page breaks"""
+    return {"pages": _html_pages(_feed_html(path)), "statements": None}
+
+
+@parser("ixbrl")
+def parse_ixbrl(path: str) -> dict:
+    """Inline XBRL filing: the HTML text plus exact statements from its tagged facts"""
+    parsed = _feed_html(path)
+    statements = statements_from_facts(parsed.facts, parsed.contexts)
+    return {"pages": _html_pages(parsed), "statements": statements if statements["items"] else None}
+
+
+## Spreadsheets: every sheet is read as a grid of cell strings; statements come from the sheet
+## reporting each line item for the most periods
+def _grid_document(sheets: list) -> dict:
+    from statements import detect_units, statements_from_grid
+
+    rendered = [
+        (name, ["  ".join(cell for cell in (str(cell).strip() for cell in row) if cell) for row in rows])
+        for name, rows in sheets
+    ]
+    units = detect_units("\n".join(line for _, lines in rendered for line in lines))
+
+    items = {}
+    for _, rows in sheets:
+        for item, values in statements_from_grid(rows)["items"].items():
+            if len(values) > len(items.get(item, {})):
+                items[item] = values
+    statements = {"units": units, "items": items}
+
+    pages = []
+    for name, lines in rendered:
+        text = normalize_whitespace("\n".join([f"Sheet: {name}"] + [line for line in lines if line]))
+        pages.extend(paginate(text))
+    return {"pages": _structured_pages(statements, [], pages), "statements": statements if items else None}
+
+
+@parser("csv")
+def parse_csv(path: str) -> dict:
+    """CSV export: the delimiter is sniffed"""
+    import pandas as pd
+
+    frame = pd.read_csv(
+        path, header=None, dtype=str, keep_default_na=False, sep=None, engine="python", encoding="utf-8-sig"
+    )
+    return _grid_document([(os.path.basename(path), frame.values.tolist())])
+
+
+@parser("xlsx")
+def parse_xlsx(path: str) -> dict:
+    """Excel workbook: every sheet (requires openpyxl)"""
+    import pandas as pd
+
+    workbook = pd.read_excel(path, sheet_name=None, header=None)
+    return _grid_document([
+        (name, sheet.fillna("").astype(str).values.tolist()) for name, sheet in workbook.items()
+    ])
@@ -0,0 +1,107 @@
+## Local Pre-Verification for Financial Document Analyzer
+## Scores document text for financial-statement structure in milliseconds so clearly
+## non-financial uploads are rejected before any LLM call
+
+import os
+import re
+import functools
+
+## Score thresholds: below REJECT the upload is refused, at or above HIGH it may skip the verifier agent
+PREVERIFY_REJECT_BELOW = float(os.getenv("PREVERIFY_REJECT_BELOW", "0.2"))
+PREVERIFY_HIGH_CONFIDENCE = float(os.getenv("PREVERIFY_HIGH_CONFIDENCE", "0.75"))
+
+## Only the head of very long documents is scanned; structure shows up early
+PREVERIFY_SCAN_CHARS = int(os.getenv("PREVERIFY_SCAN_CHARS", "500000"))
+
+SECTION_PATTERNS = {
+    "income_statement": r"income statements?|statements? of (?:consolidated )?(?:operations|income|earnings)|profit and loss",
+    "balance_sheet": r"balance sheets?|statements? of financial position",
+    "cash_flow": r"statements? of cash flows?|cash flows? statements?",
+    "equity": r"statements? of (?:stockholders|shareholders)'? equity",
+    "filing_type": r"form 10-[kq]|annual report|quarterly report|earnings release|shareholder deck|financial summary",
+}
+
+## Patterns run against lower-cased text, which is much faster than re.IGNORECASE
+_SECTIONS = {name: re.compile(pattern) for name, pattern in SECTION_PATTERNS.items()}
+_NUMBER = re.compile(r"\b\d{1,3}(?:,\d{3})+(?:\.\d+)?\b|\b\d+\.\d+\b|\(\d[\d,]*\)")
+_CURRENCY = re.compile(r"[$€£¥]|\b(?:usd|eur|gbp)\b|\bin (?:thousands|millions|billions)\b")
+_FISCAL_DATE = re.compile(
+    r"\b(?:fiscal (?:year|quarter)|(?:three|six|nine|twelve) months ended|(?:quarter|year) ended"
+    r"|q[1-4][-\s]?(?:19|20)\d{2}|fy\s?(?:19|20)?\d{2})\b"
+)
+
+## Component weights sum to 1.0
+WEIGHTS = {
+    "sections": 0.3,
+    "line_items": 0.25,
+    "number_density": 0.15,
+    "currency": 0.15,
+    "fiscal_dates": 0.15,
+}
+
+
+## Built on first use: statements pulls in pandas, and the API imports this module for
+## DocumentRejected long before it screens anything
+@functools.lru_cache(maxsize=None)
+def _line_item_labels():
+    from statements import LINE_ITEMS
+    return re.compile(rf"^\s*(?:{'|'.join(LINE_ITEMS.values())})\b", re.MULTILINE)
+
+
+class DocumentRejected(Exception):
+    """Raised when an upload is clearly not a financial document"""
+
+    def __init__(self, screening: dict):
+        self.screening = screening
+        super().__init__(
+            f"Document rejected by pre-verification (score {screening['score']:.2f}): "
+            "no financial statement structure found"
+        )
+
+
+def score_document(text: str) -> dict:
+    """
+    Score text for financial-statement structure.
+
+    Returns a dict with the overall score (0-1), its per-signal components and
+    a confidence label: "reject", "uncertain" or "high".
+    """
+    sample = text[:PREVERIFY_SCAN_CHARS].lower()
+    words = max(len(sample.split()), 1)
+
+    sections = [name for name, pattern in _SECTIONS.items() if pattern.search(sample)]
+    line_items = {match.strip() for match in _line_item_labels().findall(sample)}
+    numbers_per_100_words = 100 * len(_NUMBER.findall(sample)) / words
+    currency_hits = len(_CURRENCY.findall(sample))
+    fiscal_hits = set(_FISCAL_DATE.findall(sample))
+
+    components = {
+        "sections": min(len(sections) / 3, 1.0),
+        "line_items": min(len(line_items) / 6, 1.0),
+        "number_density": min(numbers_per_100_words / 10, 1.0),
+        "currency": min(currency_hits / 20, 1.0),
+        "fiscal_dates": min(len(fiscal_hits) / 3, 1.0),
+    }
+    score = sum(WEIGHTS[name] * value for name, value in components.items())
+
+    if score < PREVERIFY_REJECT_BELOW:
+        confidence = "reject"
+    elif score >= PREVERIFY_HIGH_CONFIDENCE:
+        confidence = "high"
+    else:
+        confidence = "uncertain"
+
+    return {
+        "score": round(score, 3),
+        "confidence": confidence,
+        "components": {name: round(value, 3) for name, value in components.items()},
+        "sections_found": sections,
+    }
+
+
+def prescreen(text: str) -> dict:
+    """Score a document and raise DocumentRejected when it is clearly not financial"""
+    screening = score_document(text)
+    if screening["confidence"] == "reject":
+        raise DocumentRejected(screening)
+    return screening
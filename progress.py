@@ -0,0 +1,205 @@
+## Progress Events for Financial Document Analyzer
+## Workers publish state transitions and partial LLM output on a per-analysis Redis pub/sub
+## channel; the API relays them to clients as server-sent events (GET /stream/{analysis_id})
+
+import os
+import json
+import time
+import functools
+import contextlib
+import contextvars
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+## queued -> processing -> verifying -> analyzing -> success / failed / rejected
+## (retrying when a failed attempt will run again)
+PROGRESS_STAGES = ("queued", "processing", "verifying", "analyzing", "retrying", "success", "failed", "rejected")
+TERMINAL_STAGES = ("success", "failed", "rejected")
+
+## How long the last known stage is kept for late subscribers
+PROGRESS_TTL_SECONDS = int(os.getenv("PROGRESS_TTL_SECONDS", "3600"))
+
+## Streamed LLM output is batched into messages of at least this many characters,
+## or whatever arrived within PROGRESS_OUTPUT_INTERVAL seconds
+PROGRESS_OUTPUT_CHARS = int(os.getenv("PROGRESS_OUTPUT_CHARS", "200"))
+PROGRESS_OUTPUT_INTERVAL = float(os.getenv("PROGRESS_OUTPUT_INTERVAL", "0.5"))
+
+
+def channel_name(analysis_id: str) -> str:
+    return f"progress:{analysis_id}"
+
+
+def state_key(analysis_id: str) -> str:
+    return f"progress:{analysis_id}:state"
+
+
+## Short timeouts: a slow or unreachable Redis must not hold up the analysis publishing to it
+@functools.lru_cache(maxsize=None)
+def _client():
+    import redis
+    return redis.Redis.from_url(REDIS_URL, socket_connect_timeout=1, socket_timeout=2)
+
+
+def _event(analysis_id: str, stage: str, **fields) -> dict:
+    if stage not in PROGRESS_STAGES:
+        raise ValueError(f"Unknown progress stage '{stage}', expected one of {PROGRESS_STAGES}")
+    return {"type": "progress", "analysis_id": analysis_id, "stage": stage, "at": time.time(), **fields}
+
+
+def publish_stages(analysis_ids: list, stage: str, **fields):
+    """
+    Publish a stage for several analyses in one round-trip.
+
+    Progress is best effort: a Redis outage never fails an analysis, clients
+    fall back to /status.
+    """
+    messages = {analysis_id: json.dumps(_event(analysis_id, stage, **fields)) for analysis_id in analysis_ids}
+    if not messages:
+        return
+    try:
+        pipe = _client().pipeline(transaction=False)
+        for analysis_id, message in messages.items():
+            pipe.set(state_key(analysis_id), message, ex=PROGRESS_TTL_SECONDS)
+            pipe.publish(channel_name(analysis_id), message)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+def publish_stage(analysis_id: str, stage: str, **fields):
+    """Publish a state transition and remember it as the analysis's current stage"""
+    publish_stages([analysis_id], stage, **fields)
+
+
+def mark_queued(analysis_ids: list):
+    """
+    Record "queued" for freshly enqueued analyses without publishing it.
+
+    Called after the task is enqueued, so a worker may already have moved the
+    analysis on: the stage is only set where none exists yet. Nobody can be
+    subscribed before the API has returned the analysis id, so the stored
+    stage alone is what late subscribers need.
+    """
+    if not analysis_ids:
+        return
+    try:
+        pipe = _client().pipeline(transaction=False)
+        for analysis_id in analysis_ids:
+            pipe.set(state_key(analysis_id), json.dumps(_event(analysis_id, "queued")), ex=PROGRESS_TTL_SECONDS, nx=True)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+def publish_output(analysis_id: str, text: str, section: str = None):
+    """Publish a piece of partial LLM output (not remembered for late subscribers)"""
+    message = {"type": "output", "analysis_id": analysis_id, "text": text, "at": time.time()}
+    if section:
+        message["section"] = section
+    try:
+        _client().publish(channel_name(analysis_id), json.dumps(message))
+    except Exception:
+        pass
+
+
+class _Binding:
+    """The analysis (and full-report section) the current thread is working on"""
+
+    def __init__(self, analysis_id: str, section: str = None):
+        self.analysis_id = analysis_id
+        self.section = section
+        self.buffer = []
+        self.buffered = 0
+        self.flushed_at = time.monotonic()
+
+    def write(self, text: str):
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= PROGRESS_OUTPUT_CHARS or time.monotonic() - self.flushed_at >= PROGRESS_OUTPUT_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            publish_output(self.analysis_id, "".join(self.buffer), self.section)
+            self.buffer = []
+            self.buffered = 0
+        self.flushed_at = time.monotonic()
+
+
+_current = contextvars.ContextVar("progress_binding", default=None)
+
+
+@contextlib.contextmanager
+def bind(analysis_id: str, section: str = None):
+    """
+    Attribute report() and stream_output() calls in this context to an analysis.
+
+    Threads do not inherit the binding: code fanning work out to a pool binds
+    again inside each worker (see crews.run_full_report). Binding None is a no-op
+    scope, so callers need not check whether progress is being tracked.
+    """
+    binding = _Binding(analysis_id, section) if analysis_id else None
+    token = _current.set(binding)
+    try:
+        yield binding
+    finally:
+        if binding is not None:
+            binding.flush()
+        _current.reset(token)
+
+
+def current_analysis() -> str:
+    binding = _current.get()
+    return binding.analysis_id if binding else None
+
+
+def report(stage: str, **fields):
+    """Publish a stage for the bound analysis, after any output buffered before it"""
+    binding = _current.get()
+    if binding is None:
+        return
+    binding.flush()
+    publish_stage(binding.analysis_id, stage, **fields)
+
+
+def stream_output(text: str):
+    """Forward partial LLM output for the bound analysis"""
+    binding = _current.get()
+    if binding is not None and text:
+        binding.write(text)
+
+
+class ProgressSubscription:
+    """
+    Async subscription to one analysis's progress channel, for the API's event stream.
+
+    The channel is subscribed before the stored stage is read, so a transition
+    published in between is never lost (at worst it is seen twice).
+    """
+
+    def __init__(self, analysis_id: str):
+        self.analysis_id = analysis_id
+        self._redis = None
+        self._pubsub = None
+
+    async def open(self):
+        """Subscribe and return the last published stage event, or None if there is none"""
+        import redis.asyncio
+
+        self._redis = redis.asyncio.Redis.from_url(REDIS_URL)
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.subscribe(channel_name(self.analysis_id))
+        state = await self._redis.get(state_key(self.analysis_id))
+        return json.loads(state) if state else None
+
+    async def next_event(self, timeout: float):
+        """The next event on the channel, or None if nothing arrived within timeout seconds"""
+        message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        return json.loads(message["data"]) if message else None
+
+    async def close(self):
+        with contextlib.suppress(Exception):
+            if self._pubsub is not None:
+                await self._pubsub.aclose()
+            if self._redis is not None:
+                await self._redis.aclose()
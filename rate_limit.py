@@ -0,0 +1,165 @@
+## Request Rate Limiting for Financial Document Analyzer
+## Keeps direct LLM fan-out (e.g. map-reduce chunk calls) within an agent's max_rpm, and the
+## aggregate LLM traffic of every API and worker process within the provider quota
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+## After a Redis failure, buckets use their per-process fallback for this long before trying
+## Redis again, so calls do not each wait out the connect timeout while Redis is down
+RATE_LIMIT_REDIS_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_REDIS_BACKOFF_SECONDS", "30"))
+
+## Atomic take from a bucket refilled at ARGV[1] tokens/s up to ARGV[2]; uses the Redis clock
+## so every host agrees. Returns "0" when ARGV[3] tokens were taken, else the seconds to wait
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(1000 * capacity / rate) + 1000)
+return tostring(wait)
+"""
+
+
+class RateLimiter:
+    """
+    Thread-safe sliding-window limiter: at most max_per_minute acquisitions in
+    any 60 second window. acquire() blocks until a slot is free.
+    """
+
+    def __init__(self, max_per_minute: int, window_seconds: float = 60.0):
+        self.max_per_minute = max_per_minute
+        self.window_seconds = window_seconds
+        self._stamps = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.max_per_minute:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._stamps and now - self._stamps[0] >= self.window_seconds:
+                    self._stamps.popleft()
+                if len(self._stamps) < self.max_per_minute:
+                    self._stamps.append(now)
+                    return
+                wait = self.window_seconds - (now - self._stamps[0])
+            time.sleep(wait)
+
+
+class TokenBucket:
+    """
+    Thread-safe in-process token bucket: refills at per_minute tokens per
+    minute up to burst. acquire(cost) blocks until cost tokens are available.
+    """
+
+    def __init__(self, per_minute: float, burst: float = None):
+        self.rate = per_minute / 60
+        self.capacity = burst or per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost: float = 1):
+        if not self.rate:
+            return
+        cost = min(cost, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= cost:
+                    self._tokens -= cost
+                    return
+                wait = (cost - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RedisTokenBucket:
+    """
+    Token bucket shared through Redis by every process using the same name.
+
+    Refills at per_minute tokens per minute up to burst (default: one
+    minute's worth). acquire(cost) blocks until cost tokens are available.
+    When Redis is unreachable it falls back to a per-process bucket of the
+    same rate, charged the same cost, so analyses keep running instead of
+    failing; Redis is retried after RATE_LIMIT_REDIS_BACKOFF_SECONDS.
+    """
+
+    def __init__(self, name: str, per_minute: float, burst: float = None, redis_url: str = REDIS_URL):
+        self.name = name
+        self.per_minute = per_minute
+        self.burst = burst or per_minute
+        self.redis_url = redis_url
+        self.acquired = 0
+        self.waited_seconds = 0.0
+        self.fallbacks = 0
+        self._script = None
+        self._fallback = TokenBucket(per_minute, self.burst)
+        self._redis_down_until = 0.0
+        self._lock = threading.Lock()
+
+    def _take(self, cost: float) -> float:
+        if self._script is None:
+            import redis
+            client = redis.Redis.from_url(self.redis_url, socket_connect_timeout=1, socket_timeout=2)
+            self._script = client.register_script(_TAKE_SCRIPT)
+        return float(self._script(keys=[f"ratelimit:{self.name}"], args=[self.per_minute / 60, self.burst, cost]))
+
+    def acquire(self, cost: float = 1):
+        if not self.per_minute:
+            return
+        cost = min(cost, self.burst)
+        started = time.monotonic()
+        while True:
+            if time.monotonic() < self._redis_down_until:
+                wait = None
+            else:
+                try:
+                    wait = self._take(cost)
+                except Exception:
+                    logger.warning("rate limit bucket %s: Redis unavailable, limiting per process for %.0fs",
+                                   self.name, RATE_LIMIT_REDIS_BACKOFF_SECONDS, exc_info=True)
+                    self._redis_down_until = time.monotonic() + RATE_LIMIT_REDIS_BACKOFF_SECONDS
+                    wait = None
+            if wait is None:
+                with self._lock:
+                    self.fallbacks += 1
+                self._fallback.acquire(cost)
+                break
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        with self._lock:
+            self.acquired += 1
+            self.waited_seconds += time.monotonic() - started
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "per_minute": self.per_minute,
+                "acquired": self.acquired,
+                "avg_wait_ms": 1000 * self.waited_seconds / self.acquired if self.acquired else 0.0,
+                "fallbacks": self.fallbacks,
+            }
@@ -0,0 +1,106 @@
+## Analysis Result Cache for Financial Document Analyzer
+## Serves repeat (document, query) pairs from database.AnalysisResult and tracks hit rates
+
+import os
+import re
+import hashlib
+import datetime
+import threading
+
+from database import get_cached_analysis, get_inflight_analysis, evict_cached_analyses
+
+## Freshness and size bound for cached results
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(24 * 3600)))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+RESULT_CACHE_EVICT_EVERY = int(os.getenv("RESULT_CACHE_EVICT_EVERY", "100"))
+
+## Queued/processing analyses older than this are assumed lost and are not joined
+RESULT_INFLIGHT_MAX_AGE_SECONDS = int(os.getenv("RESULT_INFLIGHT_MAX_AGE_SECONDS", "1800"))
+
+## Words that do not change what is being asked
+_FILLER_WORDS = {
+    "a", "an", "the", "please", "can", "could", "would", "you", "me", "for", "of",
+    "this", "that", "document", "report", "file", "pdf", "kindly", "tell", "give",
+}
+_NON_WORD = re.compile(r"[^a-z0-9%$]+")
+
+
+def normalize_query(query: str) -> str:
+    """Lower-case, strip punctuation and filler words so near-identical queries compare equal"""
+    words = _NON_WORD.sub(" ", query.lower()).split()
+    return " ".join(word for word in words if word not in _FILLER_WORDS)
+
+
+## Modes producing the same plain analysis share cache keys
+_PLAIN_ANALYSIS_MODES = ("sequential", "merged", "mapreduce")
+
+
+def make_query_key(query: str, mode: str) -> str:
+    """
+    Result-cache key of a query run in `mode` (the requested mode, defaults resolved).
+
+    Lookup answers and full reports differ in shape from a plain analysis, and
+    auto mode may produce either depending on the query, so each of those
+    modes gets its own keys; the plain-analysis modes share theirs.
+    """
+    normalized = normalize_query(query)
+    if mode not in _PLAIN_ANALYSIS_MODES:
+        normalized = f"{mode}:{normalized}"
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+class ResultCacheStats:
+    """Process-local counters for result-cache lookups and coalesced requests"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+
+    def record(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            hits, misses, coalesced, stores = self.hits, self.misses, self.coalesced, self.stores
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "coalesced": coalesced,
+            "stores": stores,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+result_cache_stats = ResultCacheStats()
+
+
+def lookup_result(db, document_hash: str, query_key: str):
+    """Return a fresh successful AnalysisResult for this document and query, or None"""
+    if not document_hash:
+        return None
+    cached = get_cached_analysis(db, document_hash, query_key, RESULT_CACHE_TTL_SECONDS)
+    result_cache_stats.record("hits" if cached else "misses")
+    return cached
+
+
+def lookup_inflight(db, document_hash: str, query_key: str):
+    """Return a recent pending/processing AnalysisResult for this document and query, or None"""
+    if not document_hash:
+        return None
+    since = datetime.datetime.utcnow() - datetime.timedelta(seconds=RESULT_INFLIGHT_MAX_AGE_SECONDS)
+    inflight = get_inflight_analysis(db, document_hash, query_key, since)
+    if inflight:
+        result_cache_stats.record("coalesced")
+    return inflight
+
+
+def note_result_stored(db):
+    """Count a newly cached result and periodically evict expired or excess entries"""
+    result_cache_stats.record("stores")
+    if result_cache_stats.stores % RESULT_CACHE_EVICT_EVERY == 0:
+        evict_cached_analyses(db, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_MAX_ENTRIES)
@@ -0,0 +1,237 @@
+## Local Retrieval Index for Financial Document Analyzer
+## BM25 over page passages, built once per document with NumPy and persisted next to the
+## cached parse, so agents fetch a few relevant passages instead of the whole filing
+
+import io
+import os
+import re
+import zipfile
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from doc_cache import document_cache
+from sections import page_section
+
+## Passage size bound (characters) and default number of passages returned
+RETRIEVAL_PASSAGE_CHARS = int(os.getenv("RETRIEVAL_PASSAGE_CHARS", "1200"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+
+## Loaded indexes kept in memory per process
+RETRIEVAL_MEMORY_INDEXES = int(os.getenv("RETRIEVAL_MEMORY_INDEXES", "32"))
+
+## Bump when the index layout or tokenization changes
+RETRIEVAL_INDEX_FORMAT = "1"
+
+## BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+_STOPWORDS = {
+    "the", "of", "and", "to", "in", "a", "for", "on", "is", "are", "was", "were", "by",
+    "with", "as", "at", "or", "an", "be", "this", "that", "from", "its", "it", "our", "we",
+}
+
+
+def tokenize(text: str) -> list:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+## Split one page into passages on line boundaries, each at most max_chars long
+def _page_passages(page: str, max_chars: int) -> list:
+    spans = []
+    start = 0
+    end = 0
+    for line in page.splitlines(keepends=True):
+        if end > start and end + len(line) - start > max_chars:
+            spans.append((start, end))
+            start = end
+        end += len(line)
+    if end > start:
+        spans.append((start, end))
+    return spans
+
+
+class DocumentIndex:
+    """
+    BM25 index over a document's passages.
+
+    Passages are stored as (page, start, end) offsets into the cached page text,
+    so the persisted index holds only postings and offsets, not a second copy
+    of the document.
+    """
+
+    def __init__(self, pages, vocabulary, indptr, doc_ids, term_freqs, doc_lengths, spans, section_ids, sections):
+        self.pages = pages
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.spans = spans
+        self.section_ids = section_ids
+        self.sections = sections
+
+        document_count = len(doc_lengths)
+        document_freqs = np.diff(indptr)
+        self.idf = np.log1p((document_count - document_freqs + 0.5) / (document_freqs + 0.5))
+        self.average_length = float(doc_lengths.mean()) if document_count else 0.0
+
+    @classmethod
+    def build(cls, pages: list, max_chars: int = RETRIEVAL_PASSAGE_CHARS) -> "DocumentIndex":
+        spans, section_ids, sections = [], [], ["general"]
+        postings = {}
+        doc_lengths = []
+
+        section = 0
+        for page_number, page in enumerate(pages):
+            opened = page_section(page)
+            if opened:
+                if opened not in sections:
+                    sections.append(opened)
+                section = sections.index(opened)
+
+            for start, end in _page_passages(page, max_chars):
+                tokens = tokenize(page[start:end])
+                if not tokens:
+                    continue
+                doc_id = len(spans)
+                spans.append((page_number, start, end))
+                section_ids.append(section)
+                doc_lengths.append(len(tokens))
+                for term, count in Counter(tokens).items():
+                    postings.setdefault(term, []).append((doc_id, count))
+
+        ## Flatten postings into CSR arrays, one row per term
+        terms = sorted(postings)
+        vocabulary = {term: row for row, term in enumerate(terms)}
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        for row, term in enumerate(terms):
+            indptr[row + 1] = indptr[row] + len(postings[term])
+        flat = [pair for term in terms for pair in postings[term]]
+        doc_ids = np.array([pair[0] for pair in flat], dtype=np.int32)
+        term_freqs = np.array([pair[1] for pair in flat], dtype=np.float32)
+
+        return cls(
+            pages, vocabulary, indptr, doc_ids, term_freqs,
+            np.array(doc_lengths, dtype=np.float32),
+            np.array(spans, dtype=np.int64).reshape(-1, 3),
+            np.array(section_ids, dtype=np.int16),
+            sections,
+        )
+
+    def save(self, path: str):
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            format=np.array(RETRIEVAL_INDEX_FORMAT),
+            terms=np.array(sorted(self.vocabulary, key=self.vocabulary.get)),
+            indptr=self.indptr,
+            doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs,
+            doc_lengths=self.doc_lengths,
+            spans=self.spans,
+            section_ids=self.section_ids,
+            sections=np.array(self.sections),
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        ## Write to a temp file first so concurrent readers never see a partial index
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, pages: list) -> "DocumentIndex":
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["format"]) != RETRIEVAL_INDEX_FORMAT:
+                raise ValueError(f"Stale retrieval index format in {path}")
+            terms = data["terms"].tolist()
+            return cls(
+                pages,
+                {term: row for row, term in enumerate(terms)},
+                data["indptr"], data["doc_ids"], data["term_freqs"], data["doc_lengths"],
+                data["spans"], data["section_ids"], data["sections"].tolist(),
+            )
+
+    def search(self, query: str, top_k: int = RETRIEVAL_TOP_K) -> list:
+        """
+        Return up to top_k passages ranked by BM25 score.
+
+        Each result is a dict with "score", "section", "page" (1-based) and "text".
+        """
+        rows = [self.vocabulary[term] for term in set(tokenize(query)) if term in self.vocabulary]
+        if not rows or not len(self.doc_lengths):
+            return []
+
+        scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / self.average_length)
+        for row in rows:
+            lo, hi = self.indptr[row], self.indptr[row + 1]
+            docs = self.doc_ids[lo:hi]
+            tf = self.term_freqs[lo:hi]
+            scores[docs] += self.idf[row] * tf * (BM25_K1 + 1) / (tf + length_norm[docs])
+
+        top_k = min(top_k, int(np.count_nonzero(scores)))
+        if top_k <= 0:
+            return []
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+
+        results = []
+        for doc_id in best:
+            page, start, end = (int(value) for value in self.spans[doc_id])
+            results.append({
+                "score": float(scores[doc_id]),
+                "section": self.sections[self.section_ids[doc_id]],
+                "page": page + 1,
+                "text": self.pages[page][start:end].strip(),
+            })
+        return results
+
+
+## In-memory LRU of loaded indexes, keyed by document sha256
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def index_path(digest: str) -> str:
+    return document_cache.artifact_path(digest, f"bm25v{RETRIEVAL_INDEX_FORMAT}.npz")
+
+
+def get_index(document: dict) -> DocumentIndex:
+    """
+    Return the retrieval index for a parsed document (a load_document entry).
+
+    Served from memory, then from the persisted file next to the cached parse;
+    built and persisted on first use.
+    """
+    digest = document["sha256"]
+    with _indexes_lock:
+        if digest in _indexes:
+            _indexes.move_to_end(digest)
+            return _indexes[digest]
+
+    path = index_path(digest)
+    try:
+        index = DocumentIndex.load(path, document["pages"])
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        index = DocumentIndex.build(document["pages"])
+        index.save(path)
+
+    with _indexes_lock:
+        _indexes[digest] = index
+        while len(_indexes) > RETRIEVAL_MEMORY_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def format_passages(results: list) -> str:
+    if not results:
+        return "No passages in the document match the query."
+    return "\n\n".join(
+        f"[{result['section']} p.{result['page']} score={result['score']:.2f}]\n{result['text']}"
+        for result in results
+    )
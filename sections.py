@@ -0,0 +1,69 @@
+## Section-Aware Chunking for Financial Document Analyzer
+## Splits parsed pages into chunks that never straddle major filing sections
+## (MD&A, financial statements, notes, risk factors) and stay under a size bound
+
+import os
+import re
+
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "24000"))
+
+## Section headings, checked in order against the start of each line
+SECTION_HEADINGS = [
+    ("risk_factors", r"(?:item\s*1a\.?\s*)?risk factors"),
+    ("mdna", r"(?:item\s*[27]\.?\s*)?management'?s discussion and analysis"),
+    ("notes", r"notes to (?:the )?(?:condensed )?(?:consolidated )?financial statements"),
+    ("statements", r"(?:item\s*8\.?\s*)?(?:condensed )?(?:consolidated )?(?:balance sheets?|statements? of (?:operations|income|cash flows|comprehensive income|financial position|(?:stockholders|shareholders)'? equity)|financial statements and supplementary data)"),
+    ("market_risk", r"(?:item\s*7a\.?\s*)?quantitative and qualitative disclosures about market risk"),
+]
+
+_HEADINGS = [(name, re.compile(rf"^\s*{pattern}\b", re.IGNORECASE | re.MULTILINE)) for name, pattern in SECTION_HEADINGS]
+
+
+## The section a page opens (or switches to), or None if it continues the previous one
+def page_section(page: str):
+    first = None
+    for name, pattern in _HEADINGS:
+        match = pattern.search(page)
+        if match and (first is None or match.start() < first[1]):
+            first = (name, match.start())
+    return first[0] if first else None
+
+
+def split_sections(pages: list, max_chars: int = CHUNK_MAX_CHARS) -> list:
+    """
+    Group consecutive pages into section-aware chunks.
+
+    Returns a list of dicts with "section", "start_page", "end_page" (1-based,
+    inclusive) and "text". Pages before the first recognized heading are
+    labelled "general". A single page longer than max_chars becomes its own chunk.
+    """
+    chunks = []
+    section = "general"
+    current = None
+
+    for number, page in enumerate(pages, start=1):
+        opened = page_section(page)
+        if opened and opened != section:
+            section = opened
+            current = None
+
+        if current is not None and current["size"] + len(page) > max_chars:
+            current = None
+
+        if current is None:
+            current = {"section": section, "start_page": number, "end_page": number, "parts": [], "size": 0}
+            chunks.append(current)
+
+        current["parts"].append(page)
+        current["size"] += len(page) + 1
+        current["end_page"] = number
+
+    return [
+        {
+            "section": chunk["section"],
+            "start_page": chunk["start_page"],
+            "end_page": chunk["end_page"],
+            "text": "\n".join(chunk["parts"]),
+        }
+        for chunk in chunks
+    ]
@@ -0,0 +1,321 @@
+## Financial Statement Pre-Extraction for Financial Document Analyzer
+## Pulls income statement, balance sheet and cash-flow line items out of document text
+## into a pandas table and computes the ratios the task prompts ask for, before any LLM call
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from analytics import compute_metrics, dated_periods, GROWTH_UNAVAILABLE
+
+## Canonical line items and the row labels that report them (matched at line start)
+LINE_ITEMS = {
+    # Income statement
+    "revenue": r"total revenues?|total net revenues?|net revenues?|revenues?|total net sales|net sales",
+    "cost_of_revenue": r"total cost of revenues?|cost of revenues?|cost of sales|cost of goods sold",
+    "gross_profit": r"total gross profit|gross profit",
+    "operating_income": r"income from operations|operating income|(?:income|loss) \(loss\) from operations",
+    "interest_expense": r"interest expense",
+    "net_income": r"net income attributable to (?:common )?(?:stockholders|shareholders)|net income|net earnings",
+    "eps_diluted": r"diluted (?:net income|earnings) per share|(?:net income|earnings) per share[^\d(]*diluted|diluted eps",
+    "shares_diluted": r"weighted[- ]average (?:common )?shares(?: outstanding)?[^\d(]*diluted|diluted weighted[- ]average shares",
+    # Balance sheet
+    "cash": r"cash and cash equivalents",
+    "inventory": r"inventor(?:y|ies)",
+    "total_current_assets": r"total current assets",
+    "total_assets": r"total assets",
+    "total_current_liabilities": r"total current liabilities",
+    "total_liabilities": r"total liabilities(?! and)",
+    "total_debt": r"total debt|long-term debt(?: and finance leases)?(?:, net of current portion)?",
+    "total_equity": r"total (?:stockholders'?|shareholders'?) equity|total equity",
+    # Cash-flow statement
+    "operating_cash_flow": r"net cash provided by (?:\(used in\) )?operating activities|cash flows? from operating activities|operating cash flow",
+    "capital_expenditures": r"capital expenditures|purchases? of property(?:,)? (?:plant )?and equipment",
+}
+
+## Per-share and share-count rows are tried first so "net income per share" is not read as net income
+_MATCH_ORDER = ["eps_diluted", "shares_diluted"] + [item for item in LINE_ITEMS if item not in ("eps_diluted", "shares_diluted")]
+
+_LINE_ITEM_PATTERNS = [
+    (item, re.compile(rf"^\s*(?:{LINE_ITEMS[item]})\b[^\d(\-—–$]*(?P<values>.*)$", re.IGNORECASE))
+    for item in _MATCH_ORDER
+]
+
+## Numeric cell: $1,234.5 / (1,234) / -12.3 / — (em dash means zero)
+_NUMBER = re.compile(r"\(?-?\$?\s?\d[\d,]*(?:\.\d+)?\)?%?|(?<!\w)[—–-](?!\w)")
+_PERIOD = re.compile(r"\b(?:Q([1-4])[-\s]?((?:19|20)\d{2})|FY\s?((?:19|20)\d{2})|((?:19|20)\d{2}))\b", re.IGNORECASE)
+## Day of a header date ("December 31, 2024", "December 31 2024", "31 Dec 2024"), which is not a value
+_MONTH = r"(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.?"
+_DAY_OF_MONTH = re.compile(rf"\b{_MONTH}\s+\d{{1,2}}\b,?|\b\d{{1,2}}\s+{_MONTH}(?!\w)|\b\d{{1,2}},", re.IGNORECASE)
+_UNITS = re.compile(r"\((?:[^)]*\b)?in (thousands|millions|billions)\b", re.IGNORECASE)
+
+## Footnote markers such as "(1)" are not values
+_FOOTNOTE = re.compile(r"^\(\d\)$")
+
+
+## Parse one numeric cell; parentheses and leading minus mean negative
+def _parse_number(token: str) -> float:
+    token = token.strip()
+    if token in ("—", "–", "-"):
+        return 0.0
+    negative = token.startswith("(") and token.endswith(")") or token.startswith("-")
+    digits = re.sub(r"[^\d.]", "", token)
+    if not digits or digits == ".":
+        return np.nan
+    value = float(digits)
+    return -value if negative else value
+
+
+def _parse_values(text: str) -> list:
+    tokens = [t for t in _NUMBER.findall(text) if not _FOOTNOTE.match(t.strip()) and not t.endswith("%")]
+    return [_parse_number(t) for t in tokens]
+
+
+## Period labels found on a table header line, e.g. "Q1-2025 Q2-2025", "FY2024" or "2024 2023"
+def _parse_periods(line: str) -> list:
+    periods = []
+    for quarter, q_year, fy_year, year in _PERIOD.findall(line):
+        if quarter:
+            periods.append(f"Q{quarter}-{q_year}")
+        else:
+            periods.append(f"FY{fy_year}" if fy_year else year)
+    return periods
+
+
+## Chronological sort key for period labels; unknown labels keep document order
+def _period_key(label: str):
+    match = re.match(r"(?:Q([1-4])-|FY)?(\d{4})$", label)
+    if not match:
+        return (1, 0, 0)
+    return (0, int(match.group(2)), int(match.group(1) or 5))
+
+
+## Parse a spreadsheet or XBRL cell; plain floats first, so exponent notation survives
+def parse_cell(token: str) -> float:
+    token = str(token).strip()
+    try:
+        return float(token.replace(",", ""))
+    except ValueError:
+        return _parse_number(token)
+
+
+def parse_periods(text: str) -> list:
+    """Period labels ("Q2-2025", "FY2024", "2024") in a header line or cell"""
+    return _parse_periods(text)
+
+
+def line_item_for_label(label: str) -> str:
+    """The canonical line item (see LINE_ITEMS) a row label reports, or None"""
+    for item, pattern in _LINE_ITEM_PATTERNS:
+        if pattern.match(label):
+            return item
+    return None
+
+
+def detect_units(text: str) -> str:
+    """Return the reporting unit declared in the document ('millions', ...), or '' if none"""
+    match = _UNITS.search(text)
+    return match.group(1).lower() if match else ""
+
+
+def extract_statements(text: str) -> pd.DataFrame:
+    """
+    Extract financial statement line items into a DataFrame.
+
+    Rows are canonical line items (see LINE_ITEMS), columns are reporting
+    periods sorted chronologically. Values come from the first row label match
+    with the most numeric cells; tables without a recognizable period header
+    get positional labels P1..Pn.
+    """
+    periods = []
+    best = {}
+
+    for line in text.split("\n"):
+        for item, pattern in _LINE_ITEM_PATTERNS:
+            match = pattern.match(line)
+            if not match:
+                continue
+            values = _parse_values(match.group("values"))
+            if values and len(values) > len(best.get(item, {})):
+                labels = periods[-len(values):] if len(periods) >= len(values) else [f"P{i + 1}" for i in range(len(values))]
+                best[item] = dict(zip(labels, values))
+            break
+        else:
+            ## Not a line item: a row of period labels starts a new table
+            header = _parse_periods(line)
+            if len(header) >= 2 and not _parse_values(_DAY_OF_MONTH.sub("", _PERIOD.sub("", line))):
+                periods = header
+
+    if not best:
+        return pd.DataFrame(dtype=float)
+
+    frame = pd.DataFrame.from_dict(best, orient="index", dtype=float)
+    frame = frame.reindex([item for item in LINE_ITEMS if item in best])
+    return frame[sorted(frame.columns, key=_period_key)]
+
+
+## Structured statements: exact figures from XBRL facts or spreadsheet tables, stored with the
+## parsed document as {"units": "millions", "items": {item: {period: value}}} (see parsers.py)
+
+## Rendered statement layout; every label matches its own LINE_ITEMS pattern, so the rendered
+## text also reads back through extract_statements
+STATEMENT_SECTIONS = [
+    ("Consolidated Statements of Operations", [
+        ("revenue", "Total revenues"),
+        ("cost_of_revenue", "Cost of revenues"),
+        ("gross_profit", "Gross profit"),
+        ("operating_income", "Operating income"),
+        ("interest_expense", "Interest expense"),
+        ("net_income", "Net income"),
+        ("eps_diluted", "Diluted earnings per share"),
+        ("shares_diluted", "Diluted weighted-average shares"),
+    ]),
+    ("Consolidated Balance Sheets", [
+        ("cash", "Cash and cash equivalents"),
+        ("inventory", "Inventories"),
+        ("total_current_assets", "Total current assets"),
+        ("total_assets", "Total assets"),
+        ("total_current_liabilities", "Total current liabilities"),
+        ("total_liabilities", "Total liabilities"),
+        ("total_debt", "Total debt"),
+        ("total_equity", "Total stockholders' equity"),
+    ]),
+    ("Consolidated Statements of Cash Flows", [
+        ("operating_cash_flow", "Net cash provided by operating activities"),
+        ("capital_expenditures", "Capital expenditures"),
+    ]),
+]
+
+
+def structured_frame(structured: dict) -> pd.DataFrame:
+    """Structured statements as an extract_statements-style frame (line items x sorted periods)"""
+    items = structured.get("items") or {}
+    if not items:
+        return pd.DataFrame(dtype=float)
+    frame = pd.DataFrame.from_dict(items, orient="index", dtype=float)
+    frame = frame.reindex([item for item in LINE_ITEMS if item in items])
+    return frame[sorted(frame.columns, key=_period_key)]
+
+
+def document_statements(text: str, structured: dict = None):
+    """
+    (statements frame, units) of a document: its structured statements when
+    it has them (XBRL, spreadsheets), otherwise extracted from its text.
+    """
+    if structured and structured.get("items"):
+        return structured_frame(structured), structured.get("units") or ""
+    return extract_statements(text), detect_units(text)
+
+
+## Exact cell formatting for rendered statements: 1234567 -> 1,234,567 / -12.5 -> (12.5)
+def _format_exact(value) -> str:
+    if pd.isna(value):
+        return "n/a"
+    magnitude = abs(value)
+    cell = f"{int(magnitude):,}" if float(magnitude).is_integer() else f"{magnitude:,}"
+    return f"({cell})" if value < 0 else cell
+
+
+def render_statements(structured: dict) -> str:
+    """Render structured statements as statement tables for prompts, search and screening"""
+    frame = structured_frame(structured)
+    if frame.empty:
+        return ""
+    units = structured.get("units")
+    scope = f"in {units}, except per-share amounts" if units else "as reported"
+    header = "Line item  " + "  ".join(frame.columns)
+    blocks = []
+    for title, rows in STATEMENT_SECTIONS:
+        lines = [
+            f"{label}  " + "  ".join(_format_exact(value) for value in frame.loc[item])
+            for item, label in rows if item in frame.index
+        ]
+        if lines:
+            blocks.append("\n".join([f"{title} ({scope})", header] + lines))
+    return "\n\n".join(blocks)
+
+
+def _grid_items(rows: list) -> dict:
+    periods = {}
+    best = {}
+    for row in rows:
+        cells = [str(cell).strip() for cell in row]
+        labelled = [(column, cell) for column, cell in enumerate(cells) if cell]
+        if not labelled:
+            continue
+        item = line_item_for_label(labelled[0][1])
+        if item is None:
+            ## A row whose other cells are all single period labels starts a new table; the
+            ## label cell may be blank, so the first cell counts when it is a period itself
+            header = {column: parse_periods(cell) for column, cell in labelled}
+            if len(header[labelled[0][0]]) != 1:
+                del header[labelled[0][0]]
+            if header and all(len(labels) == 1 for labels in header.values()):
+                periods = {column: labels[0] for column, labels in header.items()}
+            continue
+        values = {}
+        for column, period in periods.items():
+            if column < len(cells) and cells[column]:
+                value = parse_cell(cells[column])
+                if not np.isnan(value):
+                    values[period] = value
+        if len(values) > len(best.get(item, {})):
+            best[item] = values
+    return best
+
+
+def statements_from_grid(rows: list) -> dict:
+    """
+    Line items of a spreadsheet table (rows of cell strings).
+
+    Row labels are read from the first non-empty cell and periods from the
+    latest header row; a table with periods down its first column and line
+    items across is read transposed. Returns {"items": {item: {period: value}}}.
+    """
+    width = max((len(row) for row in rows), default=0)
+    padded = [list(row) + [""] * (width - len(row)) for row in rows]
+    items = max((_grid_items(padded), _grid_items(list(zip(*padded)))), key=lambda found: sum(map(len, found.values())))
+    return {"items": items}
+
+
+## Compact number formatting for prompts: 1234567 -> 1,234,567 / 0.1234 -> 0.123
+def _format_cell(value) -> str:
+    if isinstance(value, str):
+        return value
+    if pd.isna(value):
+        return "n/a"
+    if abs(value) >= 100:
+        return f"{value:,.0f}"
+    return f"{value:,.3g}" if abs(value) < 1 else f"{value:,.2f}"
+
+
+def format_table(frame: pd.DataFrame) -> str:
+    """Render a metrics/periods frame as a compact pipe-separated table for prompts"""
+    header = "item | " + " | ".join(frame.columns)
+    rows = [f"{name} | " + " | ".join(_format_cell(v) for v in values) for name, values in zip(frame.index, frame.to_numpy())]
+    return "\n".join([header] + rows)
+
+
+def build_financial_summary(text: str, structured: dict = None) -> str:
+    """
+    Build the compact structured summary passed to the agents instead of the raw document.
+
+    Uses the document's structured statements when given. Returns a short
+    notice when no statement tables could be recognized, so the agents know to
+    fall back to read_data_tool.
+    """
+    statements, units = document_statements(text, structured)
+    if statements.empty:
+        return "No financial statement tables could be extracted automatically; use read_data_tool to read the document."
+
+    ratios = compute_metrics(statements).dropna(how="all")
+    parts = [
+        f"Reported line items ({units or 'units as reported'}):",
+        format_table(statements),
+    ]
+    if not ratios.empty:
+        parts += ["", "Computed metrics (margins, returns and growth as fractions):", format_table(ratios)]
+    if not dated_periods(statements.columns):
+        parts += ["", GROWTH_UNAVAILABLE]
+    return "\n".join(parts)
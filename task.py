@@ -1,15 +1,16 @@
 ## Importing libraries and files
 from crewai import Task
 
-from agents import financial_analyst, verifier
-from tools import search_tool, FinancialDocumentTool
+from agents import financial_analyst, verifier, investment_advisor, risk_assessor
+from tools import FinancialDocumentTool, InvestmentTool, RiskTool
 
 ## Creating a task to help solve user's query
 analyze_financial_document = Task(
     description=(
         "Thoroughly analyze the uploaded financial document to answer the user's query: {query}\n"
+        "Pre-extracted financial data from the document:\n{financial_summary}\n"
         "Steps to follow:\n"
-        "1. Use the read_data_tool to load the full content of the financial document from path: {file_path}\n"
+        "1. Start from the pre-extracted data above. For narrative context or figures missing from it, use the search_document_tool on path {file_path} with a focused query (e.g. \"debt maturity schedule\"); use read_data_tool only if search cannot find what you need.\n"
         "2. Identify the type of financial report (e.g., annual report, quarterly earnings, balance sheet).\n"
         "3. Extract and summarize key financial metrics relevant to the query (revenue, profit margins, EPS, debt ratios, cash flow, etc.).\n"
         "4. Search for relevant market context or industry benchmarks using the search tool if needed.\n"
@@ -26,7 +27,7 @@ analyze_financial_document = Task(
         "- Clear conclusions with confidence levels and data limitations noted"
     ),
     agent=financial_analyst,
-    tools=[FinancialDocumentTool.read_data_tool],
+    tools=[FinancialDocumentTool.search_document_tool, FinancialDocumentTool.read_data_tool],
     async_execution=False,
 )
 
@@ -34,8 +35,10 @@ analyze_financial_document = Task(
 investment_analysis = Task(
     description=(
         "Based on the financial document at {file_path}, provide objective investment analysis to address: {query}\n"
+        "Pre-extracted financial data from the document:\n{financial_summary}\n"
         "Steps to follow:\n"
-        "1. Review key financial ratios: P/E, P/B, ROE, ROA, debt-to-equity, current ratio, free cash flow yield.\n"
+        "1. Review key financial ratios: P/E, P/B, ROE, ROA, debt-to-equity, current ratio, free cash flow yield. "
+        "Use the Analyze Investment Data tool on path {file_path} for computed per-period metrics.\n"
         "2. Assess revenue growth trajectory and profitability trends.\n"
         "3. Compare key metrics against industry averages using search if needed.\n"
         "4. Identify potential catalysts and headwinds based on the data.\n"
@@ -51,8 +54,8 @@ investment_analysis = Task(
         "- Balanced investment outlook with clear data support\n"
         "- Disclaimer noting this is informational analysis, not personalized financial advice"
     ),
-    agent=financial_analyst,
-    tools=[FinancialDocumentTool.read_data_tool],
+    agent=investment_advisor,
+    tools=[FinancialDocumentTool.search_document_tool, FinancialDocumentTool.read_data_tool, InvestmentTool.analyze_investment_tool],
     async_execution=False,
 )
 
@@ -60,13 +63,15 @@ investment_analysis = Task(
 risk_assessment = Task(
     description=(
         "Conduct a thorough risk assessment based on the uploaded financial document at {file_path} for query: {query}\n"
+        "Pre-extracted financial data from the document:\n{financial_summary}\n"
         "Steps to follow:\n"
         "1. Analyze liquidity risk: current ratio, quick ratio, cash reserves vs. short-term obligations.\n"
         "2. Assess leverage risk: debt-to-equity ratio, interest coverage ratio, debt maturity schedule.\n"
         "3. Evaluate operational risk: revenue concentration, margin trends, cost structure stability.\n"
         "4. Identify market/macro risks mentioned or implied in the document.\n"
         "5. Search for industry-specific risk factors using the search tool.\n"
-        "6. Rate each risk category (Low/Medium/High) with supporting data."
+        "6. Rate each risk category (Low/Medium/High) with supporting data. "
+        "Use the Create Risk Assessment tool on path {file_path} for computed metrics and baseline bands."
     ),
     expected_output=(
         "A structured risk assessment report including:\n"
@@ -77,16 +82,17 @@ risk_assessment = Task(
         "- Overall risk rating per category (Low/Medium/High) with data justification\n"
         "- Risk mitigation considerations where applicable"
     ),
-    agent=financial_analyst,
-    tools=[FinancialDocumentTool.read_data_tool],
+    agent=risk_assessor,
+    tools=[FinancialDocumentTool.search_document_tool, FinancialDocumentTool.read_data_tool, RiskTool.create_risk_assessment_tool],
     async_execution=False,
 )
 
 verification = Task(
     description=(
         "Verify whether the uploaded document is a legitimate financial document before analysis.\n"
+        "Pre-extracted financial data from the document:\n{financial_summary}\n"
         "Steps to follow:\n"
-        "1. Use read_data_tool to load the document content from path: {file_path}\n"
+        "1. Review the pre-extracted data above; use search_document_tool on path {file_path} to look up specific sections if it is insufficient to reach a verdict.\n"
         "2. Check for the presence of financial sections: income statement, balance sheet, cash flow statement, or equivalent.\n"
         "3. Verify presence of numerical financial data, dates, and company identifiers.\n"
         "4. Confirm the document format is consistent with standard financial reporting (e.g., 10-K, 10-Q, earnings release).\n"
@@ -101,6 +107,69 @@ verification = Task(
         "- Clear PASS or FAIL verdict with reasoning"
     ),
     agent=verifier,
-    tools=[FinancialDocumentTool.read_data_tool],
+    tools=[FinancialDocumentTool.search_document_tool, FinancialDocumentTool.read_data_tool],
     async_execution=False
 )
+
+## Creating a single-pass task that verifies and analyzes in one LLM round-trip
+## Used for documents the local pre-verifier already scored as clearly financial
+verify_and_analyze = Task(
+    description=(
+        "The uploaded document at {file_path} has been pre-screened locally as a financial document. "
+        "Confirm that verdict and analyze it to answer the user's query: {query}\n"
+        "Pre-extracted financial data from the document:\n{financial_summary}\n"
+        "Steps to follow:\n"
+        "1. Start from the pre-extracted data above. For narrative context or figures missing from it, use the search_document_tool on path {file_path} with a focused query (e.g. \"debt maturity schedule\"); use read_data_tool only if search cannot find what you need.\n"
+        "2. Confirm the document type (e.g., 10-K, 10-Q, earnings release) and list the financial sections present. "
+        "If it is not a financial document after all, say so with a FAIL verdict and stop.\n"
+        "3. Extract and summarize key financial metrics relevant to the query (revenue, profit margins, EPS, debt ratios, cash flow, etc.).\n"
+        "4. Search for relevant market context or industry benchmarks using the search tool if needed.\n"
+        "5. Provide a structured, data-backed analysis addressing the user's specific query.\n"
+        "6. Clearly distinguish between document facts and any external market context."
+    ),
+    expected_output=(
+        "A verification verdict followed by a comprehensive financial analysis report:\n"
+        "- PASS or FAIL verdict with the confirmed document type and sections found\n"
+        "- Executive summary directly addressing the user's query\n"
+        "- Key financial metrics and ratios extracted from the document\n"
+        "- Year-over-year or quarter-over-quarter trends (if data available)\n"
+        "- Strengths and weaknesses identified from the financials\n"
+        "- Relevant market context with cited sources\n"
+        "- Clear conclusions with confidence levels and data limitations noted"
+    ),
+    agent=financial_analyst,
+    tools=[FinancialDocumentTool.search_document_tool, FinancialDocumentTool.read_data_tool],
+    async_execution=False,
+)
+
+## Creating the reduce step of the map-reduce mode for very large filings
+## {chunk_findings} holds the per-section findings produced in parallel by mapreduce.map_chunks
+reduce_chunk_findings = Task(
+    description=(
+        "The uploaded document at {file_path} is too large to read in one pass, so it was split into "
+        "section-aware chunks (MD&A, financial statements, notes, risk factors) and relevant findings were "
+        "extracted from each chunk. Combine them into one report answering the user's query: {query}\n"
+        "Pre-extracted financial data from the document:\n{financial_summary}\n"
+        "Findings per section, labelled with page ranges:\n{chunk_findings}\n"
+        "Steps to follow:\n"
+        "1. Confirm from the data and findings above that this is a financial document. "
+        "If it is not, say so with a FAIL verdict and stop.\n"
+        "2. Reconcile the section findings with the pre-extracted data; prefer the pre-extracted figures when they conflict and note the conflict.\n"
+        "3. Extract and summarize key financial metrics relevant to the query (revenue, profit margins, EPS, debt ratios, cash flow, etc.).\n"
+        "4. Use the search_document_tool on path {file_path} to check any figure or passage the findings leave ambiguous.\n"
+        "5. Provide a structured, data-backed analysis addressing the user's specific query, citing page ranges.\n"
+        "6. Clearly distinguish between document facts and any external market context."
+    ),
+    expected_output=(
+        "A verification verdict followed by a comprehensive financial analysis report:\n"
+        "- PASS or FAIL verdict with the confirmed document type and sections found\n"
+        "- Executive summary directly addressing the user's query\n"
+        "- Key financial metrics and ratios extracted from the document, with page references\n"
+        "- Year-over-year or quarter-over-quarter trends (if data available)\n"
+        "- Material risks and management commentary from the relevant sections\n"
+        "- Clear conclusions with confidence levels and data limitations noted"
+    ),
+    agent=financial_analyst,
+    tools=[FinancialDocumentTool.search_document_tool],
+    async_execution=False,
+)
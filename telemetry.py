@@ -0,0 +1,278 @@
+## Tracing and Metrics for Financial Document Analyzer
+## Spans time each pipeline stage into Prometheus histograms (served on /metrics) and into
+## a per-analysis trace that is stored with the AnalysisResult row
+
+import os
+import re
+import time
+import threading
+import contextlib
+import contextvars
+import functools
+
+from prometheus_client import (
+    Counter, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST,
+    generate_latest, start_http_server, multiprocess
+)
+
+## Set in every API and worker process (before start) to aggregate metrics across
+## processes, e.g. Celery prefork children or several uvicorn workers
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+## Stages run from milliseconds (cache lookups) to minutes (agent runs on large filings)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+QUEUE_WAIT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+STAGE_SECONDS = Histogram(
+    "analyzer_stage_seconds", "Time spent in each pipeline stage", ["stage"], buckets=STAGE_BUCKETS
+)
+LLM_CALL_SECONDS = Histogram(
+    "analyzer_llm_call_seconds", "LLM call latency by agent; cached calls were served by the response cache",
+    ["agent", "cached"], buckets=STAGE_BUCKETS
+)
+LLM_TOKENS = Counter("analyzer_llm_tokens", "LLM tokens used by agent", ["agent", "kind"])
+QUEUE_WAIT_SECONDS = Histogram(
+    "analyzer_queue_wait_seconds", "Time from Celery enqueue (or retry ETA) to task start", ["queue"],
+    buckets=QUEUE_WAIT_BUCKETS
+)
+TASK_RETRIES = Counter("analyzer_task_retries", "Celery task retries scheduled", ["task"])
+INTENT_ROUTES = Counter("analyzer_intent_routes", "Auto-mode analyses by query intent tier and the mode they ran", ["tier", "mode"])
+INTENT_SAVED_SECONDS = Counter(
+    "analyzer_intent_saved_seconds", "Estimated latency saved by answering simple queries without a crew"
+)
+CHECKPOINT_RESUMES = Counter("analyzer_checkpoint_resumes", "Stages restored from a checkpoint instead of rerun", ["stage"])
+
+## LLM calls outside any agent execution or agent_scope
+UNATTRIBUTED = "unattributed"
+
+
+def agent_label(role: str) -> str:
+    """Metric label for an agent role: "Senior Financial Analyst" -> "senior_financial_analyst" """
+    return re.sub(r"[^a-z0-9]+", "_", role.lower()).strip("_") or UNATTRIBUTED
+
+
+class Trace:
+    """
+    Stage timings, LLM usage and queueing of one analysis attempt.
+
+    Spans nest (an agent span contains its tool and LLM time), so stage seconds
+    are not additive. Safe to share between the threads of one analysis.
+    """
+
+    def __init__(self, queue_wait_seconds: float = None, attempt: int = 1):
+        self.queue_wait_seconds = queue_wait_seconds
+        self.attempt = attempt
+        self.route = None
+        self.resumed = []
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.llm = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+
+    def add_llm_call(self, agent: str, seconds: float, prompt_tokens: int, completion_tokens: int, cached: bool):
+        with self._lock:
+            entry = self.llm.setdefault(agent, {
+                "calls": 0, "cached_calls": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0
+            })
+            entry["calls"] += 1
+            entry["cached_calls"] += cached
+            entry["seconds"] += seconds
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "attempt": self.attempt,
+                "queue_wait_seconds": round(self.queue_wait_seconds, 4) if self.queue_wait_seconds is not None else None,
+                "total_seconds": round(time.perf_counter() - self.started, 4),
+                "route": self.route,
+                "resumed": list(self.resumed),
+                "stages": {
+                    stage: {"count": entry["count"], "seconds": round(entry["seconds"], 4)}
+                    for stage, entry in self.stages.items()
+                },
+                "llm": {
+                    agent: {**entry, "seconds": round(entry["seconds"], 4)}
+                    for agent, entry in self.llm.items()
+                },
+            }
+
+
+_trace = contextvars.ContextVar("telemetry_trace", default=None)
+## (agent label, perf_counter at agent start) of the agent executing in this context
+_agent = contextvars.ContextVar("telemetry_agent", default=None)
+
+
+@contextlib.contextmanager
+def trace_scope(trace: Trace = None):
+    """
+    Record spans and LLM usage in this context into `trace` (a new one if None).
+
+    Threads do not inherit the scope: code fanning work out to a pool enters
+    the same trace again inside each worker (see mapreduce.map_chunks).
+    """
+    trace = trace if trace is not None else Trace()
+    trace_token = _trace.set(trace)
+    agent_token = _agent.set(None)
+    try:
+        yield trace
+    finally:
+        _agent.reset(agent_token)
+        _trace.reset(trace_token)
+
+
+def current_trace() -> Trace:
+    return _trace.get()
+
+
+def observe_stage(stage: str, seconds: float, trace: Trace = None):
+    """Record a finished stage in the histogram and in `trace` (default: the current one)"""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    trace = trace if trace is not None else _trace.get()
+    if trace is not None:
+        trace.add_stage(stage, seconds)
+
+
+@contextlib.contextmanager
+def span(stage: str, trace: Trace = None):
+    """Time the enclosed block as `stage`; failures are timed too"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started, trace)
+
+
+def timed(stage: str):
+    """Decorator form of span()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+## Agent attribution: crews.py feeds crewai's agent execution events into agent_started
+## and agent_finished; direct LLM calls (map-reduce) use agent_scope
+def agent_started(role: str):
+    label = agent_label(role)
+    current = _agent.get()
+    ## crewai re-enters execute_task on an agent retry; the span runs from the first start
+    if current is None or current[0] != label:
+        _agent.set((label, time.perf_counter()))
+
+
+def agent_finished(role: str):
+    label = agent_label(role)
+    current = _agent.get()
+    if current is not None and current[0] == label:
+        _agent.set(None)
+        observe_stage(f"agent.{label}", time.perf_counter() - current[1])
+
+
+@contextlib.contextmanager
+def agent_scope(role: str):
+    """Attribute LLM calls in the enclosed block to `role` (without an agent span)"""
+    token = _agent.set((agent_label(role), time.perf_counter()))
+    try:
+        yield
+    finally:
+        _agent.reset(token)
+
+
+def current_agent() -> str:
+    current = _agent.get()
+    return current[0] if current else UNATTRIBUTED
+
+
+class UsageRecorder:
+    """
+    Per-call LLM callback capturing token usage.
+
+    crewai.LLM hands usage to every callback with a log_success_event method,
+    for streaming and non-streaming calls alike. Deliberately not a litellm
+    CustomLogger, so litellm itself never invokes it a second time.
+    """
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        usage = response_obj.get("usage") if isinstance(response_obj, dict) else None
+        if usage is None:
+            return
+        if isinstance(usage, dict):
+            self.prompt_tokens += usage.get("prompt_tokens") or 0
+            self.completion_tokens += usage.get("completion_tokens") or 0
+        else:
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+
+def record_llm_call(seconds: float, prompt_tokens: int = 0, completion_tokens: int = 0, cached: bool = False):
+    """Record one LLM call for the agent executing in this context"""
+    agent = current_agent()
+    LLM_CALL_SECONDS.labels(agent, "true" if cached else "false").observe(seconds)
+    if prompt_tokens:
+        LLM_TOKENS.labels(agent, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(agent, "completion").inc(completion_tokens)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_llm_call(agent, seconds, prompt_tokens, completion_tokens, cached)
+
+
+def record_queue_wait(queue: str, seconds: float):
+    QUEUE_WAIT_SECONDS.labels(queue or "unknown").observe(max(seconds, 0.0))
+
+
+def record_retry(task_name: str):
+    TASK_RETRIES.labels(task_name).inc()
+
+
+def record_resume(stage: str):
+    """Record a stage restored from a checkpoint; per-chunk stages (map:3) count under their prefix"""
+    CHECKPOINT_RESUMES.labels(stage.split(":")[0]).inc()
+    trace = _trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.resumed.append(stage)
+
+
+def record_route(tier: str, mode: str, saved_seconds: float = None):
+    """Record an intent routing decision (see intent.record_route) in the metrics and the current trace"""
+    INTENT_ROUTES.labels(tier, mode).inc()
+    if saved_seconds:
+        INTENT_SAVED_SECONDS.inc(saved_seconds)
+    trace = _trace.get()
+    if trace is not None:
+        trace.route = {"tier": tier, "mode": mode}
+
+
+def _registry():
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics():
+    """(body, content type) of the Prometheus text exposition for this process or, in
+    multiprocess mode, every process sharing PROMETHEUS_MULTIPROC_DIR"""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int):
+    """Serve /metrics on a separate port (for processes without an HTTP API, i.e. workers)"""
+    start_http_server(port, registry=_registry())
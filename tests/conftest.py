@@ -0,0 +1,62 @@
+## Shared test setup: a throwaway SQLite database and cache locations, set before any app
+## module reads its environment, and an in-process API client with the crew stubbed out
+
+import os
+import tempfile
+
+_TEST_DIR = tempfile.mkdtemp(prefix="financial-analyzer-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TEST_DIR}/analyses.db"
+os.environ["DOC_CACHE_DIR"] = os.path.join(_TEST_DIR, "cache")
+os.environ["LLM_CACHE_PATH"] = os.path.join(_TEST_DIR, "llm_cache.sqlite")
+
+import pytest
+
+
+@pytest.fixture
+def db():
+    """A session on a freshly emptied database"""
+    import database
+
+    database.init_db()
+    session = database.SessionLocal()
+    for model in (database.AnalysisResult, database.AnalysisReport, database.AnalysisCheckpoint):
+        session.query(model).delete()
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+class FakeCrews:
+    """Stands in for crews.py: every analysis returns a canned report and is recorded"""
+
+    CREW_MODE = "auto"
+    CREW_MODES = ("auto", "sequential", "merged", "mapreduce", "lookup", "full")
+
+    def __init__(self):
+        self.calls = []
+
+    async def run(self, query: str, file_path: str, document_hash: str = None, mode: str = None, **kwargs):
+        self.calls.append({"query": query, "mode": mode, "document_hash": document_hash})
+        return f"Report for: {query}"
+
+
+@pytest.fixture
+def crews(monkeypatch):
+    import main
+
+    fake = FakeCrews()
+    monkeypatch.setattr(main, "crew_stack", lambda: fake)
+    monkeypatch.setattr(main, "run_crew_async", fake.run)
+    return fake
+
+
+@pytest.fixture
+def client(db, crews, monkeypatch, tmp_path):
+    """API client running the app in-process; uploads are written under tmp_path"""
+    from starlette.testclient import TestClient
+    import main
+
+    monkeypatch.chdir(tmp_path)
+    return TestClient(main.app)
@@ -0,0 +1,73 @@
+## Tests for the keyset-paginated /analyses listing (main.py, database.py)
+
+import datetime
+
+import pytest
+
+from database import AnalysisResult, save_analysis, get_all_analyses
+
+
+@pytest.fixture
+def analyses(db):
+    """25 analyses, several sharing a created_at, every third one failed; newest first"""
+    start = datetime.datetime(2026, 1, 1)
+    rows = []
+    for i in range(25):
+        analysis = save_analysis(db, filename=f"doc-{i}.pdf", query="q")
+        analysis.created_at = start + datetime.timedelta(minutes=i // 3)
+        analysis.status = "failed" if i % 3 == 0 else "success"
+        rows.append(analysis)
+    db.commit()
+    return sorted(rows, key=lambda a: (a.created_at, a.id), reverse=True)
+
+
+def _pages(client, **params) -> list:
+    pages, cursor = [], None
+    while True:
+        body = client.get("/analyses", params={**params, **({"cursor": cursor} if cursor else {})}).json()
+        pages.append([row["analysis_id"] for row in body["analyses"]])
+        assert body["total"] == len(body["analyses"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_every_analysis_once_in_order(client, analyses):
+    pages = _pages(client, limit=4)
+    assert [len(page) for page in pages] == [4] * 6 + [1]
+    assert [analysis_id for page in pages for analysis_id in page] == [a.id for a in analyses]
+
+
+def test_status_filter(client, analyses):
+    pages = _pages(client, limit=5, status="failed")
+    assert [analysis_id for page in pages for analysis_id in page] == [a.id for a in analyses if a.status == "failed"]
+
+
+def test_rows_added_while_paging_do_not_shift_later_pages(client, db, analyses):
+    first = client.get("/analyses", params={"limit": 5}).json()
+    newer = save_analysis(db, filename="new.pdf", query="q")
+    second = client.get("/analyses", params={"limit": 5, "cursor": first["next_cursor"]}).json()
+    assert [row["analysis_id"] for row in second["analyses"]] == [a.id for a in analyses[5:10]]
+    assert newer.id not in [row["analysis_id"] for row in second["analyses"]]
+
+
+def test_limit_is_clamped(client, analyses, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "ANALYSES_PAGE_MAX", 10)
+    assert len(client.get("/analyses", params={"limit": 500}).json()["analyses"]) == 10
+    assert len(client.get("/analyses", params={"limit": 0}).json()["analyses"]) == 1
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bm8tc2VwYXJhdG9y", "/w=="])
+def test_invalid_cursor(client, cursor):
+    response = client.get("/analyses", params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor."}
+
+
+def test_listing_does_not_load_reports(db, analyses):
+    db.expunge_all()
+    rows = get_all_analyses(db, limit=3)
+    assert all("result" not in row.__dict__ for row in rows)
+    assert isinstance(rows[0], AnalysisResult)
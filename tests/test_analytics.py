@@ -0,0 +1,90 @@
+## Tests for the metrics engine (analytics.py)
+
+import numpy as np
+import pandas as pd
+
+from analytics import compute_metrics, risk_bands, category_ratings, latest_values
+from statements import build_financial_summary
+
+
+def _statements(rows: dict, columns: list) -> pd.DataFrame:
+    return pd.DataFrame.from_dict(rows, orient="index", columns=columns, dtype=float)
+
+
+def test_ratios_for_every_period():
+    statements = _statements({
+        "revenue": [1000, 1200],
+        "net_income": [100, 150],
+        "total_current_assets": [400, 600],
+        "total_current_liabilities": [200, 300],
+        "total_debt": [500, 450],
+        "total_equity": [1000, 900],
+    }, ["FY2023", "FY2024"])
+    metrics = compute_metrics(statements)
+    assert metrics.loc["net_margin"].tolist() == [0.1, 0.125]
+    assert metrics.loc["current_ratio"].tolist() == [2.0, 2.0]
+    assert metrics.loc["debt_to_equity"].tolist() == [0.5, 0.5]
+    assert np.isnan(metrics.loc["revenue_growth", "FY2023"])
+    assert metrics.loc["revenue_growth", "FY2024"] == 0.2
+
+
+def test_growth_compares_periods_of_the_same_frequency():
+    statements = _statements({"revenue": [100, 120, 110]}, ["FY2024", "Q1-2025", "Q2-2025"])
+    growth = compute_metrics(statements).loc["revenue_growth"]
+    assert np.isnan(growth["FY2024"]) and np.isnan(growth["Q1-2025"])
+    assert round(growth["Q2-2025"], 4) == round(-10 / 120, 4)
+
+
+def test_growth_is_unavailable_for_positional_columns():
+    statements = _statements({"revenue": [1000, 900], "net_income": [100, 90]}, ["P1", "P2"])
+    metrics = compute_metrics(statements)
+    assert metrics.loc[["revenue_growth", "net_income_growth", "eps_growth"]].isna().all(axis=None)
+    assert category_ratings(metrics)["growth"] == "Insufficient data"
+    summary = build_financial_summary("Revenue 1,000 900\nNet income 100 90\n")
+    assert "Growth metrics unavailable" in summary
+    assert "revenue_growth" not in summary
+
+
+def test_negative_equity_bands_leverage_high():
+    statements = _statements({"total_debt": [500, 500], "total_liabilities": [800, 800], "total_equity": [100, -50]},
+                             ["FY2023", "FY2024"])
+    metrics = compute_metrics(statements)
+    assert metrics.loc["debt_to_equity", "FY2023"] == 5.0
+    assert np.isnan(metrics.loc["debt_to_equity", "FY2024"])
+    assert np.isnan(metrics.loc["liabilities_to_equity", "FY2024"])
+    assert metrics.loc["negative_equity"].tolist() == [0.0, 1.0]
+    assert risk_bands(metrics).loc["negative_equity", "FY2024"] == "High"
+    assert category_ratings(metrics)["leverage"] == "High"
+
+
+def test_zero_equity_bands_leverage_high():
+    statements = _statements({"total_debt": [10], "total_equity": [0]}, ["FY2024"])
+    assert category_ratings(compute_metrics(statements))["leverage"] == "High"
+
+
+def test_risk_bands_and_ratings():
+    statements = _statements({
+        "total_current_assets": [90, 300],
+        "total_current_liabilities": [100, 100],
+        "total_debt": [100, 100],
+        "total_equity": [100, 100],
+    }, ["FY2023", "FY2024"])
+    metrics = compute_metrics(statements)
+    bands = risk_bands(metrics)
+    assert bands.loc["current_ratio"].tolist() == ["High", "Low"]
+    assert bands.loc["debt_to_equity"].tolist() == ["Medium", "Medium"]
+    ratings = category_ratings(metrics)
+    assert ratings["liquidity"] == "Low"
+    assert ratings["leverage"] == "Medium"
+    assert ratings["coverage"] == "Insufficient data"
+
+
+def test_latest_values_skip_missing_periods():
+    metrics = pd.DataFrame([[1.0, np.nan], [np.nan, np.nan]], index=["a", "b"], columns=["FY2023", "FY2024"])
+    latest = latest_values(metrics)
+    assert latest["a"] == 1.0
+    assert np.isnan(latest["b"])
+
+
+def test_empty_statements():
+    assert compute_metrics(pd.DataFrame(dtype=float)).empty
@@ -0,0 +1,80 @@
+## Tests for query intent routing and direct lookups (intent.py)
+
+import pytest
+
+from intent import classify_query, answer_from_statements
+
+FILING = """Consolidated Statements of Operations (in millions)
+Year ended December 31, 2024 2023
+Total revenues 1,234 1,100
+Net income 150 120
+Consolidated Balance Sheets
+December 31, 2024 2023
+Cash and cash equivalents 300 250
+Total current assets 900 800
+Total current liabilities 500 450
+"""
+
+
+@pytest.mark.parametrize("query, items, period", [
+    ("What was revenue in 2024?", ["revenue"], {"quarter": None, "year": "2024"}),
+    ("What was Q2 revenue?", ["revenue"], {"quarter": "2", "year": None}),
+    ("Q2 2024 revenue", ["revenue"], {"quarter": "2", "year": "2024"}),
+    ("Current ratio for FY2024", ["current_ratio"], {"quarter": None, "year": "2024"}),
+    ("Revenue and net income in 2024", ["revenue", "net_income"], {"quarter": None, "year": "2024"}),
+    ("What was the company's total revenue for fiscal year 2024?", ["revenue"], {"quarter": None, "year": "2024"}),
+])
+def test_direct_lookups(query, items, period):
+    intent = classify_query(query)
+    assert intent["tier"] == "simple"
+    assert intent["direct"]
+    assert intent["items"] == items
+    assert intent["period"] == period
+
+
+@pytest.mark.parametrize("query", [
+    "What was cash flow in 2024?",
+    "What was total cash flow last year?",
+    "Profit before tax in 2024",
+    "Revenue in 2024 and 2023",
+    "What was revenue?",
+    "Revenue growth in Q2 and Q3",
+])
+def test_qualified_lookups_go_to_the_model(query):
+    intent = classify_query(query)
+    assert intent["tier"] == "simple"
+    assert not intent["direct"]
+    assert answer_from_statements(intent, FILING) is None
+
+
+@pytest.mark.parametrize("query, tier", [
+    ("Explain why margins fell in 2024", "standard"),
+    ("Tell me about the company", "standard"),
+    ("Give me a comprehensive investment thesis", "complex"),
+    ("Should I buy this stock?", "complex"),
+])
+def test_other_tiers(query, tier):
+    intent = classify_query(query)
+    assert intent["tier"] == tier
+    assert not intent["direct"]
+
+
+def test_answer_from_statement_tables():
+    answer = answer_from_statements(classify_query("Revenue and current ratio in 2024"), FILING)
+    assert answer.splitlines()[:2] == ["Revenue (2024): 1,234 million", "Current ratio (2024): 1.80"]
+    assert "no model call" in answer
+
+
+def test_answer_needs_the_requested_period():
+    assert answer_from_statements(classify_query("Revenue in 2022"), FILING) is None
+
+
+def test_answer_from_structured_statements():
+    structured = {"units": "millions", "items": {"cash": {"FY2023": 250.0, "FY2024": 300.0}}}
+    answer = answer_from_statements(classify_query("Cash and cash equivalents in FY2023"), "", structured)
+    assert answer.startswith("Cash and cash equivalents (FY2023): 250 million")
+    assert "structured financial data" in answer
+
+
+def test_no_direct_answer_from_positional_columns():
+    assert answer_from_statements(classify_query("Revenue in 2024"), "Revenue 1,234 1,100\n") is None
@@ -0,0 +1,178 @@
+## Tests for the structured document parsers (parsers.py)
+
+import pytest
+
+from parsers import parse_document, sniff_content_type, detect_content_type
+
+XBRL_HEAD = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<xbrli:xbrl xmlns:xbrli="http://www.xbrl.org/2003/instance" xmlns:us-gaap="http://fasb.org/us-gaap/2024"'
+    ' xmlns:dei="http://xbrl.sec.gov/dei/2024" xmlns:xbrldi="http://xbrl.org/2006/xbrldi">\n'
+)
+
+
+def _context(context_id: str, period: str, segment: str = "") -> str:
+    return (
+        f'<xbrli:context id="{context_id}"><xbrli:entity><xbrli:identifier scheme="x">1</xbrli:identifier>{segment}'
+        f"</xbrli:entity><xbrli:period>{period}</xbrli:period></xbrli:context>\n"
+    )
+
+
+def _duration(start: str, end: str) -> str:
+    return f"<xbrli:startDate>{start}</xbrli:startDate><xbrli:endDate>{end}</xbrli:endDate>"
+
+
+def _fact(concept: str, context_id: str, value: str) -> str:
+    return f'<us-gaap:{concept} contextRef="{context_id}" unitRef="usd">{value}</us-gaap:{concept}>\n'
+
+
+def _xbrl(*parts: str) -> str:
+    return XBRL_HEAD + "".join(parts) + "</xbrli:xbrl>\n"
+
+
+SAMPLE_XBRL = _xbrl(
+    _context("FY24", _duration("2024-01-01", "2024-12-31")),
+    _context("FY23", _duration("2023-01-01", "2023-12-31")),
+    _context("I24", "<xbrli:instant>2024-12-31</xbrli:instant>"),
+    _context(
+        "FY24_seg", _duration("2024-01-01", "2024-12-31"),
+        '<xbrli:segment><xbrldi:explicitMember dimension="srt:ProductOrServiceAxis">x:ProductMember</xbrldi:explicitMember></xbrli:segment>',
+    ),
+    '<dei:EntityRegistrantName contextRef="FY24">Example Corp</dei:EntityRegistrantName>\n',
+    _fact("RevenueFromContractWithCustomerExcludingAssessedTax", "FY24", "1234500000"),
+    _fact("RevenueFromContractWithCustomerExcludingAssessedTax", "FY23", "1100000000"),
+    _fact("RevenueFromContractWithCustomerExcludingAssessedTax", "FY24_seg", "500000000"),
+    _fact("NetIncomeLoss", "FY23", "-20000000"),
+    _fact("AssetsCurrent", "I24", "900000000"),
+)
+
+
+def _write(tmp_path, name: str, content) -> str:
+    path = tmp_path / name
+    if isinstance(content, bytes):
+        path.write_bytes(content)
+    else:
+        path.write_text(content, encoding="utf-8")
+    return str(path)
+
+
+def test_xbrl_statements(tmp_path):
+    document = parse_document("xbrl", _write(tmp_path, "filing.xml", SAMPLE_XBRL))
+    statements = document["statements"]
+    assert statements["units"] == "millions"
+    ## The product-segment context does not override the consolidated figure
+    assert statements["items"]["revenue"] == {"FY2024": 1234.5, "FY2023": 1100.0}
+    assert statements["items"]["net_income"] == {"FY2023": -20.0}
+    ## Balance-sheet instants take the label of the fiscal year ending that day
+    assert statements["items"]["total_current_assets"] == {"FY2024": 900.0}
+    assert "Registrant: Example Corp" in document["pages"][0]
+
+
+@pytest.mark.parametrize("period", [
+    "<xbrli:instant>not-a-date</xbrli:instant>",
+    "<xbrli:instant> </xbrli:instant>",
+    _duration("2024-13-01", "2024-12-31"),
+    _duration("2024-01-01", "31/12/2024"),
+])
+def test_xbrl_skips_contexts_with_malformed_dates(tmp_path, period):
+    content = _xbrl(
+        _context("FY24", _duration("2024-01-01", "2024-12-31")),
+        _context("BAD", period),
+        _fact("Revenues", "FY24", "1000"),
+        _fact("Revenues", "BAD", "999"),
+    )
+    statements = parse_document("xbrl", _write(tmp_path, "filing.xml", content))["statements"]
+    assert statements["items"] == {"revenue": {"FY2024": 1000.0}}
+
+
+SAMPLE_IXBRL = """<html xmlns="http://www.w3.org/1999/xhtml" xmlns:ix="http://www.xbrl.org/2013/inlineXBRL" xmlns:xbrli="http://www.xbrl.org/2003/instance" xmlns:us-gaap="http://fasb.org/us-gaap/2024">
+<head><title>Example Corp 10-Q</title></head>
+<body>
+<div style="display:none"><ix:header><ix:resources>
+<xbrli:context id="Q2"><xbrli:entity><xbrli:identifier scheme="x">1</xbrli:identifier></xbrli:entity><xbrli:period><xbrli:startDate>2025-04-01</xbrli:startDate><xbrli:endDate>2025-06-30</xbrli:endDate></xbrli:period></xbrli:context>
+<xbrli:context id="Q1"><xbrli:entity><xbrli:identifier scheme="x">1</xbrli:identifier></xbrli:entity><xbrli:period><xbrli:startDate>2025-01-01</xbrli:startDate><xbrli:endDate>2025-03-31</xbrli:endDate></xbrli:period></xbrli:context>
+<xbrli:context id="H1"><xbrli:entity><xbrli:identifier scheme="x">1</xbrli:identifier></xbrli:entity><xbrli:period><xbrli:startDate>2025-01-01</xbrli:startDate><xbrli:endDate>2025-06-30</xbrli:endDate></xbrli:period></xbrli:context>
+<xbrli:context id="BAD"><xbrli:entity><xbrli:identifier scheme="x">1</xbrli:identifier></xbrli:entity><xbrli:period><xbrli:instant>2025-06-31</xbrli:instant></xbrli:period></xbrli:context>
+</ix:resources></ix:header></div>
+<p>Condensed Consolidated Statements of Operations (in millions, except per-share amounts)</p>
+<table>
+<tr><td></td><td>Q1-2025</td><td>Q2-2025</td></tr>
+<tr><td>Total revenues</td><td>$</td><td><ix:nonFraction name="us-gaap:Revenues" contextRef="Q1" unitRef="usd" scale="6">1,100</ix:nonFraction></td><td>$</td><td><ix:nonFraction name="us-gaap:Revenues" contextRef="Q2" unitRef="usd" scale="6">1,234.5</ix:nonFraction></td></tr>
+<tr><td>Net income (loss)</td><td>(</td><td><ix:nonFraction name="us-gaap:NetIncomeLoss" contextRef="Q1" unitRef="usd" scale="6" sign="-">12</ix:nonFraction></td><td>)</td><td><ix:nonFraction name="us-gaap:NetIncomeLoss" contextRef="Q2" unitRef="usd" scale="6">150.6</ix:nonFraction></td></tr>
+<tr><td>Revenue six months</td><td><ix:nonFraction name="us-gaap:Revenues" contextRef="H1" unitRef="usd" scale="6">2,334.5</ix:nonFraction></td></tr>
+</table>
+<script>var x = 1;</script>
+</body></html>
+"""
+
+
+def test_ixbrl_statements(tmp_path):
+    document = parse_document("ixbrl", _write(tmp_path, "filing.htm", SAMPLE_IXBRL))
+    items = document["statements"]["items"]
+    ## Year-to-date durations are not reported; sign="-" negates the fact
+    assert items["revenue"] == {"Q1-2025": 1100.0, "Q2-2025": 1234.5}
+    assert items["net_income"] == {"Q1-2025": -12.0, "Q2-2025": 150.6}
+    text = "\n".join(document["pages"])
+    assert "var x" not in text
+    assert "Statements of Operations" in text
+
+
+def test_html_tables_are_extracted_as_text(tmp_path):
+    content = (
+        "<!DOCTYPE html><html><head><title>x</title></head><body><h1>Example Corp Annual Report</h1>"
+        '<div style="page-break-before:always"></div>'
+        "<table><tr><th>(in millions)</th><th>FY2023</th><th>FY2024</th></tr>"
+        "<tr><td>Total revenue</td><td>$</td><td>1,100</td><td>$</td><td>1,234.5</td></tr></table></body></html>"
+    )
+    document = parse_document("html", _write(tmp_path, "report.html", content))
+    assert document["statements"] is None
+    assert len(document["pages"]) == 2
+    assert "1,234.5" in document["pages"][1]
+
+
+def test_csv_statements(tmp_path):
+    content = 'Income statement (in millions),FY2023,FY2024\nRevenue,"1,100.0","1,234.5"\nNet income,(20),150.6\n'
+    statements = parse_document("csv", _write(tmp_path, "figures.csv", content))["statements"]
+    assert statements["units"] == "millions"
+    assert statements["items"]["revenue"] == {"FY2023": 1100.0, "FY2024": 1234.5}
+    assert statements["items"]["net_income"] == {"FY2023": -20.0, "FY2024": 150.6}
+
+
+def test_transposed_csv_statements(tmp_path):
+    content = "Period;Revenue;Net income\nQ1-2025;1100;120\nQ2-2025;1234.5;150.6\n"
+    statements = parse_document("csv", _write(tmp_path, "figures.csv", content))["statements"]
+    assert statements["items"]["net_income"] == {"Q1-2025": 120.0, "Q2-2025": 150.6}
+
+
+def test_xlsx_statements(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for row in [[None, "FY2023", "FY2024"], ["Revenue", 1100, 1234.5], ["Total assets", 5000, 5100]]:
+        sheet.append(row)
+    path = str(tmp_path / "figures.xlsx")
+    workbook.save(path)
+    assert detect_content_type(path) == "xlsx"
+    statements = parse_document("xlsx", path)["statements"]
+    assert statements["items"]["total_assets"] == {"FY2023": 5000.0, "FY2024": 5100.0}
+
+
+@pytest.mark.parametrize("head, expected", [
+    (b"%PDF-1.7\n", "pdf"),
+    (SAMPLE_XBRL.encode(), "xbrl"),
+    (SAMPLE_IXBRL.encode(), "ixbrl"),
+    (b"<!DOCTYPE html><html><body>x</body></html>", "html"),
+    (b"a,b,c\n1,2,3\n4,5,6\n", "csv"),
+    (b"\x00\x01\x02binary", None),
+])
+def test_sniff_content_type(head, expected):
+    assert sniff_content_type(head) == expected
+
+
+def test_zip_that_is_not_a_workbook_is_not_xlsx(tmp_path):
+    import zipfile
+
+    path = str(tmp_path / "doc.docx")
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", "<w:document/>")
+    assert detect_content_type(path) == "pdf"
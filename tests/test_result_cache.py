@@ -0,0 +1,86 @@
+## Tests for the analysis result cache and request deduplication (result_cache.py)
+
+import datetime
+
+import pytest
+
+import result_cache
+from database import AnalysisResult, save_analysis, update_analysis
+from result_cache import normalize_query, make_query_key, lookup_result, lookup_inflight
+
+PDF = b"%PDF-1.4\nfinancial statements\n%%EOF\n"
+
+
+def test_normalize_query():
+    assert normalize_query("Please, tell me the REVENUE growth of this report!") == "revenue growth"
+
+
+def test_plain_analysis_modes_share_keys():
+    keys = {make_query_key("Revenue growth?", mode) for mode in ("sequential", "merged", "mapreduce")}
+    assert keys == {make_query_key("revenue growth", "sequential")}
+
+
+@pytest.mark.parametrize("mode", ["auto", "lookup", "full"])
+def test_other_modes_get_their_own_keys(mode):
+    assert make_query_key("Revenue growth?", mode) != make_query_key("Revenue growth?", "sequential")
+    assert make_query_key("Revenue growth?", mode) == make_query_key("revenue growth", mode)
+
+
+def _finished(db, document_hash: str, query_key: str, completed_at: datetime.datetime = None) -> AnalysisResult:
+    analysis = save_analysis(db, filename="a.pdf", query="q", document_hash=document_hash, query_key=query_key)
+    update_analysis(db, analysis.id, result="report", status="success")
+    if completed_at is not None:
+        db.query(AnalysisResult).filter(AnalysisResult.id == analysis.id).update({"completed_at": completed_at})
+        db.commit()
+    return analysis
+
+
+def test_lookup_serves_fresh_successful_results(db):
+    analysis = _finished(db, "doc", "key")
+    assert lookup_result(db, "doc", "key").id == analysis.id
+    assert lookup_result(db, "doc", "other") is None
+    assert lookup_result(db, None, "key") is None
+
+
+def test_lookup_skips_expired_and_failed_results(db):
+    stale = datetime.datetime.utcnow() - datetime.timedelta(seconds=result_cache.RESULT_CACHE_TTL_SECONDS + 60)
+    _finished(db, "doc", "key", completed_at=stale)
+    failed = save_analysis(db, filename="a.pdf", query="q", document_hash="doc", query_key="key")
+    update_analysis(db, failed.id, status="failed", error="boom")
+    assert lookup_result(db, "doc", "key") is None
+
+
+def test_lookup_inflight(db):
+    pending = save_analysis(db, filename="a.pdf", query="q", document_hash="doc", query_key="key")
+    assert lookup_inflight(db, "doc", "key").id == pending.id
+    update_analysis(db, pending.id, result="report", status="success")
+    assert lookup_inflight(db, "doc", "key") is None
+
+
+def test_eviction_drops_cache_keys_beyond_the_bound(db, monkeypatch):
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_MAX_ENTRIES", 1)
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_EVICT_EVERY", 1)
+    now = datetime.datetime.utcnow()
+    older = _finished(db, "doc-1", "key", completed_at=now - datetime.timedelta(minutes=5))
+    newer = _finished(db, "doc-2", "key", completed_at=now)
+    result_cache.note_result_stored(db)
+    assert lookup_result(db, "doc-1", "key") is None
+    assert lookup_result(db, "doc-2", "key").id == newer.id
+    ## Evicted rows stay in the history
+    assert db.get(AnalysisResult, older.id) is not None
+
+
+def test_repeat_upload_is_served_from_the_cache(client, crews):
+    first = client.post("/analyze", files={"file": ("a.pdf", PDF)}, data={"query": "Revenue growth?"}).json()
+    again = client.post("/analyze", files={"file": ("b.pdf", PDF)}, data={"query": "revenue growth"}).json()
+    assert first["status"] == again["status"] == "success"
+    assert again["cached"] and again["analysis_id"] == first["analysis_id"]
+    assert again["analysis"] == first["analysis"]
+    assert len(crews.calls) == 1
+
+
+def test_modes_are_cached_separately(client, crews):
+    client.post("/analyze", files={"file": ("a.pdf", PDF)}, data={"query": "Revenue in 2024", "mode": "lookup"})
+    response = client.post("/analyze", files={"file": ("a.pdf", PDF)}, data={"query": "Revenue in 2024", "mode": "full"}).json()
+    assert "cached" not in response
+    assert [call["mode"] for call in crews.calls] == ["lookup", "full"]
@@ -0,0 +1,67 @@
+## Tests for statement table extraction (statements.py)
+
+import pytest
+
+from statements import extract_statements, statements_from_grid, build_financial_summary, detect_units
+
+TABLE = "Revenue $ 120 $ 100\nNet income 12 10\n"
+
+
+@pytest.mark.parametrize("header", [
+    "Year ended December 31, 2024 2023",
+    "Year ended December 31 2024 2023",
+    "Years ended Dec. 31 2024 2023",
+    "Year ended 31 December 2024 2023",
+    "2024 2023",
+    "FY2024 FY2023",
+])
+def test_dated_header_is_recognized(header):
+    frame = extract_statements(header + "\n" + TABLE)
+    years = [column[-4:] for column in frame.columns]
+    assert years == ["2023", "2024"]
+    assert frame.loc["revenue"].tolist() == [100.0, 120.0]
+    assert frame.loc["net_income"].tolist() == [10.0, 12.0]
+
+
+def test_quarter_header_sorts_chronologically():
+    frame = extract_statements("Q2-2025 Q1-2025 Q2-2024\nTotal revenues 30 25 20\n")
+    assert list(frame.columns) == ["Q2-2024", "Q1-2025", "Q2-2025"]
+    assert frame.loc["revenue"].tolist() == [20.0, 25.0, 30.0]
+
+
+def test_table_without_header_gets_positional_columns():
+    frame = extract_statements(TABLE)
+    assert list(frame.columns) == ["P1", "P2"]
+
+
+def test_parentheses_and_dashes():
+    frame = extract_statements("2024 2023\nNet income (loss) (1,250) —\n")
+    assert frame.loc["net_income"].tolist() == [0.0, -1250.0]
+
+
+def test_per_share_row_is_not_read_as_net_income():
+    frame = extract_statements("2024 2023\nNet income 12 10\nNet income per share - diluted 1.20 1.00\n")
+    assert frame.loc["net_income"].tolist() == [10.0, 12.0]
+    assert frame.loc["eps_diluted"].tolist() == [1.0, 1.2]
+
+
+def test_detect_units():
+    assert detect_units("Consolidated Balance Sheets (in millions, except per share data)") == "millions"
+    assert detect_units("no units here") == ""
+
+
+def test_grid_with_blank_label_cell():
+    rows = [["", "2024", "2023"], ["Revenue", "120", "100"], ["Total assets", "500", "450"]]
+    assert statements_from_grid(rows)["items"] == {
+        "revenue": {"2024": 120.0, "2023": 100.0},
+        "total_assets": {"2024": 500.0, "2023": 450.0},
+    }
+
+
+def test_transposed_grid():
+    rows = [["Period", "Revenue", "Net income"], ["2023", "100", "10"], ["2024", "120", "12"]]
+    assert statements_from_grid(rows)["items"]["revenue"] == {"2023": 100.0, "2024": 120.0}
+
+
+def test_summary_without_tables():
+    assert build_financial_summary("Nothing tabular here.").startswith("No financial statement tables")
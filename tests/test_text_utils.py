@@ -0,0 +1,51 @@
+## Tests for whitespace normalization and page header stripping (text_utils.py)
+
+from text_utils import normalize_whitespace, strip_page_headers, iter_strip_page_headers
+
+
+def test_normalize_whitespace():
+    text = "Revenue\t\t1,234   5\r\n\r\n\r\n  Net​ income  \n"
+    assert normalize_whitespace(text) == "Revenue 1,234 5\nNet income\n"
+
+
+def _pages(count: int, first_number: int = 1) -> list:
+    return [
+        f"ACME Corp Annual Report | Page {i + first_number}\n2024 2023\nRevenue {100 + i} {90 + i}\nNet income {10 + i} 9\n{i + first_number}"
+        for i in range(count)
+    ]
+
+
+def test_running_headers_and_page_numbers_are_removed():
+    cleaned = strip_page_headers(_pages(5))
+    assert cleaned[0] == "2024 2023\nRevenue 100 90\nNet income 10 9"
+    assert cleaned[4] == "2024 2023\nRevenue 104 94\nNet income 14 9"
+
+
+def test_bare_numbers_off_the_page_sequence_are_kept():
+    pages = ["Total assets 5,000\n2024", "Cash 300\n812", "Debt 10\n2023"]
+    assert strip_page_headers(pages) == pages
+
+
+def test_short_documents_only_lose_page_numbers():
+    pages = ["Revenue 1,234.5\nPage 1 of 2", "Total assets 5,000\n2 of 2"]
+    assert strip_page_headers(pages) == ["Revenue 1,234.5", "Total assets 5,000"]
+
+
+def test_streaming_matches_whole_document_within_the_sample():
+    pages = _pages(12, first_number=3)
+    assert list(iter_strip_page_headers(iter(pages), sample=12)) == strip_page_headers(pages)
+
+
+def test_streaming_applies_sampled_rules_to_later_pages():
+    consumed = []
+
+    def pages():
+        for page in _pages(50):
+            consumed.append(page)
+            yield page
+
+    stream = iter_strip_page_headers(pages(), sample=8)
+    assert next(stream) == "2024 2023\nRevenue 100 90\nNet income 10 9"
+    ## Only the sample has been read when the first page comes out
+    assert len(consumed) == 8
+    assert list(stream)[-1] == "2024 2023\nRevenue 149 139\nNet income 59 9"
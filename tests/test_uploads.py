@@ -0,0 +1,98 @@
+## Tests for streamed uploads and their size limits (main.py)
+
+import os
+
+import pytest
+
+import main
+
+PDF = b"%PDF-1.4\nfinancial statements\n%%EOF\n"
+BOUNDARY = "test-boundary"
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """An /analyze body limit of 4 KB and a file limit of 2 KB"""
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", 2048)
+    monkeypatch.setitem(main._UPLOAD_BODY_LIMITS, "/analyze", (4096, "File exceeds the 2048 byte upload limit."))
+    monkeypatch.setitem(main._UPLOAD_BODY_LIMITS, "/analyze/batch", (4096, "Batch exceeds the 4096 byte upload limit."))
+
+
+def _multipart(data: bytes, filename: str = "a.pdf"):
+    """A multipart body streamed in small chunks, so the request carries no Content-Length"""
+    yield (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode()
+    for start in range(0, len(data), 1024):
+        yield data[start:start + 1024]
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _leftover_uploads() -> list:
+    return os.listdir("data") if os.path.isdir("data") else []
+
+
+def test_small_upload_is_analyzed(client, crews, limits):
+    response = client.post("/analyze", files={"file": ("a.pdf", PDF)})
+    assert response.status_code == 200
+    assert response.json()["analysis"].startswith("Report for:")
+    assert _leftover_uploads() == []
+
+
+def test_declared_length_over_the_limit_is_refused(client, crews, limits):
+    response = client.post("/analyze", files={"file": ("a.pdf", PDF + b"x" * 8192)})
+    assert response.status_code == 413
+    assert response.json() == {"detail": "File exceeds the 2048 byte upload limit."}
+    assert crews.calls == []
+
+
+def test_streamed_body_over_the_limit_is_refused(client, crews, limits):
+    response = client.post(
+        "/analyze",
+        content=_multipart(PDF + b"x" * 8192),
+        headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"},
+    )
+    assert response.status_code == 413
+    assert "upload limit" in response.json()["detail"]
+    assert crews.calls == []
+    assert _leftover_uploads() == []
+
+
+def test_streamed_body_under_the_limit_is_analyzed(client, crews, limits):
+    response = client.post(
+        "/analyze", content=_multipart(PDF), headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+    )
+    assert response.status_code == 200
+    assert len(crews.calls) == 1
+
+
+def test_file_over_the_file_limit_is_refused_while_saving(client, crews, limits):
+    ## Under the body limit (file plus multipart overhead) but over the file limit itself
+    response = client.post("/analyze", files={"file": ("a.pdf", PDF + b"x" * 3000)})
+    assert response.status_code == 413
+    assert crews.calls == []
+    assert _leftover_uploads() == []
+
+
+def test_batch_over_the_limit_is_refused(client, crews, limits):
+    files = [("files", (f"{name}.pdf", PDF + b"x" * 3000)) for name in "ab"]
+    response = client.post("/analyze/batch", files=files)
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Batch exceeds the 4096 byte upload limit."}
+
+
+@pytest.mark.parametrize("filename, content", [
+    ("notes.txt", PDF),
+    ("a.pdf", b"\x00\x01\x02 not a document"),
+    ("a.pdf", b""),
+])
+def test_unsupported_or_empty_uploads_are_rejected(client, crews, filename, content):
+    response = client.post("/analyze", files={"file": (filename, content)})
+    assert response.status_code == 400
+    assert crews.calls == []
+    assert _leftover_uploads() == []
+
+
+def test_other_routes_are_not_limited(client, limits):
+    assert client.get("/").status_code == 200
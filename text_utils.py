@@ -0,0 +1,149 @@
+## Text Normalization Utilities for Financial Document Analyzer
+## Shared by every tool in tools.py; all functions run in linear time over the input
+
+import os
+import re
+from collections import Counter
+from itertools import islice
+
+## Non-breaking, figure and narrow no-break spaces (tabs are replaced separately)
+_UNICODE_SPACES = "\u00a0\u2007\u202f"
+_INVISIBLE = re.compile(r"[\u200b\ufeff]")
+_SPACE_RUNS = re.compile(r" {2,}")
+_BLANK_LINES = re.compile(r"\n{2,}")
+## Page-number lines: "Page 3", "3 of 40", "- 3 -" (labelled) or a bare "3"
+_PAGE_NUMBER_LINE = re.compile(
+    r"^\s*[-\u2013\u2014]?\s*(page\s+)?(\d{1,4})(\s+of\s+\d{1,4})?\s*[-\u2013\u2014]?\s*$", re.IGNORECASE
+)
+## Lines of figures only: "2024 2023", "$ 1,234.5"
+_FIGURES_LINE = re.compile(r"^[\d\s.,$%()\u2013\u2014-]+$")
+## A page number set off from a running header or footer by a separator: "Annual Report | Page 3"
+_PAGE_MARKER = re.compile(
+    r"\s*[|\u2022\u00b7\u2013\u2014-]\s*(?:page\s+)?\d{1,4}(?:\s+of\s+\d{1,4})?\s*$"
+    r"|^\s*(?:page\s+)?\d{1,4}(?:\s+of\s+\d{1,4})?\s*[|\u2022\u00b7\u2013\u2014-]\s*",
+    re.IGNORECASE,
+)
+
+
+## Collapse runs of `char` to one: two replace passes collapse runs of up to four, which covers
+## nearly all text; the regex only runs on the rare longer runs, keeping the worst case linear
+def _collapse_runs(text: str, char: str, runs: re.Pattern) -> str:
+    double = char * 2
+    text = text.replace(double, char).replace(double, char)
+    return runs.sub(char, text) if double in text else text
+
+
+def normalize_whitespace(text: str) -> str:
+    """
+    Normalize whitespace with a fixed number of linear passes.
+
+    Tabs and non-breaking spaces become spaces, space runs collapse to one
+    space, spaces around line breaks are trimmed and runs of blank lines
+    collapse to a single newline. Zero-width characters are dropped.
+    """
+    if not text.isascii():
+        text = _INVISIBLE.sub("", text)
+        for space in _UNICODE_SPACES:
+            text = text.replace(space, " ")
+    ## str.replace runs at memory speed, several times faster than a regex substitution
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = text.replace("\t", " ").replace("\f", "\n").replace("\v", "\n")
+    text = _collapse_runs(text, " ", _SPACE_RUNS)
+    ## With space runs collapsed, at most one space sits on either side of a line break
+    text = text.replace(" \n", "\n").replace("\n ", "\n")
+    return _collapse_runs(text, "\n", _BLANK_LINES)
+
+
+## Line with any separated page marker removed, so "Report | Page 3" and "Report | Page 4"
+## compare equal; other numbers are kept, so body lines differing only by a figure never do
+def _line_key(line: str) -> str:
+    return _PAGE_MARKER.sub("", line.strip().lower())
+
+
+## Most common offset between bare page numbers at page edges and the page index, i.e. the
+## number of the first page (1 unless the document has fewer than three pages to learn from)
+def _page_offset(split_pages: list, edges: list, min_pages: int) -> int:
+    offsets = Counter()
+    for index, (lines, indexes) in enumerate(zip(split_pages, edges)):
+        numbers = {int(match.group(2)) for match in map(_PAGE_NUMBER_LINE.match, (lines[i] for i in indexes))
+                   if match and not match.group(1) and not match.group(3)}
+        offsets.update({number - index for number in numbers})
+    if len(split_pages) < 3 or not offsets:
+        return 1
+    offset, count = offsets.most_common(1)[0]
+    return offset if count >= min_pages else None
+
+
+def _is_page_number(line: str, index: int, offset: int) -> bool:
+    match = _PAGE_NUMBER_LINE.match(line)
+    if not match:
+        return False
+    ## Labelled numbers are page numbers; a bare number only when it tracks the page index,
+    ## so figures and year headers that open or close a page are kept
+    return bool(match.group(1) or match.group(3)) or (offset is not None and int(match.group(2)) - index == offset)
+
+
+## Indexes of the first and last `depth` non-blank lines of a page; for near-empty pages, whose
+## every line would be an edge, all of them with `short` and otherwise none
+def _edge_indexes(lines: list, depth: int, short: bool = False) -> list:
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    if len(filled) <= depth * 2:
+        return filled if short else []
+    return filled[:depth] + filled[-depth:]
+
+
+## Streamed documents learn their running headers and page numbering from this many leading pages
+HEADER_SAMPLE_PAGES = int(os.getenv("HEADER_SAMPLE_PAGES", "32"))
+
+
+## (repeated header/footer keys, page-number offset) learned from a list of split pages
+def _header_rules(split_pages: list, min_fraction: float, depth: int):
+    threshold = max(3, int(len(split_pages) * min_fraction))
+    repeated = set()
+    if len(split_pages) >= 3:
+        counts = Counter()
+        for lines in split_pages:
+            counts.update({_line_key(lines[i]) for i in _edge_indexes(lines, depth)})
+        ## Lines of bare figures (year column headers) are left to the page-number rule
+        repeated = {key for key, count in counts.items() if count >= threshold and key and not _FIGURES_LINE.match(key)}
+    ## Page numbers are looked for on near-empty pages too
+    number_edges = [_edge_indexes(lines, depth, short=True) for lines in split_pages]
+    return repeated, _page_offset(split_pages, number_edges, threshold)
+
+
+def _strip_page(lines: list, index: int, repeated: set, offset: int, depth: int) -> str:
+    drop = {i for i in _edge_indexes(lines, depth) if _line_key(lines[i]) in repeated}
+    drop.update(i for i in _edge_indexes(lines, depth, short=True) if _is_page_number(lines[i], index, offset))
+    return "\n".join(line for i, line in enumerate(lines) if i not in drop)
+
+
+def iter_strip_page_headers(pages, sample: int = HEADER_SAMPLE_PAGES, min_fraction: float = 0.5, depth: int = 2):
+    """
+    Yield pages with running headers, footers and page-number lines removed
+    (see strip_page_headers), consuming `pages` lazily.
+
+    The rules are learned from the first `sample` pages, which are the only
+    ones held at a time, so a long document streams through in bounded memory.
+    """
+    pages = iter(pages)
+    split_sample = [page.split("\n") for page in islice(pages, sample)]
+    repeated, offset = _header_rules(split_sample, min_fraction, depth)
+    for index, lines in enumerate(split_sample):
+        yield _strip_page(lines, index, repeated, offset, depth)
+    for index, page in enumerate(pages, len(split_sample)):
+        yield _strip_page(page.split("\n"), index, repeated, offset, depth)
+
+
+def strip_page_headers(pages: list, min_fraction: float = 0.5, depth: int = 2) -> list:
+    """
+    Remove running headers, footers and page-number lines from a list of pages.
+
+    Only the first and last `depth` lines of a page are candidates. A line
+    counts as a header/footer when it repeats (ignoring a separated page
+    marker) on at least `min_fraction` of the pages, and as a page number
+    when it is labelled ("Page 3", "3 of 40") or is a bare number following
+    the page sequence. Documents with fewer than three pages only lose
+    page-number lines.
+    """
+    return list(iter_strip_page_headers(pages, max(len(pages), 1), min_fraction, depth))
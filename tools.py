@@ -3,82 +3,147 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-from crewai_tools import tool
-from crewai_tools.tools.serper_dev_tool import SerperDevTool
-from langchain_community.document_loaders import PyPDFLoader
+import functools
 
-## Creating search tool
-search_tool = SerperDevTool()
+from crewai.tools import tool
 
-## Creating custom pdf reader tool
+from analytics import compute_metrics, risk_bands, category_ratings, latest_values, dated_periods, METRIC_CATEGORIES, GROWTH_UNAVAILABLE
+from extraction import load_document
+from retrieval import get_index, format_passages, RETRIEVAL_TOP_K
+from statements import document_statements, format_table
+from text_utils import normalize_whitespace
+import telemetry
+
+## Creating search tool on first use; constructing it at import slowed every cold start
+@functools.lru_cache(maxsize=None)
+def get_search_tool():
+    from crewai_tools.tools.serper_dev_tool import SerperDevTool
+    return SerperDevTool()
+
+## Accept either a path to an uploaded document or the document text itself; returns
+## (statements, units), with the exact figures of structured filings (XBRL, spreadsheets)
+def _statements(financial_document_data: str):
+    candidate = financial_document_data.strip()
+    if len(candidate) < 1024 and "\n" not in candidate and os.path.isfile(candidate):
+        document = load_document(candidate)
+        return document_statements(document["full_text"], document.get("statements"))
+    return document_statements(normalize_whitespace(financial_document_data))
+
+
+## Creating custom document reader tool (any format parsers.py supports)
 class FinancialDocumentTool():
     @staticmethod
     @tool("Read Financial Document")
+    @telemetry.timed("tool.read_data")
     def read_data_tool(path: str = 'data/sample.pdf') -> str:
-        """Tool to read data from a pdf file from a path.
+        """Tool to read data from a financial document (PDF, HTML, XBRL, CSV or XLSX) from a path.
 
         Args:
-            path (str, optional): Path of the pdf file. Defaults to 'data/sample.pdf'.
+            path (str, optional): Path of the document. Defaults to 'data/sample.pdf'.
 
         Returns:
             str: Full Financial Document file content
         """
-        
-        loader = PyPDFLoader(file_path=path)
-        docs = loader.load()
-
-        full_report = ""
-        for data in docs:
-            # Clean and format the financial document data
-            content = data.page_content
-            
-            # Remove extra whitespaces and format properly
-            while "\n\n" in content:
-                content = content.replace("\n\n", "\n")
-                
-            full_report += content + "\n"
-            
-        return full_report
+        ## Repeat documents are served from the content-addressed cache
+        return load_document(path)["full_text"]
+
+    @staticmethod
+    @tool("Search Financial Document")
+    @telemetry.timed("tool.search_document")
+    def search_document_tool(query: str, path: str = 'data/sample.pdf', top_k: int = RETRIEVAL_TOP_K) -> str:
+        """Tool to find the passages of a financial document most relevant to a search query.
+
+        Args:
+            query (str): What to look for, e.g. "debt maturity schedule".
+            path (str, optional): Path of the document. Defaults to 'data/sample.pdf'.
+            top_k (int, optional): Number of passages to return.
+
+        Returns:
+            str: The top matching passages, each labelled with its section and page
+        """
+        ## The BM25 index is persisted next to the cached parse, so repeat queries skip building it
+        document = load_document(path)
+        return format_passages(get_index(document).search(query, top_k))
 
 ## Creating Investment Analysis Tool
 class InvestmentTool:
     @staticmethod
     @tool("Analyze Investment Data")
+    @telemetry.timed("tool.analyze_investment")
     def analyze_investment_tool(financial_document_data: str) -> str:
         """Analyzes financial document data for investment insights.
-        
+
+        Computes profitability, per-share, cash-flow and growth metrics for every
+        reported period from the document's statement tables.
+
         Args:
-            financial_document_data (str): The financial document content to analyze.
-            
+            financial_document_data (str): The financial document content to analyze, or the path of the uploaded document.
+
         Returns:
             str: Investment analysis result
         """
-        # Process and analyze the financial document data
-        processed_data = financial_document_data
-        
-        # Clean up the data format
-        i = 0
-        while i < len(processed_data):
-            if processed_data[i:i+2] == "  ":  # Remove double spaces
-                processed_data = processed_data[:i] + processed_data[i+1:]
-            else:
-                i += 1
-                
-        # TODO: Implement investment analysis logic here
-        return "Investment analysis functionality to be implemented"
+        statements, _ = _statements(financial_document_data)
+        if statements.empty:
+            return "No financial statement tables could be extracted from the document."
+
+        metrics = compute_metrics(statements)
+        investment_metrics = [
+            name for name, category in METRIC_CATEGORIES.items()
+            if category in ("profitability", "per_share", "cash_flow", "growth")
+        ]
+        table = metrics.loc[investment_metrics].dropna(how="all")
+        if table.empty:
+            return "Statement tables were found but contain no inputs for investment metrics."
+
+        latest = latest_values(table).dropna()
+        highlights = [f"- {name}: {value:,.3g}" for name, value in latest.items()]
+        parts = [
+            "Investment metrics by period (margins, returns and growth as fractions):",
+            format_table(table),
+            "",
+            "Latest reported values:",
+            *highlights,
+        ]
+        if not dated_periods(statements.columns):
+            parts += ["", GROWTH_UNAVAILABLE]
+        return "\n".join(parts)
 
 ## Creating Risk Assessment Tool
 class RiskTool:
     @staticmethod
     @tool("Create Risk Assessment")
+    @telemetry.timed("tool.create_risk_assessment")
     def create_risk_assessment_tool(financial_document_data: str) -> str:
         """Creates a risk assessment from financial document data.
-        
+
+        Computes liquidity, leverage, coverage, profitability and growth metrics
+        for every reported period and rates each category Low/Medium/High.
+
         Args:
-            financial_document_data (str): The financial document content to assess.
-            
+            financial_document_data (str): The financial document content to assess, or the path of the uploaded document.
+
         Returns:
             str: Risk assessment result
         """
-        # TODO: Implement risk assessment logic here
-        return "Risk assessment functionality to be implemented"
+        statements, units = _statements(financial_document_data)
+        if statements.empty:
+            return "No financial statement tables could be extracted from the document."
+
+        metrics = compute_metrics(statements)
+        risk_metrics = [
+            name for name, category in METRIC_CATEGORIES.items()
+            if category in ("liquidity", "leverage", "coverage", "growth")
+        ]
+        table = metrics.loc[risk_metrics].dropna(how="all")
+        bands = risk_bands(metrics).dropna(how="all")
+        ratings = category_ratings(metrics)
+
+        parts = [f"Risk metrics by period ({units or 'units as reported'}; ratios as fractions):"]
+        parts.append(format_table(table) if not table.empty else "No liquidity, leverage or coverage inputs reported.")
+        if not bands.empty:
+            parts += ["", "Risk band per metric and period:", format_table(bands.fillna("n/a"))]
+        parts += ["", "Overall rating per category (latest period):"]
+        parts += [f"- {category}: {rating}" for category, rating in ratings.items()]
+        if not dated_periods(statements.columns):
+            parts += ["", GROWTH_UNAVAILABLE]
+        return "\n".join(parts)